@@ -11,11 +11,15 @@ load_dotenv()
 
 class TaskMemory(ChatMemory):
     def __init__(self, human: str, persona: str, tasks: List[str], objective_block: Block): 
+        from functions.task_store import get_task_store
         super().__init__(human=human, persona=persona) 
+        # Tasks live in the task store; the block only holds a compact view of the queue head
+        store = get_task_store()
+        store.seed(tasks)
         self.link_block( 
             Block(
                 limit=2000, 
-                value=json.dumps(tasks), 
+                value=store.projection(), 
                 label="tasks"
             )
         )
@@ -23,20 +27,22 @@ class TaskMemory(ChatMemory):
             objective_block
         )
 
-    def task_queue_push(self, task_description: str) -> Optional[str]:
+    def task_queue_push(self, task_description: str, priority: int = 0, due: Optional[str] = None) -> Optional[str]:
         """
-        Push to a task queue stored in core memory. 
+        Push to the task queue. Tasks with a higher priority, then an earlier due date, are popped first.
 
         Args:
             task_description (str): A description of the next task you must accomplish. 
+            priority (int): Priority of the task, higher is more urgent (default 0).
+            due (Optional[str]): Due date in ISO 8601 format (e.g., "2024-11-28T03:00"), if any.
             
         Returns:
             Optional[str]: None is always returned as this function does not produce a response.
         """
-        import json
-        tasks = json.loads(self.memory.get_block("tasks").value)
-        tasks.append(task_description)
-        self.memory.update_block_value("tasks", json.dumps(tasks))
+        from functions.task_store import get_task_store
+        store = get_task_store()
+        store.push(task_description, priority=priority, due=due)
+        self.memory.update_block_value("tasks", store.projection())
         return None
 
     def task_queue_pop(self) -> Optional[str]:
@@ -48,20 +54,13 @@ class TaskMemory(ChatMemory):
             if there are still tasks in queue. Otherwise, returns None (the 
             task queue is empty)
         """
-        import json
-        tasks = json.loads(self.memory.get_block("tasks").value)
-        print("?????")
-        print(self.memory)
-
-        if len(tasks) == 0: 
+        from functions.task_store import get_task_store
+        store = get_task_store()
+        task = store.pop()
+        self.memory.update_block_value("tasks", store.projection())
+        if task is None: 
             return None
-        task = tasks[0]
-        self.memory.update_block_value("tasks", json.dumps(tasks[1:]))
-        # update the tasks.json
-        with open('tasks.json', 'w') as f:
-            json.dump(tasks[1:], f)
-
-        return task
+        return task["description"]
 
 
 # Place the rest of the code inside this block
@@ -0,0 +1,124 @@
+import os
+import time
+import shlex
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+
+from functions.event_bus import publish
+from functions.sandbox_exec import ExecLimits, RUN_COMMANDS, stream_exec
+
+logger = logging.getLogger(__name__)
+
+LANGUAGE_BY_EXTENSION = {'py': 'python', 'ts': 'typescript', 'sh': 'shell'}
+
+
+def _tail(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return f"...[{len(text) - limit} chars truncated]...\n" + text[-limit:]
+
+
+def _normalise_target(target: Union[str, dict]) -> dict:
+    """Turns a file path or {"file"/"command", "language"} entry into a runnable spec."""
+    if isinstance(target, str):
+        target = {"file": target}
+    if "command" in target:
+        return {"name": target.get("name", target["command"]), "command": target["command"],
+                "language": target.get("language", "shell")}
+    path = target["file"]
+    language = target.get("language") or LANGUAGE_BY_EXTENSION.get(path.rsplit(".", 1)[-1], "python")
+    return {"name": target.get("name", path), "file": path, "language": language}
+
+
+def _run_one(spec: dict, project_directory: Optional[str], limits: ExecLimits, log_limit: int) -> dict:
+    from functions.dependency_cache import find_manifests, get_dependency_cache
+    from functions.project_sync import sync_project
+    from functions.sandbox_pool import get_pool
+
+    language = spec["language"]
+    report = {"target": spec["name"], "language": language}
+    started = time.monotonic()
+    try:
+        cache = get_dependency_cache()
+        manifests = find_manifests(project_directory, language) if project_directory else {}
+        image, cache_status = cache.image_for(language, manifests)
+        with get_pool().lease(language, image=image) as pooled:
+            if cache_status != "none":
+                cache.prepare(pooled.container, language)
+            if project_directory:
+                sync_project(pooled.container, project_directory)
+            if "command" in spec:
+                command = spec["command"]
+            else:
+                path = spec["file"]
+                if not project_directory:
+                    # Standalone file: copy just this file into the sandbox
+                    from functions.coding_functions import create_tar_with_file
+                    with open(path, "r", encoding="utf-8") as f:
+                        pooled.container.put_archive("/sandbox", create_tar_with_file(os.path.basename(path), f.read()))
+                    path = os.path.basename(path)
+                elif os.path.isabs(path):
+                    path = os.path.relpath(path, project_directory).replace(os.sep, "/")
+                else:
+                    path = path.replace(os.sep, "/")
+                command = RUN_COMMANDS[language].format(path=shlex.quote(path))
+
+            def forward(stream: str, text: str):
+                publish({"type": "exec_output", "target": spec["name"], "stream": stream, "message": text})
+
+            result = stream_exec(pooled.container, command, limits=limits, on_chunk=forward)
+            if result.timed_out or result.oom_killed or result.output_truncated:
+                pooled.dirty = True
+        report.update({
+            "exit_code": result.exit_code,
+            "passed": result.exit_code == 0,
+            "wall_time": result.wall_time,
+            "cpu_time": None if result.cpu_user is None else round(result.cpu_user + result.cpu_system, 3),
+            "peak_rss_bytes": result.peak_rss_bytes,
+            "timed_out": result.timed_out,
+            "stdout": _tail(result.stdout, log_limit),
+            "stderr": _tail(result.stderr, log_limit),
+        })
+    except Exception as e:
+        logger.error(f"Batch target {spec['name']} failed to run: {e}")
+        report.update({"exit_code": None, "passed": False, "wall_time": round(time.monotonic() - started, 4),
+                       "error": str(e)})
+    return report
+
+
+def run_batch(targets: List[Union[str, dict]], project_directory: Optional[str] = None,
+              max_parallel: int = 4, timeout: float = 60, log_limit: int = 2000) -> Dict:
+    """
+    Runs many files or commands concurrently on pooled sandboxes and aggregates the outcome.
+
+    Args:
+        targets (List[str | dict]): File paths, or dicts with "file" or "command" (and optional
+            "language" and "name").
+        project_directory (str): Local project synced into each sandbox before running; file
+            targets are resolved relative to it.
+        max_parallel (int): Maximum number of sandboxes used at once.
+        timeout (float): Wall-clock limit per target in seconds.
+        log_limit (int): Characters of stdout/stderr kept per target (the tail is kept).
+
+    Returns:
+        Dict: Summary counts, total wall time and one result per target in input order.
+    """
+    specs = [_normalise_target(t) for t in targets]
+    if not specs:
+        return {"total": 0, "passed": 0, "failed": 0, "wall_time": 0.0, "results": []}
+
+    limits = ExecLimits(timeout=timeout)
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(specs)))) as executor:
+        results = list(executor.map(lambda spec: _run_one(spec, project_directory, limits, log_limit), specs))
+
+    passed = sum(1 for r in results if r["passed"])
+    return {
+        "total": len(results),
+        "passed": passed,
+        "failed": len(results) - passed,
+        "wall_time": round(time.monotonic() - started, 4),
+        "slowest": max(results, key=lambda r: r["wall_time"])["target"],
+        "results": results,
+    }
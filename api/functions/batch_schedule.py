@@ -0,0 +1,143 @@
+def schedule_events_batch(self, events_json: str, allow_conflicts: bool = False) -> str:
+    """
+    Schedule many events on the user's Google Calendar in one go, e.g. to plan a whole week.
+    Each event is checked against existing events and the other events in the batch; conflicting
+    events are not created (unless allow_conflicts is true) and a free alternative slot is suggested.
+
+    Args:
+        self (Agent): The MemGPT agent object.
+        events_json (str): A JSON list of events, each with "title", "start", "end" (ISO 8601, e.g.
+            "2024-02-01T12:00:00") and optional "description".
+        allow_conflicts (bool): Create events even if they overlap other events.
+
+    Returns:
+        str: Which events were created, and which were skipped with their conflicts and a suggested slot.
+    """
+    import json
+    from datetime import datetime, timedelta
+    from zoneinfo import ZoneInfo
+    from functions.calendar_store import get_calendar_sync, event_timestamp
+    from functions.interval_tree import IntervalTree, free_slots
+
+    TIMEZONE = 'Europe/London'
+    tz = ZoneInfo(TIMEZONE)
+
+    def parse(value: str) -> datetime:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return dt if dt.tzinfo else dt.replace(tzinfo=tz)
+
+    try:
+        proposed = json.loads(events_json)
+        if not isinstance(proposed, list) or not proposed:
+            return "Error: events_json must be a non-empty JSON list."
+        events = []
+        for item in proposed:
+            start, end = parse(item["start"]), parse(item["end"])
+            if end <= start:
+                return f"Error: event '{item.get('title')}' ends before it starts."
+            events.append((start, end, item))
+
+        calendar = get_calendar_sync()
+        if calendar.store.sync_token() is None:
+            calendar.sync()
+
+        # Busy intervals from the local store, covering the batch plus a week for suggestions
+        window_start = min(start for start, _, _ in events).timestamp()
+        window_end = (max(end for _, end, _ in events) + timedelta(days=7)).timestamp()
+        busy = IntervalTree()
+        # Busy intervals plus the slots already suggested in this batch, only used for further suggestions
+        reserved = IntervalTree()
+        for existing in calendar.store.between(window_start, window_end):
+            interval = (event_timestamp(existing["start"]), event_timestamp(existing["end"]),
+                        existing.get("summary", "(no title)"))
+            busy.insert(*interval)
+            reserved.insert(*interval)
+
+        to_create, skipped = [], []
+        for start, end, item in events:
+            conflicts = busy.overlaps(start.timestamp(), end.timestamp())
+            if conflicts and not allow_conflicts:
+                duration = (end - start).total_seconds()
+                slots = free_slots(reserved, start.timestamp(), window_end, duration, limit=1, hours=(8, 22), tz=tz)
+                suggestion = datetime.fromtimestamp(slots[0][0], tz).isoformat() if slots else None
+                # Hold the suggested slot so later skipped events are not offered the same one
+                if slots:
+                    reserved.insert(slots[0][0], slots[0][0] + duration, f"suggested slot for {item['title']}")
+                skipped.append(f"- {item['title']} ({start.isoformat()}): conflicts with "
+                               f"{', '.join(c[2] for c in conflicts)}; next free start: {suggestion or 'none found'}")
+                continue
+            busy.insert(start.timestamp(), end.timestamp(), item["title"])
+            reserved.insert(start.timestamp(), end.timestamp(), item["title"])
+            to_create.append({
+                'summary': item['title'],
+                'description': item.get('description'),
+                'start': {'dateTime': start.isoformat(), 'timeZone': TIMEZONE},
+                'end': {'dateTime': end.isoformat(), 'timeZone': TIMEZONE},
+            })
+
+        # One batch HTTP round trip for all inserts
+        created = calendar.insert_events(to_create) if to_create else []
+        lines = []
+        for body, result in zip(to_create, created):
+            if result is None:
+                lines.append(f"- {body['summary']}: failed to create")
+            else:
+                lines.append(f"- {body['summary']} ({body['start']['dateTime']}): {result.get('htmlLink')}")
+        report = f"Created {sum(1 for r in created if r is not None)} of {len(events)} events."
+        if lines:
+            report += "\n" + "\n".join(lines)
+        if skipped:
+            report += "\nSkipped because of conflicts:\n" + "\n".join(skipped)
+        return report
+
+    except Exception as e:
+        return f"An error occurred: {str(e)}"
+
+def find_free_slots(self, start: str, end: str, duration_minutes: int = 60, max_slots: int = 5, working_hours: str = "09-18") -> str:
+    """
+    Find free time slots in the user's Google Calendar.
+
+    Args:
+        self (Agent): The MemGPT agent object.
+        start (str): Start of the search window in ISO 8601 format (e.g., "2024-02-01T00:00:00").
+        end (str): End of the search window in ISO 8601 format.
+        duration_minutes (int): Minimum length of a free slot in minutes.
+        max_slots (int): Maximum number of slots to return.
+        working_hours (str): Allowed daily hours as "HH-HH" (e.g. "09-18"), or "" for any time.
+
+    Returns:
+        str: The free slots, one per line, or a message if none were found.
+    """
+    from datetime import datetime
+    from zoneinfo import ZoneInfo
+    from functions.calendar_store import get_calendar_sync, event_timestamp
+    from functions.interval_tree import IntervalTree, free_slots
+
+    tz = ZoneInfo('Europe/London')
+
+    def parse(value: str) -> datetime:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return dt if dt.tzinfo else dt.replace(tzinfo=tz)
+
+    try:
+        window_start, window_end = parse(start).timestamp(), parse(end).timestamp()
+        hours = tuple(int(h) for h in working_hours.split("-")) if working_hours else None
+
+        calendar = get_calendar_sync()
+        if calendar.store.sync_token() is None:
+            calendar.sync()
+        busy = IntervalTree([
+            (event_timestamp(e["start"]), event_timestamp(e["end"]), e.get("summary"))
+            for e in calendar.store.between(window_start, window_end)
+        ])
+
+        slots = free_slots(busy, window_start, window_end, duration_minutes * 60, limit=max_slots, hours=hours, tz=tz)
+        if not slots:
+            return "No free slots found."
+        return "\n".join(
+            f"{datetime.fromtimestamp(s, tz).isoformat()} - {datetime.fromtimestamp(e, tz).isoformat()}"
+            for s, e in slots
+        )
+
+    except Exception as e:
+        return f"An error occurred: {str(e)}"
@@ -0,0 +1,130 @@
+import os
+import logging
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from functions.storage import API_DIR
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATH = os.getenv("GCAL_TOKEN_PATH", os.path.join(API_DIR, 'gcal_token.json'))
+CREDENTIALS_PATH = os.getenv("GCAL_CREDENTIALS_PATH", os.path.join(API_DIR, 'google_api_credentials.json'))
+SCOPES = ["https://www.googleapis.com/auth/calendar"]
+
+# Refresh the access token this long before it expires
+REFRESH_MARGIN = timedelta(minutes=5)
+
+
+def write_token_atomically(path: str, token_json: str):
+    """Writes the token file via a temp file and rename so readers never see a partial file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".gcal_token.", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(token_json)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class CalendarService:
+    """
+    Process-wide Google Calendar access with cached credentials and services.
+
+    Credentials are loaded once and shared; each thread gets its own built
+    service because the underlying httplib2 transport is not thread-safe.
+    A background thread refreshes the access token before it expires.
+    """
+
+    def __init__(self, token_path: str = TOKEN_PATH, credentials_path: str = CREDENTIALS_PATH):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self._creds = None
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._refresher: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def get_credentials(self, interactive: bool = True):
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        with self._lock:
+            if self._creds is None and os.path.exists(self.token_path):
+                self._creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
+
+            if self._creds is not None and self._creds.valid and not self._expiring():
+                return self._creds
+
+            if self._creds is not None and self._creds.refresh_token:
+                self._creds.refresh(Request())
+            elif not interactive:
+                raise RuntimeError("No refreshable Google Calendar token; run functions/google_calendar_test_setup.py.")
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
+                self._creds = flow.run_local_server(port=0)
+            write_token_atomically(self.token_path, self._creds.to_json())
+            logger.info("Google Calendar token refreshed.")
+            return self._creds
+
+    def get_service(self):
+        """Returns this thread's Calendar API service, building it on first use."""
+        from googleapiclient.discovery import build
+
+        creds = self.get_credentials()
+        service = getattr(self._local, "service", None)
+        if service is None or getattr(self._local, "creds", None) is not creds:
+            service = build("calendar", "v3", credentials=creds, cache_discovery=False)
+            self._local.service = service
+            self._local.creds = creds
+        return service
+
+    def start_background_refresh(self, interval: float = 60):
+        """Starts a daemon thread that refreshes the token shortly before it expires."""
+        if self._refresher is not None:
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, args=(interval,),
+                                           name="gcal-token-refresh", daemon=True)
+        self._refresher.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _expiring(self) -> bool:
+        # google-auth stores expiry as a naive UTC datetime
+        expiry = self._creds.expiry
+        return expiry is not None and expiry - datetime.utcnow() < REFRESH_MARGIN
+
+    def _refresh_loop(self, interval: float):
+        while not self._stopped.wait(interval):
+            try:
+                with self._lock:
+                    needs_refresh = self._creds is None or self._expiring()
+                if needs_refresh and os.path.exists(self.token_path):
+                    self.get_credentials(interactive=False)
+            except Exception as e:
+                logger.error(f"Background Google Calendar token refresh failed: {e}")
+
+
+_calendar_service: Optional[CalendarService] = None
+_calendar_service_lock = threading.Lock()
+
+
+def get_calendar() -> CalendarService:
+    global _calendar_service
+    with _calendar_service_lock:
+        if _calendar_service is None:
+            _calendar_service = CalendarService()
+        return _calendar_service
+
+
+def get_calendar_service():
+    """Returns a ready Calendar API service for the calling thread."""
+    return get_calendar().get_service()
@@ -0,0 +1,269 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from functions.storage import data_path
+
+logger = logging.getLogger(__name__)
+
+# All-day events ("date" instead of "dateTime") are placed in this time zone
+CALENDAR_TIMEZONE = os.getenv("CALENDAR_TIMEZONE", "Asia/Hong_Kong")
+
+
+class SyncTokenExpired(Exception):
+    """Raised by a backend when the server rejects the sync token (HTTP 410) and a full sync is needed."""
+
+
+def event_timestamp(when: dict) -> Optional[float]:
+    """Converts a Calendar API start/end object to a POSIX timestamp."""
+    if not when:
+        return None
+    if when.get("dateTime"):
+        return datetime.fromisoformat(when["dateTime"].replace("Z", "+00:00")).timestamp()
+    if when.get("date"):
+        import pytz
+        day = datetime.strptime(when["date"], "%Y-%m-%d")
+        return pytz.timezone(CALENDAR_TIMEZONE).localize(day).timestamp()
+    return None
+
+
+class GoogleCalendarBackend:
+    """Calendar API access through the shared calendar service."""
+
+    def __init__(self, calendar_id: str = "primary"):
+        self.calendar_id = calendar_id
+
+    def list_changes(self, sync_token: Optional[str] = None) -> Tuple[List[dict], str]:
+        """
+        Lists all events (full sync) or the changes since sync_token (incremental sync).
+
+        Returns:
+            Tuple[List[dict], str]: Changed events (cancelled ones have status "cancelled")
+            and the next sync token.
+        """
+        from googleapiclient.errors import HttpError
+        from functions.calendar_service import get_calendar_service
+
+        service = get_calendar_service()
+        events, page_token = [], None
+        while True:
+            params = {"calendarId": self.calendar_id, "singleEvents": True, "showDeleted": True,
+                      "maxResults": 2500, "pageToken": page_token}
+            if sync_token:
+                params["syncToken"] = sync_token
+            try:
+                result = service.events().list(**params).execute()
+            except HttpError as e:
+                if e.resp.status == 410:
+                    raise SyncTokenExpired() from e
+                raise
+            events.extend(result.get("items", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return events, result.get("nextSyncToken")
+
+    def insert_event(self, body: dict) -> dict:
+        from functions.calendar_service import get_calendar_service
+        return get_calendar_service().events().insert(calendarId=self.calendar_id, body=body).execute()
+
+    def insert_events(self, bodies: List[dict]) -> List[Optional[dict]]:
+        """
+        Inserts many events through the Calendar batch HTTP endpoint (50 requests per round trip).
+
+        Returns:
+            List[Optional[dict]]: The created event for each body, or None where the insert failed.
+        """
+        from functions.calendar_service import get_calendar_service
+
+        service = get_calendar_service()
+        results: List[Optional[dict]] = [None] * len(bodies)
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                logger.error(f"Batch insert of event {request_id} failed: {exception}")
+                return
+            results[int(request_id)] = response
+
+        for offset in range(0, len(bodies), 50):
+            batch = service.new_batch_http_request(callback=callback)
+            for i, body in enumerate(bodies[offset:offset + 50], start=offset):
+                batch.add(service.events().insert(calendarId=self.calendar_id, body=body), request_id=str(i))
+            batch.execute()
+        return results
+
+
+class FakeCalendarBackend:
+    """
+    In-memory stand-in for the Calendar API with the same incremental sync semantics.
+
+    Sync tokens encode a token epoch and a change counter; expire_tokens() starts a new
+    epoch, so the next incremental sync with an older token fails with SyncTokenExpired,
+    like an HTTP 410 from Google, while the token of the full resync that follows is valid.
+    """
+
+    def __init__(self, events: Optional[List[dict]] = None):
+        self._events: Dict[str, dict] = {}
+        self._changed_at: Dict[str, int] = {}
+        self._version = 0
+        self._epoch = 0
+        self._lock = threading.Lock()
+        for event in events or []:
+            self.insert_event(event)
+
+    def list_changes(self, sync_token: Optional[str] = None) -> Tuple[List[dict], str]:
+        with self._lock:
+            since = 0
+            if sync_token:
+                epoch, _, version = sync_token.partition(":")
+                if epoch != str(self._epoch) or not version.isdigit():
+                    raise SyncTokenExpired()
+                since = int(version)
+            changed = [dict(self._events[eid]) for eid, v in self._changed_at.items() if v > since]
+            if not sync_token:
+                changed = [e for e in changed if e.get("status") != "cancelled"]
+            return changed, f"{self._epoch}:{self._version}"
+
+    def insert_event(self, body: dict) -> dict:
+        with self._lock:
+            self._version += 1
+            event = dict(body)
+            event.setdefault("id", f"fake{self._version}")
+            event.setdefault("status", "confirmed")
+            event["htmlLink"] = f"https://calendar.example/event?eid={event['id']}"
+            self._events[event["id"]] = event
+            self._changed_at[event["id"]] = self._version
+            return dict(event)
+
+    def insert_events(self, bodies: List[dict]) -> List[Optional[dict]]:
+        return [self.insert_event(body) for body in bodies]
+
+    def delete_event(self, event_id: str):
+        with self._lock:
+            self._version += 1
+            self._events[event_id]["status"] = "cancelled"
+            self._changed_at[event_id] = self._version
+
+    def expire_tokens(self):
+        with self._lock:
+            self._epoch += 1
+
+
+class EventStore:
+    """SQLite copy of the calendar with indexed lookups by start and end time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id TEXT PRIMARY KEY,
+                    summary TEXT,
+                    start_ts REAL,
+                    end_ts REAL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_events_start ON events (start_ts);
+                CREATE INDEX IF NOT EXISTS idx_events_end ON events (end_ts);
+                CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT);
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def apply_changes(self, events: List[dict], sync_token: Optional[str], replace: bool = False):
+        """Upserts changed events and deletes cancelled ones in one transaction."""
+        with self._connect() as conn:
+            if replace:
+                conn.execute("DELETE FROM events")
+            for event in events:
+                if event.get("status") == "cancelled":
+                    conn.execute("DELETE FROM events WHERE id = ?", (event["id"],))
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO events (id, summary, start_ts, end_ts, data) VALUES (?, ?, ?, ?, ?)",
+                    (event["id"], event.get("summary"), event_timestamp(event.get("start")),
+                     event_timestamp(event.get("end")), json.dumps(event)),
+                )
+            if sync_token is not None:
+                conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('sync_token', ?)", (sync_token,))
+
+    def sync_token(self) -> Optional[str]:
+        row = self._connect().execute("SELECT value FROM sync_state WHERE key = 'sync_token'").fetchone()
+        return row[0] if row else None
+
+    def upcoming(self, after: float, limit: int = 10) -> List[dict]:
+        """Events that have not ended yet, ordered by start time."""
+        rows = self._connect().execute(
+            "SELECT data FROM events WHERE end_ts > ? ORDER BY start_ts LIMIT ?", (after, limit)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def between(self, start: float, end: float) -> List[dict]:
+        """Events overlapping the [start, end) range, ordered by start time."""
+        rows = self._connect().execute(
+            "SELECT data FROM events WHERE start_ts < ? AND end_ts > ? ORDER BY start_ts", (end, start)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+class CalendarSync:
+    """Keeps an EventStore current through incremental sync and writes events through to the backend."""
+
+    def __init__(self, store: EventStore, backend):
+        self.store = store
+        self.backend = backend
+        self._lock = threading.Lock()
+
+    def sync(self) -> int:
+        """
+        Pulls changes since the last sync token, falling back to a full sync when it has expired.
+
+        Returns:
+            int: The number of changed events applied.
+        """
+        with self._lock:
+            token = self.store.sync_token()
+            try:
+                events, next_token = self.backend.list_changes(token)
+                self.store.apply_changes(events, next_token, replace=token is None)
+            except SyncTokenExpired:
+                logger.info("Calendar sync token expired, running a full sync.")
+                events, next_token = self.backend.list_changes(None)
+                self.store.apply_changes(events, next_token, replace=True)
+            if events:
+                logger.info(f"Calendar sync applied {len(events)} changes.")
+            return len(events)
+
+    def insert_event(self, body: dict) -> dict:
+        event = self.backend.insert_event(body)
+        self.store.apply_changes([event], None)
+        return event
+
+    def insert_events(self, bodies: List[dict]) -> List[Optional[dict]]:
+        events = self.backend.insert_events(bodies)
+        self.store.apply_changes([event for event in events if event is not None], None)
+        return events
+
+
+_calendar_sync: Optional[CalendarSync] = None
+_calendar_sync_lock = threading.Lock()
+
+
+def get_calendar_sync() -> CalendarSync:
+    """Returns the process-wide calendar store synced against Google Calendar."""
+    global _calendar_sync
+    with _calendar_sync_lock:
+        if _calendar_sync is None:
+            _calendar_sync = CalendarSync(EventStore(data_path("calendar.sqlite")), GoogleCalendarBackend())
+        return _calendar_sync
@@ -28,7 +28,8 @@ def read_and_identify_code(self, file_name: str) -> tuple:
 
 def gather_project_files(self, directory: str) -> dict:
     """
-    Gathers project files from the specified directory (e.g., requirements.txt or package.json).
+    Gathers project files from the specified directory: source files plus dependency
+    manifests (requirements.txt, package.json, package-lock.json).
 
     Args:
         directory (str): The directory where the project files are located.
@@ -37,18 +38,15 @@ def gather_project_files(self, directory: str) -> dict:
         dict: A dictionary of filenames and their contents, or an error string.
     """
     import os
+    from functions.dependency_cache import MANIFESTS
+    manifest_names = {name for names in MANIFESTS.values() for name in names}
     project_files = {}
     try:
-        '''for filename in os.listdir(directory):
-            filepath = os.path.join(directory, filename)
-            if filename in ['requirements.txt', 'package.json']:  # Extendable to other files
-                with open(filepath, 'r') as file:
-                    project_files[filename] = file.read()
-        return project_files'''
         for filename in os.listdir(directory):
             filepath = os.path.join(directory, filename)
-            # 检查文件是否以 .py 结尾
-            if filename.endswith('.py'):
+            if not os.path.isfile(filepath):
+                continue
+            if filename in manifest_names or filename.endswith(('.py', '.ts', '.sh')):
                 with open(filepath, 'r', encoding='utf-8') as file:
                     project_files[filename] = file.read()
         return project_files
@@ -154,30 +152,18 @@ def start_code_execution_container(self, language: str) -> str:
     Returns:
         str: The ID of the started Docker container or an error message.
     """
-    import docker
+    from functions.sandbox_pool import get_pool
     try:
-        client = docker.from_env()
-        image_map = {
-            'python': 'python-sandbox',
-            'typescript': 'typescript-sandbox',
-            'shell': 'shell-sandbox'
-        }
-        image = image_map.get(language, 'python-sandbox')
-
-        container = client.containers.run(
-            image,
-            stdin_open=True,
-            tty=True,
-            detach=True,
-            remove=True
-        )
-        return container.id
+        # Lease a pre-warmed container; it goes back to the pool via stop_docker_container
+        pooled = get_pool().acquire(language)
+        return pooled.id
     except Exception as e:
         return f"Error starting container: {str(e)}"
 
 def install_dependencies(self, container_id: str, language: str, project_files_json: str) -> str:
     """
-    Automatically installs dependencies in the Docker container based on the provided files.
+    Installs dependencies in the Docker container based on the provided files. Installation
+    is skipped when the container already has the same requirements installed.
 
     Args:
         container_id (str): The ID of the running Docker container.
@@ -187,66 +173,60 @@ def install_dependencies(self, container_id: str, language: str, project_files_j
     Returns:
         str: The result of the dependency installation.
     """
-    import json, docker
+    import json
+    from functions.dependency_cache import MANIFESTS, get_dependency_cache
+    from functions.sandbox_pool import get_docker_client, get_pool
     try:
         project_files = json.loads(project_files_json)
-        client = docker.from_env()
-        container = client.containers.get(container_id)
-
-        if language == 'python' and 'requirements.txt' in project_files:
-            exec_result = container.exec_run(cmd="pip install -r /sandbox/requirements.txt")
-        elif language == 'typescript' and 'package.json' in project_files:
-            exec_result = container.exec_run(cmd="npm install", workdir="/sandbox")
-        else:
+        manifests = {name: project_files[name] for name in MANIFESTS.get(language, []) if name in project_files}
+        if not manifests or MANIFESTS[language][0] not in manifests:
             return "No dependency file found."
 
-        if exec_result.exit_code == 0:
-            return "Dependencies installed successfully."
-        else:
-            return f"Error during dependency installation: {exec_result.output.decode('utf-8')}"
+        get_pool().touch(container_id)  # keeps a leased sandbox from being reclaimed
+        container = get_docker_client().containers.get(container_id)
+        ok, output = get_dependency_cache().install_into(container, language, manifests)
+        if not ok:
+            return f"Error during dependency installation: {output}"
+        if output == "cached":
+            return "Dependencies already installed."
+        return "Dependencies installed successfully."
     except Exception as e:
         return f"Error installing dependencies: {str(e)}"
 
-def execute_code_in_container(self, container_id: str, code: str, language: str) -> str:
+def execute_code_in_container(self, container_id: str, code: str, language: str, timeout: int = 30) -> str:
     """
-    Executes the provided code inside the Docker container.
+    Executes the provided code inside the Docker container, streaming its output to the user as it runs.
 
     Args:
         container_id (str): The ID of the running Docker container.
         code (str): The code to execute.
         language (str): The programming language of the code.
+        timeout (int): Wall-clock limit in seconds before the process is killed.
 
     Returns:
-        str: The result or output from executing the code.
+        str: A JSON object with exit_code, stdout, stderr, wall_time, cpu_user, cpu_system,
+             peak_rss_bytes, timed_out, output_truncated and oom_killed, or an error message.
     """
-    import docker
+    import json
+    from functions.coding_functions import create_tar_with_file
+    from functions.sandbox_exec import ExecLimits, RUN_COMMANDS, run_with_broadcast
+    from functions.sandbox_pool import get_docker_client, get_pool
     try:
-        client = docker.from_env()
+        client = get_docker_client()
+        get_pool().touch(container_id)  # keeps a leased sandbox from being reclaimed
         container = client.containers.get(container_id)
 
         # Save the code to a temporary file inside the container
-        if language == 'python':
-            file_path = '/sandbox/temp_code.py'
-            container.put_archive("/sandbox", create_tar_with_file("temp_code.py", code))
-            exec_command = f"python {file_path}"
-        elif language == 'typescript':
-            file_path = '/sandbox/temp_code.ts'
-            container.put_archive("/sandbox", create_tar_with_file("temp_code.ts", code))
-            exec_command = f"ts-node {file_path}"
-        elif language == 'shell':
-            file_path = '/sandbox/temp_code.sh'
-            container.put_archive("/sandbox", create_tar_with_file("temp_code.sh", code))
-            exec_command = f"bash {file_path}"
-        else:
+        extensions = {'python': 'py', 'typescript': 'ts', 'shell': 'sh'}
+        if language not in extensions:
             return f"Unsupported language: {language}"
+        file_name = f"temp_code.{extensions[language]}"
+        container.put_archive("/sandbox", create_tar_with_file(file_name, code))
+        exec_command = RUN_COMMANDS[language].format(path=f"/sandbox/{file_name}")
 
-        # Execute the file in the container
-        exec_result = container.exec_run(cmd=exec_command, workdir="/sandbox")
-
-        if exec_result.exit_code == 0:
-            return exec_result.output.decode('utf-8')
-        else:
-            return f"Error executing code: {exec_result.output.decode('utf-8')}"
+        # Execute the file in the container, forwarding output chunks to the WebSocket clients
+        result = run_with_broadcast(container, exec_command, limits=ExecLimits(timeout=timeout))
+        return json.dumps(result.dict())
     except Exception as e:
         return f"Error executing code: {str(e)}"
 
@@ -274,6 +254,28 @@ def create_tar_with_file(filename: str, content: str) -> bytes:
     tar_stream.seek(0)
     return tar_stream.read()
 
+def sync_project_to_container(self, container_id: str, project_directory: str) -> str:
+    """
+    Copies a local project directory into /sandbox of the Docker container. Files listed in
+    .gitignore are skipped and files unchanged since the last sync are not sent again.
+
+    Args:
+        container_id (str): The ID of the running Docker container.
+        project_directory (str): The local directory of the project.
+
+    Returns:
+        str: A JSON object with counts of uploaded, unchanged, deleted and skipped files, or an error message.
+    """
+    import json
+    from functions.project_sync import sync_project
+    from functions.sandbox_pool import get_docker_client, get_pool
+    try:
+        get_pool().touch(container_id)  # keeps a leased sandbox from being reclaimed
+        container = get_docker_client().containers.get(container_id)
+        return json.dumps(sync_project(container, project_directory))
+    except Exception as e:
+        return f"Error syncing project: {str(e)}"
+
 def capture_container_logs(self, container_id: str) -> str:
     """
     Captures and returns the logs from the Docker container for debugging purposes.
@@ -284,9 +286,9 @@ def capture_container_logs(self, container_id: str) -> str:
     Returns:
         str: The logs generated during execution.
     """
-    import docker
+    from functions.sandbox_pool import get_docker_client
     try:
-        client = docker.from_env()
+        client = get_docker_client()
         container = client.containers.get(container_id)
         logs = container.logs().decode('utf-8')
         return logs
@@ -305,31 +307,87 @@ def handle_code_execution(self, file_name: str, project_directory: str = "/sandb
         str: The result or debugging output from the code execution.
     """
     import json
+    import os
+    import shlex
+    from functions.coding_functions import read_and_identify_code, execute_code_in_container, capture_container_logs
+    from functions.dependency_cache import find_manifests, get_dependency_cache
+    from functions.project_sync import sync_project
+    from functions.sandbox_exec import RUN_COMMANDS, run_with_broadcast
+    from functions.sandbox_pool import get_pool
+
     # Step 1: Read the code and identify its language
-    code, language = read_and_identify_code(file_name)
+    code, language = read_and_identify_code(self, file_name)
     if language is None:
         return code  # Error message
 
-    # Step 2: Start a container for the identified language
-    container_id = start_code_execution_container(language)
-    if "Error" in container_id:
-        return container_id  # Error starting container
-
-    # Step 3: Gather project files and install dependencies (if any)
-    project_files = gather_project_files(project_directory)
-    if isinstance(project_files, str) and "Error" in project_files:
-        return project_files  # Error gathering files
-
-    if project_files:  # If there are dependencies to install
-        project_files_json = json.dumps(project_files)
-        install_result = install_dependencies(container_id, language, project_files_json)
-        if "Error" in install_result:
-            return install_result  # Error installing dependencies
-
-    # Step 4: Execute the code in the container
-    exec_result = execute_code_in_container(container_id, code, language)
-    if "Error" in exec_result:
-        logs = capture_container_logs(container_id)
-        return f"Execution failed. Debug logs:\n{logs}"
-    
-    return exec_result  # Return the successful result of code execution
+    # Step 2: Resolve the image, reusing cached dependencies (installs only on a cache miss)
+    cache = get_dependency_cache()
+    manifests = find_manifests(project_directory, language) if os.path.isdir(project_directory) else {}
+    try:
+        image, cache_status = cache.image_for(language, manifests)
+    except Exception as e:
+        return f"Error installing dependencies: {str(e)}"
+
+    # Step 3: Lease a warm container of that image
+    try:
+        pooled = get_pool().acquire(language, image=image)
+    except Exception as e:
+        return f"Error starting container: {str(e)}"
+    container_id = pooled.id
+    if cache_status != "none":
+        cache.prepare(pooled.container, language)
+
+    try:
+        # Step 4: Execute the code in the container. Files that belong to the project run in
+        # place after syncing the whole project, so imports between project files work.
+        rel_path = None
+        if os.path.isdir(project_directory):
+            rel_path = os.path.relpath(os.path.abspath(file_name), os.path.abspath(project_directory))
+        if rel_path is not None and not rel_path.startswith(".."):
+            sync_project(pooled.container, project_directory)
+            command = RUN_COMMANDS[language].format(path=shlex.quote(rel_path.replace(os.sep, "/")))
+            exec_result = json.dumps(run_with_broadcast(pooled.container, command).dict())
+        else:
+            exec_result = execute_code_in_container(self, container_id, code, language)
+        if not exec_result.startswith("{"):
+            pooled.dirty = True
+            return exec_result  # Error before the code could run
+        result = json.loads(exec_result)
+        if result["timed_out"] or result["oom_killed"] or result["output_truncated"]:
+            pooled.dirty = True
+        if result["exit_code"] != 0:
+            logs = capture_container_logs(self, container_id)
+            return f"Execution failed. Result:\n{exec_result}\nDebug logs:\n{logs}"
+
+        return exec_result  # Return the successful result of code execution
+    finally:
+        # Step 5: Reset the container and hand it back to the pool
+        get_pool().release(pooled)
+
+def handle_batch_execution(self, targets_json: str, project_directory: str = "", max_parallel: int = 4, timeout: int = 60) -> str:
+    """
+    Runs many code files or shell commands concurrently in separate sandboxes, e.g. a test suite
+    or several scripts to compare, and returns one aggregated report.
+
+    Args:
+        targets_json (str): A JSON list of file paths, or of objects with a "file" or "command" key
+            (optionally "language" and "name"), e.g. '["tests/test_a.py", {"command": "pytest -q"}]'.
+        project_directory (str): Local project directory copied into every sandbox; file paths are relative to it.
+        max_parallel (int): Maximum number of sandboxes running at the same time.
+        timeout (int): Wall-clock limit per target in seconds.
+
+    Returns:
+        str: A JSON report with total, passed, failed, wall_time, slowest and per-target exit codes,
+             timings and truncated logs, or an error message.
+    """
+    import json
+    from functions.batch_runner import run_batch
+    try:
+        targets = json.loads(targets_json)
+        if not isinstance(targets, list):
+            return "Error: targets_json must be a JSON list."
+        report = run_batch(targets, project_directory=project_directory or None,
+                           max_parallel=max_parallel, timeout=timeout)
+        return json.dumps(report)
+    except Exception as e:
+        return f"Error running batch: {str(e)}"
@@ -369,6 +369,13 @@ flowchart LR
 
     print(f"Markdown conversion complete! Files saved at:\n  {file_analysis_md_path}\n  {summary_analysis_md_path}")
 
+    # Add the per-file analyses and the summary to the local search index
+    from functions.retrieval_index import get_index
+    index = get_index()
+    for result in analysis_results:
+        index.add_document(f"analyze_project:{os.path.abspath(result['file'])}", result["analysis"], {"source": result["file"]})
+    index.add_document(f"analyze_project:{os.path.abspath(project_folder)}", summary_analysis_md, {"source": summary_analysis_md_path})
+
     # Step 5: Generate file tree visualization
     file_comments = [result["analysis"] for result in analysis_results]
     file_tree_diagram = generate_file_tree_diagram(project_folder, file_manifest, file_comments)
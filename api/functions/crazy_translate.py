@@ -407,6 +407,11 @@ def pdf_translate(self, input_path: str, output_path: str) -> str:
         md_report_name = f"{os.path.basename(input_path)}.trans.md"
         md_report_path = os.path.join(output_path, md_report_name)
         os.rename(md_report_name, md_report_path)
+
+        # 将翻译报告写入本地检索索引
+        from functions.retrieval_index import get_index
+        with open(md_report_path, 'r', encoding='utf-8') as f:
+            get_index().add_document(f"pdf_translate:{os.path.abspath(input_path)}", f.read(), {"source": md_report_path})
         print("result:")
         return(result)
         #return(f"Markdown report saved to: {md_report_path}")
@@ -0,0 +1,168 @@
+import os
+import heapq
+import sqlite3
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+
+from functions.event_bus import publish, subscribe, unsubscribe
+from functions.storage import data_path
+from functions.task_store import TaskStore, get_task_store
+
+logger = logging.getLogger(__name__)
+
+# Seconds before the deadline at which reminders fire, e.g. "86400,3600"
+REMINDER_LEADS = [int(lead) for lead in os.getenv("TASK_REMINDER_LEADS", "3600").split(",") if lead.strip()]
+
+JOB_ID = "deadline_scheduler"
+
+# (fire_ts, -priority, task_id, lead, due_ts) — lead 0 is the deadline itself
+Entry = Tuple[float, int, int, int, float]
+
+
+class DeadlineScheduler:
+    """
+    Fires task reminders and deadline wakeups from a heap ordered by fire time and priority.
+
+    Only one APScheduler date job exists at a time, armed for the heap top, so a tick costs
+    O(k log n) for the k entries due rather than a scan of every pending task. Changes to the
+    task store arrive as "tasks_changed" events; entries for tasks that were completed,
+    deleted or rescheduled are dropped lazily when they reach the top. Fired entries are
+    recorded in SQLite so a restart neither repeats nor loses reminders.
+    """
+
+    def __init__(self, scheduler, store: TaskStore, path: str,
+                 on_reminder: Optional[Callable[[dict, int], None]] = None,
+                 on_deadline: Optional[Callable[[dict], None]] = None,
+                 leads: Optional[List[int]] = None, jobstore: str = "default"):
+        self.scheduler = scheduler
+        self.jobstore = jobstore
+        self.store = store
+        self.path = path
+        self.on_reminder = on_reminder or self._publish_reminder
+        self.on_deadline = on_deadline or (lambda task: None)
+        self.leads = sorted({0, *(leads if leads is not None else REMINDER_LEADS)}, reverse=True)
+        self._heap: List[Entry] = []
+        self._lock = threading.RLock()
+        self._armed_for: Optional[float] = None
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fired (
+                    task_id INTEGER NOT NULL,
+                    due_ts REAL NOT NULL,
+                    lead INTEGER NOT NULL,
+                    fired_ts REAL NOT NULL,
+                    PRIMARY KEY (task_id, due_ts, lead)
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def start(self):
+        """Builds the heap from the pending tasks, arms the first job and follows task changes."""
+        fired = set(self._connect().execute("SELECT task_id, due_ts, lead FROM fired").fetchall())
+        entries = []
+        for task in self.store.due_before(float("inf")):
+            for lead in self.leads:
+                if (task["id"], task["due_ts"], lead) not in fired:
+                    entries.append((task["due_ts"] - lead, -task["priority"], task["id"], lead, task["due_ts"]))
+        with self._lock:
+            heapq.heapify(entries)
+            self._heap = entries
+            self._arm()
+        subscribe(self._on_task_event)
+        logger.info(f"Deadline scheduler started with {len(entries)} pending reminders.")
+
+    def stop(self):
+        unsubscribe(self._on_task_event)
+        if self.scheduler.get_job(JOB_ID) is not None:
+            self.scheduler.remove_job(JOB_ID)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._heap)
+
+    def _on_task_event(self, event: dict):
+        if event.get("type") != "tasks_changed" or event.get("action") != "pushed":
+            return
+        task = event["task"]
+        if not task.get("due_ts"):
+            return
+        with self._lock:
+            for lead in self.leads:
+                heapq.heappush(self._heap, (task["due_ts"] - lead, -task["priority"], task["id"], lead, task["due_ts"]))
+            self._arm()
+
+    def _arm(self):
+        """Points the single date job at the earliest entry (caller holds the lock)."""
+        if not self._heap:
+            if self.scheduler.get_job(JOB_ID) is not None:
+                self.scheduler.remove_job(JOB_ID)
+            self._armed_for = None
+            return
+        fire_ts = self._heap[0][0]
+        if fire_ts == self._armed_for and self.scheduler.get_job(JOB_ID) is not None:
+            return
+        self.scheduler.add_job(self.tick, 'date', id=JOB_ID, jobstore=self.jobstore, replace_existing=True,
+                               misfire_grace_time=None,
+                               run_date=datetime.fromtimestamp(max(fire_ts, time.time()), timezone.utc))
+        self._armed_for = fire_ts
+
+    def tick(self):
+        """Fires every entry that is due, then re-arms for the next one."""
+        now = time.time()
+        due: List[Entry] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+            self._armed_for = None
+            self._arm()
+
+        for _, _, task_id, lead, due_ts in due:
+            task = self.store.get(task_id)
+            # Completed, deleted or rescheduled since the entry was queued
+            if task is None or task["status"] != "pending" or task["due_ts"] != due_ts:
+                continue
+            # A reminder that was missed until after the deadline is superseded by the deadline itself
+            if lead and now >= due_ts:
+                continue
+            with self._connect() as conn:
+                cursor = conn.execute("INSERT OR IGNORE INTO fired (task_id, due_ts, lead, fired_ts) VALUES (?, ?, ?, ?)",
+                                      (task_id, task["due_ts"], lead, now))
+            if cursor.rowcount == 0:
+                continue
+            try:
+                if lead == 0:
+                    self.on_deadline(task)
+                else:
+                    self.on_reminder(task, lead)
+            except Exception as e:
+                logger.error(f"Error firing {'deadline' if lead == 0 else 'reminder'} for task {task_id}: {e}")
+
+    @staticmethod
+    def _publish_reminder(task: dict, lead: int):
+        minutes = round(lead / 60)
+        publish({"type": "task_reminder", "task": task, "lead_seconds": lead,
+                 "message": f"Reminder: \"{task['description']}\" is due in {minutes} minutes ({task['due']})."})
+
+
+_deadline_scheduler: Optional[DeadlineScheduler] = None
+_deadline_scheduler_lock = threading.Lock()
+
+
+def get_deadline_scheduler(scheduler=None, **kwargs) -> DeadlineScheduler:
+    """Returns the process-wide deadline scheduler; the first call must pass the APScheduler instance."""
+    global _deadline_scheduler
+    with _deadline_scheduler_lock:
+        if _deadline_scheduler is None:
+            _deadline_scheduler = DeadlineScheduler(scheduler, get_task_store(), data_path("deadlines.sqlite"), **kwargs)
+        return _deadline_scheduler
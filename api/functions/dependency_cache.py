@@ -0,0 +1,200 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from functions.sandbox_pool import IMAGE_MAP, DEFAULT_IMAGE, get_docker_client, get_pool
+
+logger = logging.getLogger(__name__)
+
+# Dependency manifests per language; their contents determine the cache key
+MANIFESTS = {
+    'python': ['requirements.txt'],
+    'typescript': ['package.json', 'package-lock.json'],
+}
+
+# Dependencies are installed under /deps so they survive the pool's /sandbox reset
+INSTALL_COMMANDS = {
+    'python': "pip install --no-cache-dir -r /deps/requirements.txt",
+    'typescript': "cd /deps && if [ -f package-lock.json ]; then npm ci; else npm install; fi",
+}
+DIGEST_FILE = "/deps/.pgc_digest"
+DERIVED_REPOSITORY = "pgc-deps"
+
+# Derived images kept; after each build the least recently used ones beyond this are removed
+MAX_DERIVED_IMAGES = int(os.getenv("DEPS_CACHE_MAX_IMAGES", "20"))
+
+
+def find_manifests(directory: str, language: str) -> Dict[str, str]:
+    """Reads the dependency manifests for a language from the project directory."""
+    manifests = {}
+    for name in MANIFESTS.get(language, []):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                manifests[name] = f.read()
+    return manifests
+
+
+def manifest_digest(language: str, manifests: Dict[str, str]) -> str:
+    """Hashes the base image and manifest contents into a stable cache key."""
+    h = hashlib.sha256(IMAGE_MAP.get(language, DEFAULT_IMAGE).encode())
+    for name in sorted(manifests):
+        h.update(b"\0" + name.encode() + b"\0" + manifests[name].encode())
+    return h.hexdigest()[:20]
+
+
+class DependencyCache:
+    """
+    Caches installed dependencies as derived sandbox images keyed by manifest hash.
+
+    The first run of a project installs its dependencies into a pooled base
+    container and commits it as pgc-deps:<language>-<digest>. Later runs with
+    the same manifests lease containers of that image and skip installation.
+    At most max_images derived images are kept, evicting the least recently used.
+    """
+
+    def __init__(self, client, pool, max_images: int = MAX_DERIVED_IMAGES):
+        self.client = client
+        self.pool = pool
+        self.max_images = max_images
+        self._known = set()
+        self._last_used: Dict[str, float] = {}
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def image_for(self, language: str, manifests: Dict[str, str]) -> Tuple[str, str]:
+        """
+        Returns the image to run a project in, building its dependency image on a cache miss.
+
+        Args:
+            language (str): The project language.
+            manifests (Dict[str, str]): Manifest filenames and contents (see find_manifests).
+
+        Returns:
+            Tuple[str, str]: The image name and one of "none", "hit" or "built".
+        """
+        base = IMAGE_MAP.get(language, DEFAULT_IMAGE)
+        if language not in INSTALL_COMMANDS or MANIFESTS[language][0] not in manifests:
+            return base, "none"
+
+        digest = manifest_digest(language, manifests)
+        image = f"{DERIVED_REPOSITORY}:{language}-{digest}"
+        if self._exists(image):
+            self._last_used[image] = time.time()
+            return image, "hit"
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault(digest, threading.Lock())
+        with build_lock:
+            # Another caller may have built it while we waited
+            if self._exists(image):
+                self._last_used[image] = time.time()
+                return image, "hit"
+            self._build(language, manifests, digest, base)
+            self._last_used[image] = time.time()
+        self.prune()
+        return image, "built"
+
+    def prune(self) -> int:
+        """
+        Removes the least recently used derived images beyond max_images. Images still used
+        by a container are skipped until a later prune.
+
+        Returns:
+            int: The number of images removed.
+        """
+        tagged = []
+        for image in self.client.images.list(name=DERIVED_REPOSITORY):
+            for tag in image.tags:
+                if tag.startswith(f"{DERIVED_REPOSITORY}:"):
+                    tagged.append((self._last_used.get(tag) or _created_ts(image), tag))
+        tagged.sort(reverse=True)
+        removed = 0
+        for _, tag in tagged[self.max_images:]:
+            try:
+                self.client.images.remove(tag)
+            except Exception as e:
+                logger.info(f"Keeping dependency image {tag} for now: {e}")
+                continue
+            self._known.discard(tag)
+            self._last_used.pop(tag, None)
+            removed += 1
+        if removed:
+            logger.info(f"Removed {removed} least recently used dependency images.")
+        return removed
+
+    def install_into(self, container, language: str, manifests: Dict[str, str]) -> Tuple[bool, str]:
+        """
+        Installs dependencies into an already running container unless it already has them.
+
+        Returns:
+            Tuple[bool, str]: Whether installation succeeded and "cached" or the install output.
+        """
+        from functions.coding_functions import create_tar_with_file
+        from functions.sandbox_exec import ExecLimits, stream_exec
+
+        digest = manifest_digest(language, manifests)
+        current = container.exec_run(cmd=["cat", DIGEST_FILE])
+        if current.exit_code == 0 and current.output.decode().strip() == digest:
+            return True, "cached"
+
+        container.exec_run(cmd=["mkdir", "-p", "/deps"])
+        for name, content in manifests.items():
+            container.put_archive("/deps", create_tar_with_file(name, content))
+        result = stream_exec(container, INSTALL_COMMANDS[language], limits=ExecLimits(timeout=900, memory_mb=None), workdir="/deps")
+        if result.exit_code != 0:
+            return False, result.stdout + result.stderr
+        container.exec_run(cmd=["sh", "-c", f"echo {digest} > {DIGEST_FILE}"])
+        return True, result.stdout
+
+    def prepare(self, container, language: str):
+        """Links cached node_modules into /sandbox after a lease, since the reset wipes it."""
+        if language == 'typescript':
+            container.exec_run(cmd=["sh", "-c", "[ -d /deps/node_modules ] && ln -sfn /deps/node_modules /sandbox/node_modules"])
+
+    def _exists(self, image: str) -> bool:
+        if image in self._known:
+            return True
+        try:
+            self.client.images.get(image)
+        except Exception:
+            return False
+        self._known.add(image)
+        return True
+
+    def _build(self, language: str, manifests: Dict[str, str], digest: str, base: str):
+        logger.info(f"Dependency cache miss for {language} project ({digest}), building image.")
+        with self.pool.lease(image=base) as pooled:
+            # The container now carries installed packages, so never hand it out again
+            pooled.dirty = True
+            ok, output = self.install_into(pooled.container, language, manifests)
+            if not ok:
+                raise RuntimeError(f"Dependency installation failed:\n{output}")
+            pooled.container.commit(repository=DERIVED_REPOSITORY, tag=f"{language}-{digest}")
+        self._known.add(f"{DERIVED_REPOSITORY}:{language}-{digest}")
+
+
+def _created_ts(image) -> float:
+    """Creation time of a Docker image, the recency of images not used since startup."""
+    try:
+        # Docker reports nanoseconds ("2024-05-01T12:00:00.123456789Z"); seconds are enough here
+        created = datetime.fromisoformat(image.attrs["Created"][:19]).replace(tzinfo=timezone.utc)
+        return created.timestamp()
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
+
+_cache: Optional[DependencyCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_dependency_cache() -> DependencyCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DependencyCache(get_docker_client(), get_pool())
+        return _cache
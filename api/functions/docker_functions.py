@@ -10,9 +10,9 @@ def start_docker_container(self, container_id: str) -> str:
     Returns:
         str: Status message indicating the result of the start action.
     """
-    import docker
+    from functions.sandbox_pool import get_docker_client
     try:
-        client = docker.from_env()
+        client = get_docker_client()
         container = client.containers.get(container_id)
         
         # Start the container
@@ -31,9 +31,13 @@ def stop_docker_container(self, container_id: str) -> str:
     Returns:
         str: Status message indicating the result of the stop action.
     """
-    import docker
+    from functions.sandbox_pool import get_docker_client, get_pool
     try:
-        client = docker.from_env()
+        # Containers leased from the sandbox pool are reset and kept warm instead
+        if get_pool().release_by_id(container_id):
+            return f"Container {container_id} returned to the sandbox pool."
+
+        client = get_docker_client()
         container = client.containers.get(container_id)
         
         # Stop and remove the container
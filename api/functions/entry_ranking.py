@@ -0,0 +1,326 @@
+import os
+import re
+import math
+import time
+import calendar
+import hashlib
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Keyword → importance weight. A keyword counts once per field, title hits are boosted.
+DEFAULT_KEYWORD_WEIGHTS: Dict[str, float] = {
+    'zero-day': 5.0,
+    'exploit': 4.0,
+    'ransomware': 4.0,
+    'breach': 3.0,
+    'vulnerability': 3.0,
+    'attack': 2.0,
+    'hacker': 2.0,
+    'bug': 1.0,
+    'cyber': 1.0,
+}
+
+# Scores halve every NEWSLETTER_HALF_LIFE_HOURS; entries without a date count as one half-life old
+HALF_LIFE_HOURS = float(os.getenv("NEWSLETTER_HALF_LIFE_HOURS", "24"))
+
+TAG = re.compile(r'<[^>]+>')
+WORD = re.compile(r'\w+')
+RFC822_DATE = re.compile(r'^(?:[A-Za-z]{3},\s*)?(\d{1,2})\s+([A-Za-z]{3})\s+(\d{4})\s+(\d{1,2}):(\d{2})(?::(\d{2}))?'
+                         r'\s*(?:([+-])(\d{2})(\d{2})|GMT|UTC?|Z)?\s*$')
+MONTHS = {month: number for number, month in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1)}
+
+
+def normalize_keyword(keyword: str) -> str:
+    """Lowercases a keyword and collapses its whitespace, so "Supply  Chain" is "supply chain"."""
+    return " ".join(keyword.lower().split())
+
+
+class AhoCorasick:
+    """
+    Multi-pattern substring matcher: every keyword is found in one pass over the text.
+
+    Single-word keywords cannot span whitespace, so the text is split into whitespace-
+    separated tokens and each token is walked through the automaton on its own. Feed text
+    repeats the same words constantly, so each token's result is memoized and most tokens
+    are settled by a set lookup. Keywords containing whitespace ("supply chain") are
+    phrases, searched in the text with its whitespace collapsed to single spaces.
+
+    Up to `direct_limit` keywords, one C-level substring search per keyword is cheaper than
+    tokenizing, so small keyword sets skip the automaton.
+    """
+
+    def __init__(self, keywords: Iterable[str], memo_size: int = 100_000, direct_limit: int = 16):
+        self.keywords = sorted({normalize_keyword(k) for k in keywords if k.strip()})
+        self.phrases = [k for k in self.keywords if " " in k]
+        self.direct = len(self.keywords) <= direct_limit
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[str, ...]] = [()]
+        for keyword in self.keywords:
+            if " " in keyword:
+                continue
+            state = 0
+            for char in keyword:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._out[state] += (keyword,)
+
+        # Breadth-first failure links; each state also inherits the outputs of its failure state
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, child in self._goto[state].items():
+                pending.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._out[child] += self._out[self._fail[child]]
+
+        self._hits: Dict[str, Tuple[str, ...]] = {}
+        self._misses: Set[str] = set()
+        self._memo_size = memo_size
+
+    def _walk(self, token: str) -> Tuple[str, ...]:
+        goto, fail, out = self._goto, self._fail, self._out
+        state, found = 0, []
+        for char in token:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.extend(out[state])
+        return tuple(found)
+
+    def find(self, text: str) -> Set[str]:
+        """Returns the keywords occurring in the text (case-insensitive)."""
+        if self.direct:
+            text = text.lower()
+            if self.phrases:
+                text = " ".join(text.split())
+            return {keyword for keyword in self.keywords if keyword in text}
+        found: Set[str] = set()
+        tokens = text.lower().split()
+        if self.phrases:
+            joined = " ".join(tokens)
+            found.update(phrase for phrase in self.phrases if phrase in joined)
+        # Tokens already known to hold no keyword are dropped by one set difference
+        for token in set(tokens) - self._misses:
+            hits = self._hits.get(token)
+            if hits is None:
+                if len(self._misses) + len(self._hits) >= self._memo_size:
+                    self._misses.clear()
+                    self._hits.clear()
+                hits = self._walk(token)
+                if hits:
+                    self._hits[token] = hits
+                else:
+                    self._misses.add(token)
+            found.update(hits)
+        return found
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the text's words; similar texts differ in few bits."""
+    counts = [0] * 64
+    for word in set(WORD.findall(text.lower())):
+        value = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            counts[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if counts[bit] > 0)
+
+
+class NearDuplicateIndex:
+    """
+    SimHash fingerprints searchable by Hamming distance.
+
+    Fingerprints are split into max_distance + 1 bands: two fingerprints within the
+    distance share at least one identical band, so only fingerprints bucketed under one
+    of the query's bands are compared.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self._width = 64 // self.bands
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(self.bands)]
+
+    def _keys(self, fingerprint: int) -> List[int]:
+        mask = (1 << self._width) - 1
+        return [fingerprint >> (band * self._width) & mask for band in range(self.bands)]
+
+    def contains_near(self, fingerprint: int) -> bool:
+        for bucket, key in zip(self._buckets, self._keys(fingerprint)):
+            for other in bucket.get(key, ()):
+                if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                    return True
+        return False
+
+    def add(self, fingerprint: int):
+        for bucket, key in zip(self._buckets, self._keys(fingerprint)):
+            bucket.setdefault(key, []).append(fingerprint)
+
+
+def parse_published(published: Optional[str]) -> Optional[float]:
+    """Parses an RSS (RFC 822) or ISO 8601 date into a UTC timestamp."""
+    if not published:
+        return None
+    # Fast path for the numeric-offset RFC 822 dates nearly every feed uses
+    match = RFC822_DATE.match(published)
+    if match and match.group(2).lower() in MONTHS:
+        day, month, year, hour, minute, second, sign, offset_hours, offset_minutes = match.groups()
+        timestamp = calendar.timegm((int(year), MONTHS[month.lower()], int(day), int(hour), int(minute),
+                                     int(second or 0), 0, 0, 0))
+        if sign:
+            offset = int(offset_hours) * 3600 + int(offset_minutes) * 60
+            timestamp -= offset if sign == "+" else -offset
+        return float(timestamp)
+    try:
+        parsed = parsedate_to_datetime(published)
+    except (TypeError, ValueError, IndexError):
+        try:
+            parsed = datetime.fromisoformat(published.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class EntryRanker:
+    """
+    Ranks feed entries by weighted keyword matches in title and summary, decayed by age.
+
+    Entries are then taken best first, skipping any whose SimHash is within
+    `max_distance` bits of one already taken, so the same story syndicated by several
+    feeds appears once. Fingerprints are only computed for entries that reach the
+    selection, not for the whole input.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, title_boost: float = 2.0,
+                 half_life_hours: float = HALF_LIFE_HOURS, max_distance: int = 3):
+        self.weights = {normalize_keyword(k): w for k, w in (weights or DEFAULT_KEYWORD_WEIGHTS).items()
+                        if k.strip()}
+        self.matcher = AhoCorasick(self.weights)
+        self.title_boost = title_boost
+        self.half_life = half_life_hours * 3600
+        self.max_distance = max_distance
+
+    def score(self, title: str, summary: Optional[str], published: Optional[str], now: float) -> float:
+        relevance = sum(self.weights[k] for k in self.matcher.find(title)) * self.title_boost
+        if summary:
+            relevance += sum(self.weights[k] for k in self.matcher.find(TAG.sub(" ", summary)))
+        if not relevance:
+            return 0.0
+        # Dates are only parsed for entries that matched a keyword
+        published_ts = parse_published(published)
+        age = max(0.0, now - published_ts) if published_ts is not None else self.half_life
+        return relevance * math.exp(-math.log(2) * age / self.half_life)
+
+    def rank(self, entries: List, limit: int = 10, now: Optional[float] = None) -> List[Tuple[float, object]]:
+        """
+        Args:
+            entries (List): Objects with title, summary and published attributes (e.g. FeedEntry).
+            limit (int): Maximum number of entries to return.
+            now (float): Reference time for the recency decay; defaults to the current time.
+
+        Returns:
+            List[Tuple[float, object]]: (score, entry) pairs, best first, with near-duplicates
+            and entries matching no keyword left out.
+        """
+        now = time.time() if now is None else now
+        scored = []
+        for position, entry in enumerate(entries):
+            score = self.score(entry.title or "", entry.summary, entry.published, now)
+            if score > 0:
+                scored.append((-score, position))
+        scored.sort()
+
+        seen = NearDuplicateIndex(self.max_distance)
+        ranked: List[Tuple[float, object]] = []
+        for negative_score, position in scored:
+            entry = entries[position]
+            fingerprint = simhash(f"{entry.title} {TAG.sub(' ', entry.summary or '')}")
+            if seen.contains_near(fingerprint):
+                continue
+            seen.add(fingerprint)
+            ranked.append((-negative_score, entry))
+            if len(ranked) >= limit:
+                break
+        return ranked
+
+
+_ranker: Optional[EntryRanker] = None
+
+
+def get_ranker() -> EntryRanker:
+    """Returns the shared ranker, so the automaton and its memo are built once per process."""
+    global _ranker
+    if _ranker is None:
+        _ranker = EntryRanker()
+    return _ranker
+
+
+if __name__ == "__main__":
+    # Benchmark on 100k synthetic entries: the previous title-only nested keyword loop, the
+    # same relevance computed per keyword, and the indexed ranking (matching, scoring,
+    # recency decay, sorting and near-duplicate removal) for a small and a large keyword set
+    import random
+    import timeit
+    from collections import namedtuple
+
+    Entry = namedtuple("Entry", "title link published summary")
+    random.seed(0)
+    vocabulary = ("security update patch release server cloud users data company report researchers "
+                  "windows linux android browser network password email phishing campaign group state "
+                  "critical flaw firmware supply chain malware botnet credentials leak fix").split()
+    keywords = list(DEFAULT_KEYWORD_WEIGHTS)
+    now = time.time()
+
+    def sentence(n: int) -> str:
+        words = random.choices(vocabulary, k=n)
+        if random.random() < 0.3:
+            words.insert(random.randrange(n), random.choice(keywords).capitalize())
+        return " ".join(words)
+
+    entries = []
+    for i in range(100_000):
+        published = datetime.fromtimestamp(now - random.uniform(0, 7 * 86400), timezone.utc)
+        entries.append(Entry(sentence(8), f"https://example.com/{i}",
+                             published.strftime("%a, %d %b %Y %H:%M:%S +0000"), f"<p>{sentence(40)}</p>"))
+    # Syndicated copies of some stories under other feeds' links
+    for i in range(0, 100_000, 50):
+        entries[i + 1] = entries[i]._replace(link=f"https://mirror.example.com/{i}")
+
+    def legacy(entries):
+        return [e for e in entries if any(k.lower() in (e.title.lower() or '') for k in keywords)][:10]
+
+    def naive(entries, weights):
+        # The same relevance computed with one substring test per keyword, without decay or dedup
+        scored = [(sum(w * 2 for k, w in weights.items() if k in e.title.lower()) +
+                   sum(w for k, w in weights.items() if k in e.summary.lower()), e) for e in entries]
+        return sorted((item for item in scored if item[0]), key=lambda item: -item[0])[:10]
+
+    seconds = min(timeit.repeat(lambda: legacy(entries), number=1, repeat=3))
+    print(f"{'legacy (9 keywords, titles)':36s} {seconds * 1000:9.1f} ms / {len(entries)} entries")
+    # A watch list of vendors and products grows the keyword set; the automaton's cost does not
+    extra = {"".join(random.choices("abcdefghijklmnopqrstuvwxyz", k=7)): 1.0 for _ in range(191)}
+    for weights in (DEFAULT_KEYWORD_WEIGHTS, {**DEFAULT_KEYWORD_WEIGHTS, **extra}):
+        ranker = EntryRanker(weights)
+        for label, fn in ((f"naive scoring ({len(weights)} keywords)", lambda: naive(entries, weights)),
+                          (f"ranked ({len(weights)} keywords)", lambda: ranker.rank(entries, now=now))):
+            seconds = min(timeit.repeat(fn, number=1, repeat=3))
+            print(f"{label:36s} {seconds * 1000:9.1f} ms / {len(entries)} entries")
+    print()
+    for score, entry in EntryRanker().rank(entries, now=now):
+        print(f"{score:6.2f}  {entry.published}  {entry.title}")
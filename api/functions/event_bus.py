@@ -0,0 +1,36 @@
+import logging
+import threading
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Subscribers receive every published event; main.py forwards them to the /ws clients.
+_subscribers: List[Callable[[dict], None]] = []
+_lock = threading.Lock()
+
+
+def subscribe(callback: Callable[[dict], None]):
+    with _lock:
+        _subscribers.append(callback)
+
+
+def unsubscribe(callback: Callable[[dict], None]):
+    with _lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+
+def publish(event: dict):
+    """
+    Delivers an event to all subscribers. Safe to call from any thread, including tool calls.
+
+    Args:
+        event (dict): JSON-serialisable event with at least a "type" key.
+    """
+    with _lock:
+        subscribers = list(_subscribers)
+    for callback in subscribers:
+        try:
+            callback(event)
+        except Exception as e:
+            logger.error(f"Error delivering {event.get('type')} event: {e}")
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import calendar
+import hashlib
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from functions.storage import API_DIR, data_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FEEDS: List[str] = [
+    "https://krebsonsecurity.com/feed/",
+    "https://feeds.feedburner.com/TheHackersNews",
+    "https://feeds.feedburner.com/exploit-db/jAi05Ol6OmB",
+]
+
+# A JSON list of feed URLs; RSS_FEEDS (comma separated) takes precedence
+FEEDS_PATH = os.getenv("RSS_FEEDS_FILE", os.path.join(API_DIR, "feeds.json"))
+
+
+def load_feeds() -> List[str]:
+    """Returns the configured feed URLs: RSS_FEEDS, then the feeds file, then the defaults."""
+    if os.getenv("RSS_FEEDS"):
+        return [url.strip() for url in os.getenv("RSS_FEEDS").split(",") if url.strip()]
+    if os.path.exists(FEEDS_PATH):
+        with open(FEEDS_PATH, "r") as f:
+            return json.load(f)
+    return list(DEFAULT_FEEDS)
+
+
+def entry_key(entry: dict) -> str:
+    """Stable identity of a feed entry: its GUID, else its link, else a hash of its title."""
+    return entry.get("id") or entry.get("guid") or entry.get("link") or \
+        hashlib.sha1((entry.get("title") or "").encode("utf-8")).hexdigest()
+
+
+class FeedStore:
+    """SQLite store of feed entries (deduplicated by GUID/link) and per-feed HTTP cache validators."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS feeds (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    last_fetched REAL,
+                    last_status INTEGER,
+                    error TEXT
+                );
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    guid TEXT NOT NULL UNIQUE,
+                    feed_url TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    link TEXT,
+                    summary TEXT,
+                    published TEXT,
+                    published_ts REAL,
+                    fetched_ts REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_entries_published ON entries (published_ts);
+                CREATE INDEX IF NOT EXISTS idx_entries_feed ON entries (feed_url, published_ts);
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def feed_state(self, url: str) -> dict:
+        row = self._connect().execute("SELECT * FROM feeds WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else {"url": url, "etag": None, "last_modified": None}
+
+    def update_feed(self, url: str, status: int, etag: Optional[str] = None,
+                    last_modified: Optional[str] = None, error: Optional[str] = None):
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT INTO feeds (url, etag, last_modified, last_fetched, last_status, error)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(url) DO UPDATE SET
+                       etag = COALESCE(excluded.etag, feeds.etag),
+                       last_modified = COALESCE(excluded.last_modified, feeds.last_modified),
+                       last_fetched = excluded.last_fetched,
+                       last_status = excluded.last_status,
+                       error = excluded.error""",
+                (url, etag, last_modified, time.time(), status, error),
+            )
+
+    def add_entries(self, feed_url: str, entries: List[dict]) -> int:
+        """Inserts parsed feed entries, skipping ones already stored. Returns the number added."""
+        now = time.time()
+        rows = []
+        for entry in entries:
+            parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+            rows.append((
+                entry_key(entry), feed_url, entry.get("title") or "(untitled)", entry.get("link"),
+                entry.get("summary"), entry.get("published") or entry.get("updated"),
+                calendar.timegm(parsed) if parsed else None, now,
+            ))
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                """INSERT OR IGNORE INTO entries
+                   (guid, feed_url, title, link, summary, published, published_ts, fetched_ts)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows,
+            )
+            return conn.total_changes - before
+
+    def recent(self, per_feed: int = 10, since: Optional[float] = None) -> List[dict]:
+        """The newest entries of each feed (by published time, else fetch time), newest first."""
+        rows = self._connect().execute(
+            """SELECT * FROM (
+                   SELECT *, ROW_NUMBER() OVER (
+                       PARTITION BY feed_url ORDER BY COALESCE(published_ts, fetched_ts) DESC) AS rank
+                   FROM entries WHERE COALESCE(published_ts, fetched_ts) >= ?
+               ) WHERE rank <= ? ORDER BY COALESCE(published_ts, fetched_ts) DESC""",
+            (since or 0, per_feed),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
+class FeedFetcher:
+    """
+    Fetches many feeds concurrently over one pooled HTTP session.
+
+    Each request carries the feed's stored ETag and Last-Modified validators, so unchanged
+    feeds answer 304 and are neither downloaded nor parsed again. The per-request timeout
+    bounds the latency of a whole refresh regardless of how many feeds are slow.
+    """
+
+    def __init__(self, store: FeedStore, max_workers: int = 16, timeout: float = 10):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.store = store
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "PG-Copilot feed fetcher"
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def fetch(self, url: str) -> dict:
+        import feedparser
+
+        state = self.store.feed_state(url)
+        headers = {}
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304:
+                self.store.update_feed(url, 304)
+                return {"url": url, "status": 304, "new": 0}
+            response.raise_for_status()
+            feed = feedparser.parse(response.content, response_headers={"content-location": response.url})
+            added = self.store.add_entries(url, feed.entries)
+            self.store.update_feed(url, response.status_code, response.headers.get("ETag"),
+                                   response.headers.get("Last-Modified"))
+            return {"url": url, "status": response.status_code, "new": added}
+        except Exception as e:
+            logger.warning(f"Error fetching feed {url}: {e}")
+            self.store.update_feed(url, getattr(getattr(e, "response", None), "status_code", None) or 0,
+                                   error=str(e))
+            return {"url": url, "status": None, "new": 0, "error": str(e)}
+
+    def fetch_all(self, urls: Optional[List[str]] = None) -> List[dict]:
+        """Refreshes all feeds (the configured list by default) and returns one result per feed."""
+        urls = urls if urls is not None else load_feeds()
+        if not urls:
+            return []
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as executor:
+            results = list(executor.map(self.fetch, urls))
+        new = sum(r["new"] for r in results)
+        unchanged = sum(1 for r in results if r["status"] == 304)
+        logger.info(f"Refreshed {len(urls)} feeds in {time.monotonic() - started:.1f}s: "
+                    f"{new} new entries, {unchanged} unchanged.")
+        return results
+
+
+_feed_fetcher: Optional[FeedFetcher] = None
+_feed_fetcher_lock = threading.Lock()
+
+
+def get_feed_fetcher() -> FeedFetcher:
+    global _feed_fetcher
+    with _feed_fetcher_lock:
+        if _feed_fetcher is None:
+            _feed_fetcher = FeedFetcher(FeedStore(data_path("feeds.sqlite")),
+                                        max_workers=int(os.getenv("RSS_MAX_WORKERS", "16")),
+                                        timeout=float(os.getenv("RSS_TIMEOUT", "10")))
+        return _feed_fetcher
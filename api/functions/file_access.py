@@ -0,0 +1,564 @@
+import os
+import re
+import mmap
+import shutil
+import logging
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_READ_CHARS = int(os.getenv("FILE_READ_MAX_CHARS", "8000"))
+MAX_GREP_MATCHES = 200
+BLOCK_SIZE = 1 << 16
+INDEX_CACHE_SIZE = 8
+MAX_WRITE_BYTES = int(os.getenv("FILE_WRITE_MAX_BYTES", str(100 * 1024 * 1024)))
+
+CURSOR = re.compile(r'^([LB])(\d+)$')
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+def parse_cursor(cursor: str) -> Tuple[str, int]:
+    """Splits a continuation cursor: "L<line>" resumes at a line, "B<offset>" at a byte offset."""
+    match = CURSOR.match(cursor.strip())
+    if match is None:
+        raise ValueError(f"Invalid cursor {cursor!r}; pass back the cursor from a truncated read.")
+    return match.group(1), int(match.group(2))
+
+
+def _looks_binary(sample: bytes) -> bool:
+    return b"\0" in sample
+
+
+def _fit(data: bytes, max_chars: int) -> Tuple[str, int]:
+    """
+    Decodes at most max_chars characters of data, cut after the last complete line when one fits.
+
+    Returns:
+        Tuple[str, int]: The text and the number of bytes of data it covers.
+    """
+    if len(data) <= max_chars:
+        text = data.decode("utf-8", errors="replace")
+        if len(text) <= max_chars:
+            return text, len(data)
+    # Each character is at least one byte, so the first max_chars bytes hold enough text
+    head = data[:max_chars]
+    newline = head.rfind(b"\n")
+    used = newline + 1 if newline >= 0 else len(head)
+    if newline < 0:
+        # A single line longer than a page: back off to a character boundary
+        while used and (head[used - 1] & 0xC0) == 0x80:
+            used -= 1
+        if used and head[used - 1] >= 0xC0:
+            used -= 1
+        used = used or len(head)
+    return head[:used].decode("utf-8", errors="replace"), used
+
+
+class LineIndex:
+    """
+    Memory-mapped file with a sparse line index.
+
+    The index records how many lines start before each 64 KiB block, so it costs eight
+    bytes per block rather than per line and is built with C-speed newline counts. Jumping
+    to line n bisects the blocks and scans at most one block, whatever the file size.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        st = os.stat(path)
+        self.signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+        self.size = st.st_size
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self._block_lines = array("Q")
+        newlines = 0
+        for start in range(0, self.size, BLOCK_SIZE):
+            self._block_lines.append(newlines)
+            newlines += self._mm[start:start + BLOCK_SIZE].count(b"\n")
+        self.newlines = newlines
+        self.line_count = newlines + (1 if self.size and self._mm[self.size - 1] != 0x0A else 0)
+
+    def line_start(self, line: int) -> int:
+        """Byte offset where 1-based line starts; the file size past the last line."""
+        target = line - 1
+        if target <= 0:
+            return 0
+        if target > self.newlines:
+            return self.size
+        # The target-th newline lies in the last block with fewer newlines before it
+        block = bisect_left(self._block_lines, target) - 1
+        position = block * BLOCK_SIZE - 1
+        for _ in range(target - self._block_lines[block]):
+            position = self._mm.find(b"\n", position + 1)
+        return position + 1
+
+    def line_at(self, offset: int) -> int:
+        """1-based line number containing the byte at offset."""
+        block = min(offset // BLOCK_SIZE, len(self._block_lines) - 1)
+        return self._block_lines[block] + self._mm[block * BLOCK_SIZE:offset].count(b"\n") + 1
+
+    def line_bounds(self, offset: int) -> Tuple[int, int]:
+        """Start and end (excluding the newline) of the line containing offset."""
+        start = self._mm.rfind(b"\n", 0, offset) + 1
+        end = self._mm.find(b"\n", offset)
+        return start, self.size if end < 0 else end
+
+    def read(self, start: int, end: int) -> bytes:
+        return self._mm[start:end] if self._mm is not None else b""
+
+    def find(self, data: bytes, start: int) -> int:
+        return self._mm.find(data, start) if self._mm is not None else -1
+
+    def search(self, regex: "re.Pattern", pos: int):
+        return regex.finditer(self._mm, pos) if self._mm is not None else iter(())
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+
+_indexes: "OrderedDict[str, LineIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_line_index(path: str) -> LineIndex:
+    """Returns the cached index of a file, rebuilt when its size, mtime or inode changes."""
+    path = os.path.realpath(path)
+    st = os.stat(path)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is not None and index.signature == (st.st_size, st.st_mtime_ns, st.st_ino):
+            _indexes.move_to_end(path)
+            return index
+        if index is not None:
+            index.close()
+        index = _indexes[path] = LineIndex(path)
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)[1].close()
+        return index
+
+
+def _more(cursor: str) -> str:
+    return f'\n[Truncated. Call read_file again with cursor="{cursor}" to continue.]'
+
+
+def read_lines(path: str, start_line: int = 1, num_lines: int = 0, max_chars: int = MAX_READ_CHARS) -> str:
+    """
+    Reads num_lines lines (0: as many as fit in max_chars) from start_line.
+
+    A file that fits entirely is returned as-is; anything else gets a "[path: lines a-b of n]"
+    header and, when cut short, a continuation cursor.
+    """
+    index = get_line_index(path)
+    if _looks_binary(index.read(0, 8192)):
+        return (f"{path} looks like a binary file ({index.size} bytes); "
+                f"read byte ranges with byte_offset instead.")
+    start_line = max(1, start_line)
+    if start_line > index.line_count:
+        return f"[{path}: line {start_line} is past the end of the file ({index.line_count} lines)]"
+    start = index.line_start(start_line)
+    end = index.line_start(start_line + num_lines) if num_lines > 0 else index.size
+    text, used = _fit(index.read(start, min(end, start + max_chars * 4)), max_chars)
+    stop = start + used
+    if start_line == 1 and stop >= index.size:
+        return text
+    last_line = index.line_at(stop - 1) if stop > start else start_line
+    header = f"[{path}: lines {start_line}-{last_line} of {index.line_count}]\n"
+    if stop >= end:
+        return header + text
+    # Resume on a line boundary when the page ended on one, otherwise mid-line by byte
+    cursor = f"L{last_line + 1}" if index.read(stop - 1, stop) == b"\n" else f"B{stop}"
+    return header + text + _more(cursor)
+
+
+def read_line_rest(path: str, offset: int, max_chars: int = MAX_READ_CHARS) -> str:
+    """Continues a line read that stopped inside a long line: the rest of that line, then a line cursor."""
+    index = get_line_index(path)
+    if offset >= index.size:
+        return f"[{path}: byte {offset} is past the end of the file ({index.size} bytes)]"
+    offset = max(0, offset)
+    line = index.line_at(offset)
+    line_end = min(index.size, index.line_bounds(offset)[1] + 1)
+    text, used = _fit(index.read(offset, min(line_end, offset + max_chars * 4)), max_chars)
+    stop = offset + used
+    header = f"[{path}: line {line}, bytes {offset}-{stop} of {index.size}]\n"
+    if stop < line_end:
+        return header + text + _more(f"B{stop}")
+    if stop < index.size:
+        return header + text + _more(f"L{line + 1}")
+    return header + text
+
+
+def read_bytes(path: str, offset: int, length: int, max_chars: int = MAX_READ_CHARS) -> str:
+    """Reads length bytes from offset; binary data is shown with undecodable bytes replaced."""
+    index = get_line_index(path)
+    offset = max(0, min(offset, index.size))
+    end = min(index.size, offset + max(0, length))
+    data = index.read(offset, end)
+    text = data[:max_chars].decode("utf-8", errors="replace")
+    stop = offset + min(len(data), max_chars)
+    header = f"[{path}: bytes {offset}-{stop} of {index.size}]\n"
+    return header + text + (_more(f"B{stop}") if stop < end else "")
+
+
+def read_tail(path: str, num_lines: int, max_chars: int = MAX_READ_CHARS) -> str:
+    """Reads the last num_lines lines, scanning backwards from the end without indexing the file."""
+    num_lines = max(1, num_lines)
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        position, data = size, b""
+        # One extra newline marks the start of the first wanted line; a final one ends the last line
+        wanted = num_lines + (1 if size else 0)
+        while position > 0 and data.count(b"\n") < wanted and len(data) < max_chars * 4:
+            step = min(BLOCK_SIZE, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    body = data[:-1] if data.endswith(b"\n") else data
+    lines = body.split(b"\n")
+    complete = position == 0 or len(lines) > num_lines
+    lines = lines[-num_lines:] if complete else lines[1:]
+    text = b"\n".join(lines).decode("utf-8", errors="replace")
+    if len(text) > max_chars:
+        text = text[-max_chars:]
+        text = text[text.find("\n") + 1:] if "\n" in text else text
+    shown = text.count("\n") + 1 if text else 0
+    return f"[{path}: last {shown} lines, {size} bytes]\n{text}"
+
+
+def grep_file(path: str, pattern: str, start_line: int = 1, max_matches: int = MAX_GREP_MATCHES,
+              max_chars: int = MAX_READ_CHARS) -> str:
+    """
+    Lists the lines matching a regular expression as "<line>: <text>", scanning the mapped file
+    from start_line. Stops at max_matches lines or max_chars characters with a cursor to continue.
+    """
+    index = get_line_index(path)
+    regex = re.compile(pattern.encode("utf-8"), re.MULTILINE)
+    results, chars, last_line, resume = [], 0, 0, None
+    for match in index.search(regex, index.line_start(max(1, start_line))):
+        line = index.line_at(match.start())
+        if line == last_line:
+            continue
+        start, end = index.line_bounds(match.start())
+        entry = f"{line}: " + index.read(start, min(end, start + 500)).decode("utf-8", errors="replace")
+        if len(results) >= max_matches or chars + len(entry) > max_chars:
+            resume = line
+            break
+        results.append(entry)
+        chars += len(entry) + 1
+        last_line = line
+    if not results:
+        return f"No lines in {path} match {pattern!r}."
+    header = f"[{path}: {len(results)} matching lines for {pattern!r}]\n"
+    return header + "\n".join(results) + (_more(f"L{resume}") if resume else "")
+
+
+def read_text(path: str, start_line: int = 1, num_lines: int = 0, tail_lines: int = 0,
+              byte_offset: int = -1, num_bytes: int = 4096, pattern: str = "", cursor: str = "",
+              max_chars: int = MAX_READ_CHARS) -> str:
+    """Dispatches a read_file call to a grep, byte, tail or line read, resuming from cursor if given."""
+    if cursor:
+        kind, position = parse_cursor(cursor)
+        if kind == "B":
+            byte_offset = position
+        else:
+            start_line, byte_offset, tail_lines = position, -1, 0
+    if not os.path.isfile(path):
+        raise FileNotFoundError(path)
+    if pattern:
+        return grep_file(path, pattern, start_line, max_chars=max_chars)
+    if byte_offset >= 0:
+        if cursor and num_bytes == 4096:
+            # Continuing a page that stopped mid-line: finish that line, then go on by lines.
+            # Binary files have no lines, so they are paged by bytes to the end of the file.
+            index = get_line_index(path)
+            if not _looks_binary(index.read(0, 8192)):
+                return read_line_rest(path, byte_offset, max_chars)
+            num_bytes = index.size - byte_offset
+        return read_bytes(path, byte_offset, num_bytes, max_chars)
+    if tail_lines > 0:
+        return read_tail(path, tail_lines, max_chars)
+    return read_lines(path, start_line, num_lines, max_chars)
+
+def _check_size(path: str, size: int, max_bytes: int):
+    if size > max_bytes:
+        raise ValueError(f"{path} would be {size} bytes, over the {max_bytes} byte limit for writes.")
+
+
+def _fsync_directory(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _new_file_mode() -> int:
+    """The mode open() would give a new file: 0o666 less the umask."""
+    try:
+        # Linux reports the umask without changing it; os.umask can only read it by setting it
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("Umask:"):
+                    return 0o666 & ~int(line.split()[1], 8)
+    except OSError:
+        pass
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def atomic_write(path: str, chunks: Iterable[bytes]) -> int:
+    """
+    Streams chunks into a temporary file next to path, fsyncs it and renames it over path, so
+    readers and crashes see either the old file or the new one, never a torn write. The file's
+    permissions are kept (new files get the usual umask-based mode rather than mkstemp's
+    0600), and a symlink is written through to its target.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            shutil.copymode(path, tmp_path)
+        except FileNotFoundError:
+            os.chmod(tmp_path, _new_file_mode())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    _fsync_directory(directory)
+    return written
+
+
+def write_text(path: str, content: str, max_bytes: int = MAX_WRITE_BYTES) -> int:
+    data = content.encode("utf-8")
+    _check_size(path, len(data), max_bytes)
+    return atomic_write(path, [data])
+
+
+def append_text(path: str, content: str, max_bytes: int = MAX_WRITE_BYTES) -> int:
+    """Appends in place; earlier content is never rewritten, and the new bytes are fsynced."""
+    data = content.encode("utf-8")
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    _check_size(path, size + len(data), max_bytes)
+    with open(path, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return len(data)
+
+
+def _copy_range(index: LineIndex, start: int, end: int):
+    for position in range(start, end, BLOCK_SIZE):
+        yield index.read(position, min(end, position + BLOCK_SIZE))
+
+
+def _splice(path: str, edits: List[Tuple[int, int, bytes]], max_bytes: int) -> int:
+    """Atomically rewrites path with each (start, end) byte span replaced, copying the rest in blocks."""
+    index = get_line_index(path)
+    _check_size(path, index.size + sum(len(data) - (end - start) for start, end, data in edits), max_bytes)
+
+    def chunks():
+        position = 0
+        for start, end, data in sorted(edits, key=lambda edit: edit[0]):
+            yield from _copy_range(index, position, start)
+            yield data
+            position = end
+        yield from _copy_range(index, position, index.size)
+
+    return atomic_write(path, chunks())
+
+
+def _as_lines(content: str, index: LineIndex, end: int) -> bytes:
+    """Encodes replacement lines, adding the newline needed to keep the following line separate."""
+    data = content.encode("utf-8")
+    if data and not data.endswith(b"\n") and end < index.size:
+        data += b"\n"
+    return data
+
+
+def replace_lines(path: str, start_line: int, end_line: int, content: str,
+                  max_bytes: int = MAX_WRITE_BYTES) -> int:
+    """
+    Replaces lines start_line..end_line (inclusive, 1-based) with content. An end_line of
+    start_line - 1 inserts before start_line; an empty content deletes the lines.
+
+    Returns:
+        int: The number of lines removed.
+    """
+    index = get_line_index(path)
+    if start_line < 1 or start_line > index.line_count + 1:
+        raise ValueError(f"start_line {start_line} is outside {path} ({index.line_count} lines).")
+    end_line = min(max(end_line, start_line - 1), index.line_count)
+    start, end = index.line_start(start_line), index.line_start(end_line + 1)
+    data = _as_lines(content, index, end)
+    if start == index.size and start and index.read(start - 1, start) != b"\n":
+        # Adding after a last line that has no newline
+        data = b"\n" + data
+    _splice(path, [(start, end, data)], max_bytes)
+    return end_line - start_line + 1
+
+
+def parse_unified_diff(diff: str) -> List[dict]:
+    """
+    Splits a unified diff for one file into hunks with their expected old start line and
+    the old and new lines. File headers and "\\ No newline at end of file" markers are skipped.
+    """
+    hunks, hunk = [], None
+    for line in diff.splitlines():
+        header = HUNK_HEADER.match(line)
+        if header:
+            old_start, old_count = int(header.group(1)), int(header.group(2) or 1)
+            hunk = {"old_start": old_start if old_count else old_start + 1, "old": [], "new": []}
+            hunks.append(hunk)
+        elif hunk is None or line.startswith("\\"):
+            continue
+        elif line.startswith("-"):
+            hunk["old"].append(line[1:])
+        elif line.startswith("+"):
+            hunk["new"].append(line[1:])
+        elif line.startswith(" ") or line == "":
+            # Some tools strip the leading space from empty context lines
+            hunk["old"].append(line[1:])
+            hunk["new"].append(line[1:])
+        else:
+            hunk = None
+    if not hunks:
+        raise ValueError("No hunks found; the diff must contain '@@ -a,b +c,d @@' headers.")
+    return hunks
+
+
+def _locate(index: LineIndex, block: bytes, expected: int, after: int) -> Optional[Tuple[int, int]]:
+    """
+    Finds the old lines of a hunk: at the expected offset if they still match there, otherwise
+    the occurrence nearest to it after the previous hunk, so diffs with shifted line numbers apply.
+    """
+    if not block:
+        return expected, expected
+    body = block[:-1]
+    candidates = []
+    position = index.find(body, after)
+    while position >= 0:
+        end = position + len(body)
+        line_aligned = position == 0 or index.read(position - 1, position) == b"\n"
+        if line_aligned and (end == index.size or index.read(end, end + 1) == b"\n"):
+            span = (position, min(end + 1, index.size))
+            if position == expected:
+                return span
+            candidates.append(span)
+            if position > expected:
+                break
+        position = index.find(body, position + 1)
+    if not candidates:
+        return None
+    return min(candidates, key=lambda span: abs(span[0] - expected))
+
+
+def apply_unified_diff(path: str, diff: str, max_bytes: int = MAX_WRITE_BYTES) -> int:
+    """
+    Applies a unified diff to path in one atomic rewrite. Every hunk is located before anything
+    is written, so a diff that does not match leaves the file untouched.
+
+    Returns:
+        int: The number of hunks applied.
+    """
+    hunks = parse_unified_diff(diff)
+    if not os.path.exists(path) and all(not hunk["old"] for hunk in hunks):
+        # A diff against /dev/null creates the file
+        write_text(path, "".join(line + "\n" for hunk in hunks for line in hunk["new"]), max_bytes)
+        return len(hunks)
+    index = get_line_index(path)
+    edits, after = [], 0
+    for number, hunk in enumerate(hunks, start=1):
+        block = "".join(line + "\n" for line in hunk["old"]).encode("utf-8")
+        span = _locate(index, block, index.line_start(hunk["old_start"]), after)
+        if span is None:
+            raise ValueError(f"Hunk {number} (line {hunk['old_start']}) does not match {path}: "
+                             f"its context and removed lines were not found.")
+        start, end = span
+        data = "".join(line + "\n" for line in hunk["new"]).encode("utf-8")
+        if end == index.size and index.size and index.read(end - 1, end) != b"\n" and data:
+            # Keep a missing final newline missing
+            data = data[:-1]
+        edits.append((start, end, data))
+        after = end
+    _splice(path, edits, max_bytes)
+    return len(hunks)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import tempfile
+
+    # Build a large log and compare paging through it against reading it whole
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    with tempfile.NamedTemporaryFile("wb", suffix=".log", delete=False) as f:
+        for chunk in range(0, lines, 100_000):
+            f.write(b"".join(b"2024-01-01T00:00:00 INFO worker=%d request %d handled in 12ms\n" % (i % 16, i)
+                             for i in range(chunk, min(lines, chunk + 100_000))))
+        log_path = f.name
+    size = os.path.getsize(log_path)
+    print(f"{lines} lines, {size / 1e6:.0f} MB")
+
+    started = time.perf_counter()
+    with open(log_path) as f:
+        whole = f.read()
+    print(f"full read:            {time.perf_counter() - started:.3f}s, {len(whole) / 1e6:.0f}M chars returned")
+    del whole
+
+    started = time.perf_counter()
+    get_line_index(log_path)
+    print(f"index build:          {time.perf_counter() - started:.3f}s")
+    for label, call in [
+        ("head page", lambda: read_text(log_path)),
+        ("jump to middle line", lambda: read_text(log_path, start_line=lines // 2, num_lines=50)),
+        ("tail 100", lambda: read_text(log_path, tail_lines=100)),
+        ("byte range", lambda: read_text(log_path, byte_offset=size // 3, num_bytes=2000)),
+        ("grep rare", lambda: read_text(log_path, pattern=rf"request {lines - 1}\b")),
+    ]:
+        started = time.perf_counter()
+        output = call()
+        print(f"{label + ':':<22}{(time.perf_counter() - started) * 1000:8.2f} ms, {len(output)} chars")
+
+    # Changing one line: rewriting the whole text against a streamed line replacement and a diff
+    middle = lines // 2
+    started = time.perf_counter()
+    with open(log_path) as f:
+        whole = f.read()
+    write_text(log_path, whole.replace(f" request {middle} ", f" request {middle} (edited) ", 1),
+               max_bytes=size * 2)
+    del whole
+    print(f"edit by full rewrite:  {time.perf_counter() - started:.3f}s")
+    started = time.perf_counter()
+    replace_lines(log_path, middle + 1, middle + 1, "replaced\n", max_bytes=size * 2)
+    print(f"edit by replace_lines: {time.perf_counter() - started:.3f}s")
+    started = time.perf_counter()
+    apply_unified_diff(log_path, f"@@ -{middle + 1},1 +{middle + 1},1 @@\n-replaced\n+patched\n", max_bytes=size * 2)
+    print(f"edit by patch:         {time.perf_counter() - started:.3f}s")
+    os.unlink(log_path)
@@ -1,55 +1,101 @@
+import os
 from typing import TypedDict
+
+# Token caps for analyze_directory: each file's source, each file's analysis, and each summary prompt
+ANALYZE_FILE_MAX_TOKENS = int(os.getenv("ANALYZE_FILE_MAX_TOKENS", "6000"))
+ANALYZE_REPLY_MAX_TOKENS = int(os.getenv("ANALYZE_REPLY_MAX_TOKENS", "400"))
+ANALYZE_SUMMARY_MAX_TOKENS = int(os.getenv("ANALYZE_SUMMARY_MAX_TOKENS", "6000"))
+
 # Parameters specific to the read_file_tool
-class ReadFileParams(TypedDict):
+class ReadFileParams(TypedDict, total=False):
     file_path: str
-
-def read_file(self, file_path: str) -> str:
+    start_line: int
+    num_lines: int
+    tail_lines: int
+    byte_offset: int
+    num_bytes: int
+    pattern: str
+    cursor: str
+
+def read_file(self, file_path: str, start_line: int = 1, num_lines: int = 0, tail_lines: int = 0,
+              byte_offset: int = -1, num_bytes: int = 4096, pattern: str = "", cursor: str = "") -> str:
     """
-    Reads the content of the specified file.
+    Reads the content of the specified file. Large files are returned one page at a time;
+    a truncated page ends with a cursor to pass back to read the next one.
 
     Args:
         self (Agent): The agent instance calling the function.
         file_path (str): The path to the file that will be read.
+        start_line (int): The first line to read, counting from 1.
+        num_lines (int): How many lines to read; 0 reads as many as fit in one page.
+        tail_lines (int): If set, reads this many lines from the end of the file instead.
+        byte_offset (int): If 0 or more, reads num_bytes bytes from this byte offset instead of lines.
+        num_bytes (int): How many bytes to read from byte_offset.
+        pattern (str): If set, returns only the lines matching this regular expression, with their line numbers.
+        cursor (str): The cursor from a truncated read, to continue where it stopped.
     
     Returns:
         str: The content of the file or an error message.
     """
+    from functions.file_access import read_text
+
     try:
-        with open(file_path, 'r') as file:
-            content = file.read()
-        return content
+        return read_text(file_path, start_line=start_line, num_lines=num_lines, tail_lines=tail_lines,
+                         byte_offset=byte_offset, num_bytes=num_bytes, pattern=pattern, cursor=cursor)
     except FileNotFoundError:
         return "File not found."
     except Exception as e:
         return f"An error occurred: {str(e)}"
 
 # Parameters specific to the write_file_tool
-class WriteFileParams(TypedDict):
+class WriteFileParams(TypedDict, total=False):
     file_path: str
     content: str
+    mode: str
+    start_line: int
+    end_line: int
 
-def write_file(self, file_path: str, content: str) -> str:
+def write_file(self, file_path: str, content: str, mode: str = "overwrite", start_line: int = 0, end_line: int = 0) -> str:
     """
-    Writes the given content to the specified file path.
+    Writes the given content to the specified file path. Writes are atomic: the file is
+    either fully updated or left as it was. To change part of a large file, prefer
+    "replace_lines" or "patch" over rewriting the whole file.
 
     Args:
         self (Agent): The agent instance calling the function.
         file_path (str): The path to the file where the content will be written.
-        content (str): The content that needs to be written to the file.
+        content (str): The content that needs to be written to the file, or the unified diff in "patch" mode.
+        mode (str): "overwrite" replaces the file, "append" adds content to its end, "replace_lines"
+            replaces lines start_line to end_line (inclusive) with content, and "patch" applies content
+            as a unified diff.
+        start_line (int): First line replaced in "replace_lines" mode, counting from 1.
+        end_line (int): Last line replaced in "replace_lines" mode; start_line - 1 inserts before start_line.
     
     Returns:
         str: A message indicating success or failure.
     """
+    from functions.file_access import append_text, apply_unified_diff, replace_lines, write_text
+
     try:
-        with open(file_path, 'w') as file:
-            file.write(content)
-        return f"Write successful to {file_path}."
+        if mode == "overwrite":
+            write_text(file_path, content)
+            return f"Write successful to {file_path}."
+        if mode == "append":
+            written = append_text(file_path, content)
+            return f"Appended {written} bytes to {file_path}."
+        if mode == "replace_lines":
+            removed = replace_lines(file_path, start_line, end_line, content)
+            return f"Replaced {removed} lines from line {start_line} of {file_path}."
+        if mode == "patch":
+            hunks = apply_unified_diff(file_path, content)
+            return f"Applied {hunks} hunks to {file_path}."
+        return f"Unknown mode '{mode}'; use overwrite, append, replace_lines or patch."
     except Exception as e:
         return f"An error occurred while writing to the file: {str(e)}"
 
 def send_request_to_model(inputs: str, sys_prompt: str, max_tokens: int = 1024) -> str:
     """
-    Send a request to the OpenAI GPT model and return the result.
+    Send a request to the shared OpenAI-compatible client and return the result.
 
     Parameters:
     - inputs (str): The text input to be analyzed.
@@ -59,36 +105,14 @@ def send_request_to_model(inputs: str, sys_prompt: str, max_tokens: int = 1024)
     Returns:
     - str: Generated response from the model or an error message.
     """
-    from dotenv import load_dotenv
-    import os
-    import openai
+    from functions.llm_client import get_llm_client
 
-    # Load environment variables from .env file
-    load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-    api_base = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
-
-    if not api_key:
+    client = get_llm_client()
+    if not client.api_key:
         return "OPENAI_API_KEY not found. Please set it in the .env file."
-
-    # Configure OpenAI API
-    openai.api_key = api_key
-    openai.api_base = api_base
-
     try:
-        # Call OpenAI GPT model
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": inputs}
-            ],
-            max_tokens=max_tokens,
-            temperature=0.7
-        )
-        return response['choices'][0]['message']['content']
-
-    except openai.error.OpenAIError as e:
+        return client.complete(sys_prompt, inputs, max_tokens=max_tokens)
+    except Exception as e:
         return f"Model request failed: {str(e)}"
 
 
@@ -103,13 +127,15 @@ def analyze_file(file_path: str, project_folder: str) -> str:
     Returns:
     - str: The analysis result for the specified file.
     """
+    from functions.llm_client import truncate_tokens
+
     try:
         with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-            file_content = f.read()
+            file_content = truncate_tokens(f.read(), ANALYZE_FILE_MAX_TOKENS)
         file_rel_path = os.path.relpath(file_path, project_folder)
         input_request = f"Please provide a brief summary of the following program file. The file name is {file_rel_path}. The file code is:\n```{file_content}```"
         sys_prompt = "You are a software architecture analyst analyzing a source code file. Your response should be concise and clear."
-        return send_request_to_model(inputs=input_request, sys_prompt=sys_prompt)
+        return send_request_to_model(inputs=input_request, sys_prompt=sys_prompt, max_tokens=ANALYZE_REPLY_MAX_TOKENS)
     except Exception as e:
         return f"Failed to analyze file {file_path}: {str(e)}"
 
@@ -126,35 +152,82 @@ def analyze_directory(self,directory: str) -> str:
         str: A summary analysis result for the entire project. The summary includes the functionality and structure of the project based on the Python files analyzed.
     """
     import os
-    from concurrent.futures import ThreadPoolExecutor
+    from functions.file_functions import ANALYZE_SUMMARY_MAX_TOKENS, analyze_file, send_request_to_model
+    from functions.llm_client import get_llm_client, tree_reduce
 
-    # Get all Python file paths
-    python_files = [
-        os.path.join(root, file)
-        for root, _, files in os.walk(directory)
-        for file in files if file.endswith('.py')
-    ]
+    # Get all Python file paths, skipping hidden directories and caches
+    python_files = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d != '__pycache__')
+        python_files.extend(os.path.join(root, file) for file in sorted(files) if file.endswith('.py'))
 
     if not python_files:
         return "No Python files found in the specified directory."
 
+    client = get_llm_client()
+    if not client.api_key:
+        return "OPENAI_API_KEY not found. Please set it in the .env file."
+
     project_folder = os.path.abspath(directory)
 
-    # Analyze files using multithreading
-    file_analysis_results = []
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        futures = [
-            executor.submit(analyze_file, file_path, project_folder)
-            for file_path in python_files
-        ]
-        for future in futures:
-            file_analysis_results.append(future.result())
-
-    # Summarize the results
-    summary_input = "Below is the analysis of all files:\n" + "\n".join(file_analysis_results)
-    summary_prompt = (
-        "You are a software architecture analyst. Based on the analysis results of multiple source code files below, "
-        "summarize the overall functionality and architecture of the project."
-    )
-    return send_request_to_model(inputs=summary_input, sys_prompt=summary_prompt)
+    # Analyze files concurrently; the shared client caps the requests in flight
+    file_analysis_results = client.map(lambda file_path: analyze_file(file_path, project_folder), python_files)
+    analyses = [
+        f"{os.path.relpath(file_path, project_folder)}: {analysis}"
+        for file_path, analysis in zip(python_files, file_analysis_results)
+    ]
 
+    # Summarize the results, merging batches of analyses until one summary fits in a prompt
+    def summarize(batch, final):
+        if final:
+            summary_input = "Below is the analysis of all files:\n" + "\n".join(batch)
+            summary_prompt = (
+                "You are a software architecture analyst. Based on the analysis results of multiple source code files below, "
+                "summarize the overall functionality and architecture of the project."
+            )
+        else:
+            summary_input = "Below is the analysis of part of the project's files:\n" + "\n".join(batch)
+            summary_prompt = (
+                "You are a software architecture analyst. Condense the analysis results below into a summary of what "
+                "these files do and how they fit together, keeping the file and module names."
+            )
+        # Partial summaries must stay under half the budget so the next level can pair them up
+        max_tokens = 1024 if final else max(64, min(1024, ANALYZE_SUMMARY_MAX_TOKENS // 2 - 64))
+        return send_request_to_model(inputs=summary_input, sys_prompt=summary_prompt, max_tokens=max_tokens)
+
+    return tree_reduce(analyses, summarize, budget_tokens=ANALYZE_SUMMARY_MAX_TOKENS, client=client)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import tempfile
+    from functions import llm_client
+    from functions.llm_client import FakeLLMServer, LLMClient, count_tokens
+
+    # Analyze a generated project against a stub LLM with 200 ms latency
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    project = tempfile.mkdtemp(prefix="analyze-")
+    for i in range(files):
+        package = os.path.join(project, f"pkg{i % 10}")
+        os.makedirs(package, exist_ok=True)
+        # Every 50th module is a large generated file
+        body = "".join(f"def handler_{i}_{j}(request):\n    return request.get('value_{j}')\n\n"
+                       for j in range(2000 if i % 50 == 0 else 40))
+        with open(os.path.join(package, f"module_{i}.py"), "w") as f:
+            f.write(body)
+    os.environ["OPENAI_API_KEY"] = "test"
+
+    with FakeLLMServer(latency=0.2, reply_words=120) as server:
+        for concurrency in (1, 8):
+            server.requests = server.max_prompt_chars = server.max_in_flight = 0
+            llm_client._llm_client = LLMClient(model="stub", base_url=server.base_url, max_concurrency=concurrency)
+            started = time.perf_counter()
+            analyze_directory(None, project)
+            print(f"concurrency {concurrency}: {time.perf_counter() - started:6.2f}s, {server.requests} requests, "
+                  f"max {server.max_in_flight} in flight, largest prompt {server.max_prompt_chars} chars")
+            llm_client._llm_client.shutdown()
+    reply = " ".join(f"word{i}" for i in range(120))
+    unbounded = "Below is the analysis of all files:\n" + "\n".join(
+        f"pkg{i % 10}/module_{i}.py: {reply}" for i in range(files))
+    print(f"a single summary prompt would be {len(unbounded)} chars (~{count_tokens(unbounded)} tokens)")
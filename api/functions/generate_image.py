@@ -1,37 +1,27 @@
 # Function to generate an image based on a text prompt and return the image URL
-def create_image(self, prompt: str) -> str:
+def create_image(self, prompt: str, variants: int = 1) -> str:
     """
-    Sends a prompt to OpenAI to generate an image and returns the image URL.
+    Generates images from a text prompt and returns their URLs. Images are stored locally,
+    so the URLs do not expire, and the same prompt returns the same images.
 
     Args:
         prompt (str): The prompt to generate the image.
+        variants (int): Number of different images to generate (1-4).
 
     Returns:
-        str: The URL of the generated image.
+        str: The URL of each generated image, one per line.
     """
-    import os
-    from memgpt.credentials import MemGPTCredentials
-    from openai import OpenAI
-    # Set your OpenAI API key
-    credentials = MemGPTCredentials().load()
-    assert credentials.openai_key is not None, credentials.openai_key
-    # model = "gpt-4-1106-preview"
-    model = "gpt-4o"
+    import traceback
+    from functions.image_service import get_image_service
 
-    client = OpenAI(api_key=credentials.openai_key)
+    try:
+        images = get_image_service().generate(prompt, n=variants)
+    except Exception as e:
+        traceback.print_exc()
+        return f"Image generation failed with error: {str(e)}"
 
-    # Send the request to OpenAI to generate an image
-    response = client.images.generate(
-        prompt=prompt,
-        n=1,  # Number of images to generate
-        size="512x512"  # Image size
-    )
-
-    # Extract the URL of the generated image from the response
-    image_url = response.data[0].url
-
-    return image_url
+    return "\n".join(image["url"] for image in images)
 
 # Example usage:
-#image_url = create_image_url("A futuristic city skyline at sunset")
+#image_url = create_image(None, "A futuristic city skyline at sunset")
 #print(f"Generated Image URL: {image_url}")
@@ -0,0 +1,215 @@
+import os
+import re
+import zlib
+import base64
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from functions.storage import data_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.getenv("IMAGE_MODEL", "dall-e-2")
+DEFAULT_SIZE = os.getenv("IMAGE_SIZE", "512x512")
+MAX_VARIANTS = 4
+THUMBNAIL_SIZES = (128, 256, 512)
+
+IMAGE_ID = re.compile(r'^[0-9a-f]{64}$')
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Prompts differing only in case or whitespace share cached images."""
+    return " ".join(prompt.split()).casefold()
+
+
+class OpenAIImageBackend:
+    """Generates images with one shared OpenAI client; images come back inline, not as expiring URLs."""
+
+    def __init__(self, model: str = DEFAULT_MODEL, api_key: Optional[str] = None):
+        self.model = model
+        self._api_key = api_key
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _openai(self):
+        # Created on first use, so the app starts without an API key until images are requested
+        with self._client_lock:
+            if self._client is None:
+                from openai import OpenAI
+                self._client = OpenAI(api_key=self._api_key or os.getenv("OPENAI_API_KEY"))
+            return self._client
+
+    def generate(self, prompt: str, size: str) -> bytes:
+        response = self._openai().images.generate(model=self.model, prompt=prompt, n=1, size=size,
+                                                response_format="b64_json")
+        image = response.data[0]
+        if image.b64_json:
+            return base64.b64decode(image.b64_json)
+        # Some deployments only return URLs; download the image before the URL expires
+        import requests
+        download = requests.get(image.url, timeout=60)
+        download.raise_for_status()
+        return download.content
+
+
+class FakeImageBackend:
+    """Stand-in that returns a solid-colour PNG, a different colour for every call, for tests."""
+
+    model = "fake"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, size: str) -> bytes:
+        import time
+
+        with self._lock:
+            self.calls.append((prompt, size))
+        if self.delay:
+            time.sleep(self.delay)
+        width, height = (int(v) for v in size.split("x"))
+        colour = hashlib.sha256(f"{prompt}\0{len(self.calls)}".encode("utf-8")).digest()[:3]
+        raw = b"".join(b"\x00" + colour * width for _ in range(height))
+
+        def chunk(kind: bytes, data: bytes) -> bytes:
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+        return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+                + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+class ImageStore:
+    """Generated images and their thumbnails on disk, addressed by the hash of prompt and parameters."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(prompt: str, size: str, model: str, variant: int) -> str:
+        return hashlib.sha256(f"{model}\0{size}\0{variant}\0{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    def path(self, image_id: str, suffix: str = "") -> str:
+        return os.path.join(self.directory, image_id[:2], f"{image_id}{suffix}.png")
+
+    def get(self, image_id: str) -> Optional[str]:
+        path = self.path(image_id)
+        return path if os.path.exists(path) else None
+
+    def put(self, image_id: str, data: bytes, suffix: str = "") -> str:
+        path = self.path(image_id, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".image.", dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+
+class ImageService:
+    """
+    Cached image generation with concurrent variants.
+
+    Variant i of a prompt is cached under the hash of (model, size, i, normalized prompt),
+    so asking again for the same prompt returns the stored files, and asking for more
+    variants only generates the missing ones. Variants are requested concurrently, and
+    concurrent requests for the same image share one backend call.
+    """
+
+    def __init__(self, backend, store: ImageStore, max_workers: int = 4):
+        self.backend = backend
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="images")
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _generate(self, image_id: str, prompt: str, size: str) -> str:
+        try:
+            return self.store.put(image_id, self.backend.generate(prompt, size))
+        finally:
+            with self._lock:
+                self._in_flight.pop(image_id, None)
+
+    def _image(self, prompt: str, size: str, variant: int) -> Tuple[str, bool, Future]:
+        image_id = self.store.key(prompt, size, getattr(self.backend, "model", ""), variant)
+        path = self.store.get(image_id)
+        if path is None:
+            with self._lock:
+                future = self._in_flight.get(image_id)
+                if future is not None:
+                    return image_id, False, future
+                # A generation may have finished between the check above and taking the lock
+                path = self.store.get(image_id)
+                if path is None:
+                    future = self._executor.submit(self._generate, image_id, prompt, size)
+                    self._in_flight[image_id] = future
+                    return image_id, False, future
+        done: Future = Future()
+        done.set_result(path)
+        return image_id, True, done
+
+    def generate(self, prompt: str, n: int = 1, size: str = DEFAULT_SIZE) -> List[dict]:
+        """
+        Returns:
+            List[dict]: One entry per variant with its id, image and thumbnail URLs and
+            whether it came from the cache.
+        """
+        n = max(1, min(n, MAX_VARIANTS))
+        images = [self._image(prompt, size, variant) for variant in range(n)]
+        results = []
+        for image_id, cached, future in images:
+            future.result()
+            results.append({"id": image_id, "url": f"/api/images/{image_id}",
+                            "thumbnail_url": f"/api/images/{image_id}/thumbnail", "cached": cached})
+        return results
+
+    def image_path(self, image_id: str) -> Optional[str]:
+        if not IMAGE_ID.match(image_id):
+            return None
+        return self.store.get(image_id)
+
+    def thumbnail_path(self, image_id: str, size: int = 256) -> Optional[str]:
+        """Returns a thumbnail no larger than size x size, created on first request (needs Pillow)."""
+        original = self.image_path(image_id)
+        if original is None:
+            return None
+        size = min(THUMBNAIL_SIZES, key=lambda allowed: abs(allowed - size))
+        path = self.store.path(image_id, f".thumb{size}")
+        if os.path.exists(path):
+            return path
+        try:
+            from PIL import Image
+        except ImportError:
+            logger.warning("Pillow is not installed; serving the full image as its thumbnail.")
+            return original
+        import io
+        with Image.open(original) as image:
+            image.thumbnail((size, size))
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", optimize=True)
+        return self.store.put(image_id, buffer.getvalue(), f".thumb{size}")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_image_service: Optional[ImageService] = None
+_image_service_lock = threading.Lock()
+
+
+def get_image_service() -> ImageService:
+    """Returns the process-wide image service; IMAGE_BACKEND=fake selects the fake backend."""
+    global _image_service
+    with _image_service_lock:
+        if _image_service is None:
+            backend = FakeImageBackend() if os.getenv("IMAGE_BACKEND") == "fake" else OpenAIImageBackend()
+            _image_service = ImageService(backend, ImageStore(data_path("images")),
+                                          max_workers=int(os.getenv("IMAGE_MAX_WORKERS", "4")))
+        return _image_service
@@ -0,0 +1,157 @@
+import random
+from datetime import datetime, time, timedelta
+from typing import Any, Iterator, List, Optional, Tuple
+
+Interval = Tuple[float, float, Any]
+
+
+class _Node:
+    __slots__ = ("start", "end", "payload", "priority", "max_end", "left", "right")
+
+    def __init__(self, start: float, end: float, payload: Any):
+        self.start = start
+        self.end = end
+        self.payload = payload
+        self.priority = random.random()
+        self.max_end = end
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+
+
+def _update(node: _Node):
+    node.max_end = node.end
+    if node.left is not None and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+
+def _rotate_right(node: _Node) -> _Node:
+    pivot = node.left
+    node.left = pivot.right
+    pivot.right = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+def _rotate_left(node: _Node) -> _Node:
+    pivot = node.right
+    node.right = pivot.left
+    pivot.left = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+class IntervalTree:
+    """
+    Half-open intervals [start, end) in a treap ordered by start and augmented with the
+    maximum end of each subtree, giving O(log n) inserts and O(log n + k) overlap queries.
+    """
+
+    def __init__(self, intervals: Optional[List[Interval]] = None):
+        self._root: Optional[_Node] = None
+        self._size = 0
+        for start, end, payload in intervals or []:
+            self.insert(start, end, payload)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def insert(self, start: float, end: float, payload: Any = None):
+        self._root = self._insert(self._root, _Node(start, end, payload))
+        self._size += 1
+
+    def _insert(self, root: Optional[_Node], node: _Node) -> _Node:
+        if root is None:
+            return node
+        if node.start < root.start:
+            root.left = self._insert(root.left, node)
+            if root.left.priority > root.priority:
+                root = _rotate_right(root)
+        else:
+            root.right = self._insert(root.right, node)
+            if root.right.priority > root.priority:
+                root = _rotate_left(root)
+        _update(root)
+        return root
+
+    def overlaps(self, start: float, end: float) -> List[Interval]:
+        """Returns every stored interval that overlaps [start, end), ordered by start."""
+        found: List[Interval] = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            # Nothing in this subtree ends after our start
+            if node is None or node.max_end <= start:
+                continue
+            stack.append(node.left)
+            if node.start < end:
+                if node.end > start:
+                    found.append((node.start, node.end, node.payload))
+                stack.append(node.right)
+        found.sort(key=lambda interval: interval[0])
+        return found
+
+    def __iter__(self) -> Iterator[Interval]:
+        stack, node = [], self._root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.start, node.end, node.payload
+            node = node.right
+
+
+def _within_hours(start: float, end: float, hours: Tuple[int, int], tz) -> Iterator[Tuple[float, float]]:
+    """Splits [start, end) into the parts that fall inside the daily hours (local to tz)."""
+    day = datetime.fromtimestamp(start, tz).date()
+    while True:
+        day_start = datetime.combine(day, time(hours[0]), tzinfo=tz).timestamp()
+        day_end = datetime.combine(day, time(hours[1]), tzinfo=tz).timestamp() if hours[1] < 24 \
+            else datetime.combine(day + timedelta(days=1), time(0), tzinfo=tz).timestamp()
+        if day_start >= end:
+            return
+        clipped_start, clipped_end = max(start, day_start), min(end, day_end)
+        if clipped_start < clipped_end:
+            yield clipped_start, clipped_end
+        day += timedelta(days=1)
+
+
+def free_slots(tree: IntervalTree, window_start: float, window_end: float, duration: float,
+               limit: int = 5, hours: Optional[Tuple[int, int]] = None, tz=None) -> List[Tuple[float, float]]:
+    """
+    Finds free periods of at least `duration` seconds between busy intervals.
+
+    Args:
+        tree (IntervalTree): Busy intervals as timestamps.
+        window_start (float): Start of the search window (timestamp).
+        window_end (float): End of the search window (timestamp).
+        duration (float): Minimum free period length in seconds.
+        limit (int): Maximum number of periods to return.
+        hours (Tuple[int, int]): Optional allowed daily hours, e.g. (9, 18).
+        tz (tzinfo): Time zone the allowed hours refer to (a zoneinfo.ZoneInfo).
+
+    Returns:
+        List[Tuple[float, float]]: Free (start, end) periods, earliest first.
+    """
+    gaps = []
+    cursor = window_start
+    for busy_start, busy_end, _ in tree.overlaps(window_start, window_end):
+        if busy_start > cursor:
+            gaps.append((cursor, busy_start))
+        cursor = max(cursor, busy_end)
+    if cursor < window_end:
+        gaps.append((cursor, window_end))
+
+    slots: List[Tuple[float, float]] = []
+    for gap_start, gap_end in gaps:
+        parts = _within_hours(gap_start, gap_end, hours, tz) if hours else [(gap_start, gap_end)]
+        for part_start, part_end in parts:
+            if part_end - part_start >= duration:
+                slots.append((part_start, part_end))
+                if len(slots) >= limit:
+                    return slots
+    return slots
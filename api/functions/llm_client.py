@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.getenv("LLM_MODEL", "gpt-4")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARKER = "\n...[truncated]"
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+_tokenizer = _encoding()
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when it is installed, otherwise estimated at four characters a token."""
+    if _tokenizer is not None:
+        return len(_tokenizer.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text to at most max_tokens tokens, including the marker that notes the cut."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max(0, max_tokens - count_tokens(TRUNCATION_MARKER))
+    if _tokenizer is not None:
+        head = _tokenizer.decode(_tokenizer.encode(text, disallowed_special=())[:keep])
+    else:
+        head = text[:keep * CHARS_PER_TOKEN]
+    return head + TRUNCATION_MARKER
+
+
+class LLMClient:
+    """
+    One OpenAI-compatible chat client shared by every caller.
+
+    The underlying HTTP connection pool is reused across requests, and a semaphore caps
+    the requests in flight at max_concurrency however many threads call complete(), so
+    parallel work cannot trip provider rate limits. Transient errors are retried by the
+    OpenAI client.
+    """
+
+    def __init__(self, model: str = DEFAULT_MODEL, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, timeout: float = 120.0):
+        from openai import OpenAI
+
+        self.model = model
+        self.api_key = api_key if api_key is not None else os.getenv("OPENAI_API_KEY", "")
+        self.max_concurrency = max(1, max_concurrency)
+        self.client = OpenAI(api_key=self.api_key or "missing",
+                             base_url=base_url or os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1"),
+                             timeout=timeout, max_retries=3)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm")
+
+    def complete(self, system: str, user: str, max_tokens: int = 1024, temperature: float = 0.7) -> str:
+        with self._slots:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
+                max_tokens=max_tokens,
+                temperature=temperature,
+            )
+        return response.choices[0].message.content or ""
+
+    def map(self, fn: Callable[[T], R], items: List[T]) -> List[R]:
+        """Runs fn over items on the client's worker pool, returning results in order."""
+        return list(self._executor.map(fn, items))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+def tree_reduce(items: List[str], combine: Callable[[List[str], bool], str], budget_tokens: int,
+                client: Optional["LLMClient"] = None) -> str:
+    """
+    Reduces items to one text by combining batches that fit budget_tokens, level by level.
+
+    combine(batch, final) is called with final=True exactly once, for the last batch. Items
+    and combined texts are cut to half the budget, so any two fit in one batch; a level
+    whose items would each end up alone is merged in pairs instead, so every level at
+    least halves the count. The batches of a level are combined concurrently.
+    """
+    if not items:
+        return ""
+    level = [truncate_tokens(item, budget_tokens // 2) for item in items]
+    while True:
+        batches, batch, used = [], [], 0
+        for item in level:
+            tokens = count_tokens(item)
+            if batch and used + tokens > budget_tokens:
+                batches.append(batch)
+                batch, used = [], 0
+            batch.append(item)
+            used += tokens
+        batches.append(batch)
+        if len(batches) == len(level) > 1:
+            batches = [level[i:i + 2] for i in range(0, len(level), 2)]
+        if len(batches) == 1:
+            return combine(batches[0], True)
+        combined = client.map(lambda batch: combine(batch, False), batches) if client else \
+            [combine(batch, False) for batch in batches]
+        level = [truncate_tokens(text, budget_tokens // 2) for text in combined]
+
+
+_llm_client: Optional[LLMClient] = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Returns the process-wide client, configured from the environment (and .env) on first use."""
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _llm_client = LLMClient(model=os.getenv("LLM_MODEL", DEFAULT_MODEL),
+                                    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", str(LLM_MAX_CONCURRENCY))))
+        return _llm_client
+
+
+class FakeLLMServer:
+    """
+    Local stand-in for an OpenAI-compatible /chat/completions endpoint, for tests and benchmarks.
+
+    Each reply is `reply_words` words after `latency` seconds. The server records the
+    largest prompt it received (in characters) and the most requests it served at once.
+    """
+
+    def __init__(self, latency: float = 0.0, reply_words: int = 60):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.latency = latency
+        self.reply_words = reply_words
+        self.requests = 0
+        self.max_prompt_chars = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                prompt_chars = sum(len(message["content"]) for message in request["messages"])
+                with server._lock:
+                    server.requests += 1
+                    server._in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server._in_flight)
+                    server.max_prompt_chars = max(server.max_prompt_chars, prompt_chars)
+                try:
+                    if server.latency:
+                        time.sleep(server.latency)
+                    content = " ".join(f"word{i}" for i in range(server.reply_words))
+                    body = json.dumps({
+                        "id": f"chatcmpl-{server.requests}", "object": "chat.completion", "created": int(time.time()),
+                        "model": request["model"],
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": content}}],
+                        "usage": {"prompt_tokens": prompt_chars // CHARS_PER_TOKEN,
+                                  "completion_tokens": server.reply_words,
+                                  "total_tokens": prompt_chars // CHARS_PER_TOKEN + server.reply_words},
+                    }).encode("utf-8")
+                finally:
+                    with server._lock:
+                        server._in_flight -= 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def __enter__(self) -> "FakeLLMServer":
+        threading.Thread(target=self._server.serve_forever, name="fake-llm", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,231 @@
+import ssl
+import smtplib
+import logging
+import threading
+import socketserver
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from jinja2 import Environment
+
+logger = logging.getLogger(__name__)
+
+HTML_TEMPLATE = """\
+<h1>{{ title }}</h1>
+<ul>
+{%- for entry in entries %}
+<li><a href="{{ entry.link }}">{{ entry.title }}</a> - {{ entry.published or "Unknown date" }}</li>
+{%- endfor %}
+</ul>
+"""
+
+TEXT_TEMPLATE = """\
+{{ title }}
+
+{% for entry in entries -%}
+- {{ entry.title }} ({{ entry.published or "Unknown date" }})
+  {{ entry.link }}
+{% endfor %}"""
+
+# Compiled once per process; only the HTML template escapes its values
+_html_template = Environment(autoescape=True).from_string(HTML_TEMPLATE)
+_text_template = Environment(autoescape=False, trim_blocks=True).from_string(TEXT_TEMPLATE)
+
+
+def render_stream(entries: List, title: str = "Daily Security News") -> Iterator[str]:
+    """Yields the newsletter HTML in chunks as the template renders, with all entry fields escaped."""
+    return _html_template.generate(title=title, entries=entries)
+
+
+def render_html(entries: List, title: str = "Daily Security News") -> str:
+    return "".join(render_stream(entries, title))
+
+
+def render_text(entries: List, title: str = "Daily Security News") -> str:
+    return _text_template.render(title=title, entries=entries)
+
+
+def build_message(subject: str, sender: str, html: str, text: Optional[str] = None) -> EmailMessage:
+    """A multipart/alternative message; recipients are supplied per batch on the SMTP envelope."""
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = sender
+    message["To"] = "undisclosed-recipients:;"
+    message["Date"] = formatdate(localtime=True)
+    message["Message-ID"] = make_msgid()
+    message.set_content(text or "This newsletter is best viewed as HTML.")
+    message.add_alternative(html, subtype="html")
+    return message
+
+
+def batches(recipients: Iterable[str], size: int) -> Iterator[List[str]]:
+    """Splits the recipients into envelope batches, dropping blanks and duplicates."""
+    seen, batch = set(), []
+    for recipient in recipients:
+        recipient = recipient.strip()
+        if not recipient or recipient.lower() in seen:
+            continue
+        seen.add(recipient.lower())
+        batch.append(recipient)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class SMTPMailer:
+    """
+    Sends one message to many recipients over a single SMTP connection.
+
+    The message is serialized once and submitted in envelope batches of `batch_size`
+    recipients (servers commonly cap RCPT TO per transaction), so thousands of recipients
+    cost one connection, one TLS handshake and one login rather than one per message.
+    A dropped connection is re-established once and the interrupted batch retried.
+    """
+
+    def __init__(self, host: str, port: int = 587, username: str = "", password: str = "",
+                 sender: Optional[str] = None, use_tls: bool = True, batch_size: int = 100, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.use_tls = use_tls
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls(context=ssl.create_default_context())
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    def send(self, message: EmailMessage, recipients: Iterable[str]) -> Dict:
+        """
+        Returns:
+            Dict: Counts of recipients accepted and transactions sent, and the refused
+            recipients with the server's reason.
+        """
+        data = message.as_bytes()
+        accepted, transactions = 0, 0
+        refused: Dict[str, Tuple[int, bytes]] = {}
+        smtp = self._connect()
+        try:
+            for batch in batches(recipients, self.batch_size):
+                try:
+                    try:
+                        rejected = smtp.sendmail(self.sender, batch, data)
+                    except smtplib.SMTPServerDisconnected:
+                        logger.warning("SMTP connection dropped, reconnecting.")
+                        smtp = self._connect()
+                        rejected = smtp.sendmail(self.sender, batch, data)
+                except smtplib.SMTPRecipientsRefused as e:
+                    rejected = e.recipients
+                transactions += 1
+                refused.update(rejected)
+                accepted += len(batch) - len(rejected)
+        finally:
+            try:
+                smtp.quit()
+            except smtplib.SMTPException:
+                smtp.close()
+        logger.info(f"Sent \"{message['Subject']}\" to {accepted} recipients in {transactions} transactions "
+                    f"({len(refused)} refused).")
+        return {"accepted": accepted, "transactions": transactions, "refused": refused}
+
+
+class FakeSMTPServer:
+    """
+    Minimal local SMTP server that records what it receives, for tests and dry runs.
+
+    Speaks plain SMTP (no STARTTLS or AUTH), so use it with SMTPMailer(use_tls=False).
+    Addresses in `reject` are refused at RCPT TO.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, reject: Iterable[str] = ()):
+        self.messages: List[Dict] = []
+        self.connections = 0
+        self.reject = {address.lower() for address in reject}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line: str):
+                self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+            def handle(self):
+                with server._lock:
+                    server.connections += 1
+                self.reply("220 fake-smtp ready")
+                sender, recipients = None, []
+                for raw in self.rfile:
+                    command = raw.decode("utf-8", "replace").rstrip("\r\n")
+                    verb = command[:4].upper()
+                    if verb in ("HELO", "EHLO"):
+                        self.reply("250 fake-smtp")
+                    elif verb == "MAIL":
+                        sender, recipients = command.split(":", 1)[1].strip().strip("<>"), []
+                        self.reply("250 OK")
+                    elif verb == "RCPT":
+                        address = command.split(":", 1)[1].strip().strip("<>")
+                        if address.lower() in server.reject:
+                            self.reply("550 No such user")
+                        else:
+                            recipients.append(address)
+                            self.reply("250 OK")
+                    elif verb == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        lines = []
+                        for line in self.rfile:
+                            if line in (b".\r\n", b".\n"):
+                                break
+                            lines.append(line[1:] if line.startswith(b"..") else line)
+                        with server._lock:
+                            server.messages.append({"from": sender, "to": recipients, "data": b"".join(lines)})
+                        self.reply("250 OK queued")
+                    elif verb in ("RSET", "NOOP"):
+                        self.reply("250 OK")
+                    elif verb == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Command not implemented")
+
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "FakeSMTPServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-smtp", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    # Deliver a digest to 5,000 recipients through the local stand-in and report how many
+    # connections and transactions it took
+    import time
+    from collections import namedtuple
+
+    Entry = namedtuple("Entry", "title link published")
+    entries = [Entry(f"Critical <script> flaw #{i} & patch", f"https://example.com/{i}?a=1&b=2",
+                     "Mon, 19 Oct 2026 10:00:00 +0000") for i in range(10)]
+    recipients = [f"user{i}@example.com" for i in range(5000)] + ["bounce@example.com"]
+    message = build_message("Daily Security News", "digest@example.com", render_html(entries), render_text(entries))
+
+    with FakeSMTPServer(reject=["bounce@example.com"]) as server:
+        started = time.perf_counter()
+        result = SMTPMailer(server.host, server.port, sender="digest@example.com", use_tls=False).send(message, recipients)
+        elapsed = time.perf_counter() - started
+        print(f"{result['accepted']} accepted, {len(result['refused'])} refused, {result['transactions']} transactions, "
+              f"{server.connections} connection(s) in {elapsed * 1000:.0f} ms")
+    print(render_html(entries[:2]))
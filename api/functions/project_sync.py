@@ -0,0 +1,308 @@
+import os
+import re
+import json
+import queue
+import hashlib
+import logging
+import tarfile
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SANDBOX_DIR = "/sandbox"
+# Per-project mirrors of synced files and their hashes; outside /sandbox, so they survive the pool reset
+MIRROR_ROOT = "/tmp/pgc-sync"
+MANIFEST_NAME = "manifest.json"
+ALWAYS_IGNORED = {".git", "__pycache__", "node_modules", ".venv", "venv"}
+CHUNK_SIZE = 256 * 1024
+QUEUE_DEPTH = 16  # chunks buffered between the tar writer and the upload (~4MB)
+PUT_TIMEOUT = 0.5  # how often a blocked tar writer checks whether the upload was abandoned
+
+
+def _gitignore_regex(pattern: str) -> str:
+    """Translates one .gitignore glob into a regex over '/'-separated relative paths."""
+    i, out = 0, []
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                out.append("[" + pattern[i + 1:end].replace("!", "^", 1) + "]")
+                i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class GitignoreMatcher:
+    """
+    Applies .gitignore rules found while walking a project tree.
+
+    Each rule is scoped to the directory of the .gitignore that declared it;
+    the last matching rule wins, so negations (!pattern) can re-include files.
+    """
+
+    def __init__(self):
+        self._rules: List[Tuple[str, "re.Pattern", bool, bool]] = []  # (base, regex, negate, dir_only)
+
+    def load(self, directory_rel: str, gitignore_path: str):
+        with open(gitignore_path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.rstrip("\n").rstrip()
+                if not line or line.startswith("#"):
+                    continue
+                negate = line.startswith("!")
+                if negate:
+                    line = line[1:]
+                dir_only = line.endswith("/")
+                line = line.rstrip("/")
+                anchored = "/" in line
+                line = line.lstrip("/")
+                body = _gitignore_regex(line)
+                regex = re.compile(("^" if anchored else r"^(?:.*/)?") + body + "$")
+                self._rules.append((directory_rel, regex, negate, dir_only))
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        if os.path.basename(rel_path) in ALWAYS_IGNORED:
+            return True
+        result = False
+        for base, regex, negate, dir_only in self._rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel_path.startswith(base + "/"):
+                    continue
+                candidate = rel_path[len(base) + 1:]
+            else:
+                candidate = rel_path
+            if regex.match(candidate):
+                result = not negate
+        return result
+
+
+def walk_project(root: str) -> Iterator[Tuple[str, str]]:
+    """Yields (relative posix path, absolute path) of every file not excluded by .gitignore."""
+    matcher = GitignoreMatcher()
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        rel_dir = "" if rel_dir == "." else rel_dir
+        if ".gitignore" in filenames:
+            matcher.load(rel_dir, os.path.join(dirpath, ".gitignore"))
+        dirnames[:] = sorted(
+            d for d in dirnames
+            if not matcher.ignored(f"{rel_dir}/{d}" if rel_dir else d, is_dir=True)
+        )
+        for name in sorted(filenames):
+            rel = f"{rel_dir}/{name}" if rel_dir else name
+            path = os.path.join(dirpath, name)
+            if os.path.islink(path) or matcher.ignored(rel, is_dir=False):
+                continue
+            yield rel, path
+
+
+# Host-side stat cache so unchanged files are not re-hashed on every sync
+_hash_cache: Dict[str, Tuple[int, int, str]] = {}
+_hash_cache_lock = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    st = os.stat(path)
+    with _hash_cache_lock:
+        cached = _hash_cache.get(path)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    with _hash_cache_lock:
+        _hash_cache[path] = (st.st_size, st.st_mtime_ns, digest)
+    return digest
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _QueueWriter:
+    """File-like sink that hands tar output to the uploader in bounded chunks."""
+
+    def __init__(self, chunks: "queue.Queue", cancelled: threading.Event):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.buffer = bytearray()
+
+    def _put(self, chunk: Optional[bytes]):
+        # Bounded waits, so the writer gives up instead of blocking forever if the upload stops reading
+        while True:
+            if self.cancelled.is_set():
+                raise _Cancelled()
+            try:
+                self.chunks.put(chunk, timeout=PUT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        while len(self.buffer) >= CHUNK_SIZE:
+            self._put(bytes(self.buffer[:CHUNK_SIZE]))
+            del self.buffer[:CHUNK_SIZE]
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self._put(bytes(self.buffer))
+            self.buffer.clear()
+
+
+def stream_tar(files: List[Tuple[str, str]], extra: Dict[str, bytes]) -> Iterator[bytes]:
+    """
+    Streams a tar archive of the given files without holding the archive in memory.
+
+    Closing the generator early (e.g. when an upload fails partway) stops the writer
+    thread and closes its files.
+
+    Args:
+        files (List[Tuple[str, str]]): (archive name, absolute path) pairs.
+        extra (Dict[str, bytes]): Small in-memory files to append (e.g. the manifest).
+
+    Yields:
+        bytes: Consecutive chunks of the archive.
+    """
+    import io
+    chunks: "queue.Queue" = queue.Queue(maxsize=QUEUE_DEPTH)
+    cancelled = threading.Event()
+    errors = []
+
+    def produce():
+        writer = _QueueWriter(chunks, cancelled)
+        try:
+            with tarfile.open(fileobj=writer, mode="w|") as tar:
+                for arcname, path in files:
+                    tar.add(path, arcname=arcname, recursive=False)
+                for arcname, data in extra.items():
+                    info = tarfile.TarInfo(arcname)
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+            writer.flush()
+        except _Cancelled:
+            return
+        except Exception as e:
+            errors.append(e)
+        try:
+            writer._put(None)
+        except _Cancelled:
+            pass
+
+    threading.Thread(target=produce, name="project-sync-tar", daemon=True).start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        cancelled.set()
+    if errors:
+        raise errors[0]
+
+
+def mirror_dir(project_directory: str) -> str:
+    """The container directory mirroring a project, keyed by its absolute local path."""
+    key = hashlib.sha1(os.path.abspath(project_directory).encode("utf-8")).hexdigest()[:16]
+    return f"{MIRROR_ROOT}/{key}"
+
+
+def read_manifest(container, mirror: str) -> Dict[str, str]:
+    result = container.exec_run(cmd=["cat", f"{mirror}/{MANIFEST_NAME}"])
+    if result.exit_code != 0:
+        return {}
+    try:
+        return json.loads(result.output.decode("utf-8"))
+    except ValueError:
+        return {}
+
+
+def sync_project(container, project_directory: str, max_file_bytes: Optional[int] = 50 * 1024 * 1024) -> dict:
+    """
+    Mirrors a project directory into the container's /sandbox.
+
+    The container keeps a copy of each synced project, with a manifest of file hashes, in
+    a directory the pool's reset between leases leaves alone. Only files whose hash differs
+    from that manifest are sent, in a single streamed tar, and files removed locally are
+    deleted; the mirror is then copied into /sandbox inside the container. A warm container
+    leased again for the same project therefore receives only the files that changed.
+
+    Args:
+        container: A docker-py container object.
+        project_directory (str): Local project root.
+        max_file_bytes (int): Files larger than this are skipped.
+
+    Returns:
+        dict: Counts of uploaded, unchanged, deleted and skipped files and bytes sent.
+    """
+    import shlex
+    from contextlib import closing
+
+    mirror = mirror_dir(project_directory)
+    remote = read_manifest(container, mirror)
+    local: Dict[str, str] = {}
+    changed: List[Tuple[str, str]] = []
+    skipped = 0
+    uploaded_bytes = 0
+
+    for rel, path in walk_project(project_directory):
+        size = os.path.getsize(path)
+        if max_file_bytes is not None and size > max_file_bytes:
+            skipped += 1
+            continue
+        digest = file_digest(path)
+        local[rel] = digest
+        if remote.get(rel) != digest:
+            changed.append((f"files/{rel}", path))
+            uploaded_bytes += size
+
+    deleted = [rel for rel in remote if rel not in local]
+    for i in range(0, len(deleted), 500):
+        batch = deleted[i:i + 500]
+        container.exec_run(cmd=["rm", "-f", "--"] + [f"{mirror}/files/{rel}" for rel in batch]
+                           + [f"{SANDBOX_DIR}/{rel}" for rel in batch])
+
+    if changed or deleted or not remote:
+        container.exec_run(cmd=["mkdir", "-p", f"{mirror}/files", SANDBOX_DIR])
+        manifest = json.dumps(local, separators=(",", ":")).encode("utf-8")
+        with closing(stream_tar(changed, {MANIFEST_NAME: manifest})) as archive:
+            container.put_archive(mirror, archive)
+
+    result = container.exec_run(cmd=["sh", "-c", f"cp -a {shlex.quote(mirror)}/files/. {SANDBOX_DIR}/"])
+    if result.exit_code not in (0, None):
+        raise RuntimeError(f"Copying the project into {SANDBOX_DIR} failed: "
+                           f"{result.output.decode('utf-8', 'replace')}")
+
+    stats = {
+        "uploaded": len(changed),
+        "unchanged": len(local) - len(changed),
+        "deleted": len(deleted),
+        "skipped": skipped,
+        "bytes": uploaded_bytes,
+    }
+    logger.info(f"Synced {project_directory} to {container.id[:12]}: {stats}")
+    return stats
@@ -0,0 +1,389 @@
+import os
+import re
+import json
+import math
+import heapq
+import logging
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from functions.storage import data_path
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Chunking parameters for ingested documents (in characters)
+CHUNK_SIZE = 1200
+CHUNK_OVERLAP = 200
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Splits text into overlapping passages, preferring paragraph and line boundaries.
+
+    Args:
+        text (str): The text to split.
+        size (int): Maximum passage length in characters.
+        overlap (int): Number of characters repeated between consecutive passages.
+
+    Returns:
+        List[str]: The passages, in document order.
+    """
+    text = text.strip()
+    if len(text) <= size:
+        return [text] if text else []
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            # Break on the last paragraph, line or sentence boundary in the window
+            for sep in ("\n\n", "\n", ". "):
+                cut = text.rfind(sep, start + size // 2, end)
+                if cut != -1:
+                    end = cut + len(sep)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+class OpenAIEmbedder:
+    """Embeds passages through an OpenAI-compatible embeddings endpoint."""
+
+    def __init__(self, model: str, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        from openai import OpenAI
+        self.model = model
+        self.client = OpenAI(
+            api_key=api_key or os.getenv("OPENAI_API_KEY", ""),
+            base_url=base_url or os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1"),
+        )
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(model=self.model, input=texts)
+        return [item.embedding for item in response.data]
+
+
+class HybridIndex:
+    """
+    Local passage index combining BM25 keyword scoring with optional dense vectors.
+
+    Passages are kept in an in-memory inverted index and, when an embedder is
+    configured, in a row-normalised NumPy matrix searched by inner product.
+    The two rankings are merged with reciprocal rank fusion. Every change is
+    appended to a JSON-lines log so the index survives restarts without
+    rewriting the whole file on each insert.
+    """
+
+    K1 = 1.5
+    B = 0.75
+    RRF_K = 60
+
+    def __init__(self, path: str, embedder: Optional[Callable[[List[str]], List[List[float]]]] = None):
+        self.path = path
+        self.embedder = embedder
+        self._lock = threading.RLock()
+
+        self._passages: Dict[str, dict] = {}        # passage id -> {"doc_id", "text", "meta", "len"}
+        self._doc_passages: Dict[str, List[str]] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_len = 0
+
+        self._vectors = None                         # np.ndarray (rows, dim)
+        self._vector_ids: List[Optional[str]] = []   # row -> passage id (None when deleted)
+        self._vector_rows: Dict[str, int] = {}
+        self._dead_records = 0
+
+        self._load()
+
+    # ------------------------------------------------------------------ public
+
+    def add_document(self, doc_id: str, text: str, meta: Optional[dict] = None) -> int:
+        """
+        Indexes a document, replacing any earlier version stored under the same ID.
+
+        Args:
+            doc_id (str): Stable identifier of the document (e.g. "upload:notes.txt").
+            text (str): The document text.
+            meta (dict): Extra metadata returned with each hit.
+
+        Returns:
+            int: The number of passages indexed.
+        """
+        passages = chunk_text(text)
+        vectors = self._embed(passages) if passages else None
+        with self._lock:
+            if doc_id in self._doc_passages:
+                self._delete(doc_id)
+                self._append_log({"op": "del", "doc_id": doc_id})
+            self._add(doc_id, passages, meta or {}, vectors)
+            self._append_log({"op": "add", "doc_id": doc_id, "passages": passages,
+                              "meta": meta or {}, "vectors": vectors})
+            self._compact_if_needed()
+        return len(passages)
+
+    def delete_document(self, doc_id: str) -> bool:
+        """
+        Removes a document and all of its passages.
+
+        Args:
+            doc_id (str): The document identifier.
+
+        Returns:
+            bool: True if the document was indexed.
+        """
+        with self._lock:
+            if doc_id not in self._doc_passages:
+                return False
+            self._delete(doc_id)
+            self._append_log({"op": "del", "doc_id": doc_id})
+            self._compact_if_needed()
+        return True
+
+    def has_document(self, doc_id: str) -> bool:
+        with self._lock:
+            return doc_id in self._doc_passages
+
+    def document_meta(self, doc_id: str) -> Optional[dict]:
+        """Returns the metadata a document was indexed with, or None if it has no passages."""
+        with self._lock:
+            passage_ids = self._doc_passages.get(doc_id)
+            return dict(self._passages[passage_ids[0]]["meta"]) if passage_ids else None
+
+    def document_head(self, doc_id: str) -> Optional[str]:
+        """Returns the first passage of a document, or None if it has no passages."""
+        with self._lock:
+            passage_ids = self._doc_passages.get(doc_id)
+            return self._passages[passage_ids[0]]["text"] if passage_ids else None
+
+    def document_ids(self, prefix: str = "") -> List[str]:
+        with self._lock:
+            return [doc_id for doc_id in self._doc_passages if doc_id.startswith(prefix)]
+
+    def search(self, query: str, top_k: int = 5, doc_prefix: str = "") -> List[dict]:
+        """
+        Returns the best matching passages for a query.
+
+        Args:
+            query (str): Free-text query.
+            top_k (int): Number of passages to return.
+            doc_prefix (str): Restrict hits to documents whose ID starts with this prefix.
+
+        Returns:
+            List[dict]: Hits with "doc_id", "text", "meta" and "score", best first.
+        """
+        query_vector = self._embed([query])[0] if self.embedder is not None else None
+        with self._lock:
+            candidates = max(top_k * 4, 20)
+            rankings = [self._bm25(query, candidates, doc_prefix)]
+            if query_vector is not None and self._vectors is not None:
+                rankings.append(self._dense(query_vector, candidates, doc_prefix))
+
+            fused: Dict[str, float] = {}
+            for ranking in rankings:
+                for rank, passage_id in enumerate(ranking):
+                    fused[passage_id] = fused.get(passage_id, 0.0) + 1.0 / (self.RRF_K + rank + 1)
+
+            best = heapq.nlargest(top_k, fused.items(), key=lambda item: item[1])
+            return [
+                {
+                    "doc_id": self._passages[pid]["doc_id"],
+                    "text": self._passages[pid]["text"],
+                    "meta": self._passages[pid]["meta"],
+                    "score": round(score, 6),
+                }
+                for pid, score in best
+            ]
+
+    def compact(self):
+        """Rewrites the log so it only contains live documents."""
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for doc_id, passage_ids in self._doc_passages.items():
+                    record = {
+                        "op": "add",
+                        "doc_id": doc_id,
+                        "passages": [self._passages[pid]["text"] for pid in passage_ids],
+                        "meta": self._passages[passage_ids[0]]["meta"] if passage_ids else {},
+                        "vectors": self._stored_vectors(passage_ids),
+                    }
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+            self._dead_records = 0
+
+    # ----------------------------------------------------------------- helpers
+
+    def _embed(self, texts: List[str]):
+        if self.embedder is None:
+            return None
+        try:
+            return self.embedder(texts)
+        except Exception as e:
+            logger.error(f"Embedding failed, falling back to keyword search only: {e}")
+            return None
+
+    def _add(self, doc_id: str, passages: List[str], meta: dict, vectors):
+        passage_ids = []
+        for i, text in enumerate(passages):
+            passage_id = f"{doc_id}#{i}"
+            terms = Counter(tokenize(text))
+            length = sum(terms.values())
+            self._passages[passage_id] = {"doc_id": doc_id, "text": text, "meta": meta, "len": length}
+            self._total_len += length
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[passage_id] = tf
+            if vectors is not None:
+                self._add_vector(passage_id, vectors[i])
+            passage_ids.append(passage_id)
+        self._doc_passages[doc_id] = passage_ids
+
+    def _delete(self, doc_id: str):
+        for passage_id in self._doc_passages.pop(doc_id):
+            passage = self._passages.pop(passage_id)
+            self._total_len -= passage["len"]
+            for term in set(tokenize(passage["text"])):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(passage_id, None)
+                    if not postings:
+                        del self._postings[term]
+            row = self._vector_rows.pop(passage_id, None)
+            if row is not None:
+                self._vector_ids[row] = None
+                self._vectors[row] = 0.0
+        self._dead_records += 1
+
+    def _compact_if_needed(self):
+        if self._dead_records > max(64, len(self._passages)):
+            self.compact()
+
+    def _add_vector(self, passage_id: str, vector: List[float]):
+        import numpy as np
+        row = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(row)
+        if norm > 0:
+            row = row / norm
+        if self._vectors is None:
+            self._vectors = np.zeros((64, row.shape[0]), dtype=np.float32)
+        elif len(self._vector_ids) == self._vectors.shape[0]:
+            # Grow geometrically so appends stay amortised O(1)
+            grown = np.zeros((self._vectors.shape[0] * 2, self._vectors.shape[1]), dtype=np.float32)
+            grown[: self._vectors.shape[0]] = self._vectors
+            self._vectors = grown
+        index = len(self._vector_ids)
+        self._vectors[index] = row
+        self._vector_ids.append(passage_id)
+        self._vector_rows[passage_id] = index
+
+    def _stored_vectors(self, passage_ids: List[str]):
+        if not passage_ids or any(pid not in self._vector_rows for pid in passage_ids):
+            return None
+        return [self._vectors[self._vector_rows[pid]].tolist() for pid in passage_ids]
+
+    def _bm25(self, query: str, limit: int, doc_prefix: str) -> List[str]:
+        n = len(self._passages)
+        if n == 0:
+            return []
+        avg_len = self._total_len / n or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for passage_id, tf in postings.items():
+                length = self._passages[passage_id]["len"]
+                denom = tf + self.K1 * (1 - self.B + self.B * length / avg_len)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * tf * (self.K1 + 1) / denom
+        if doc_prefix:
+            scores = {pid: s for pid, s in scores.items() if pid.startswith(doc_prefix)}
+        return [pid for pid, _ in heapq.nlargest(limit, scores.items(), key=lambda item: item[1])]
+
+    def _dense(self, query_vector: List[float], limit: int, doc_prefix: str) -> List[str]:
+        import numpy as np
+        if doc_prefix:
+            # Score only the prefix's own rows, so a small site is not crowded out of the
+            # candidates by the rest of a shared index
+            rows = np.fromiter(
+                (self._vector_rows[pid] for doc_id, passage_ids in self._doc_passages.items()
+                 if doc_id.startswith(doc_prefix) for pid in passage_ids if pid in self._vector_rows),
+                dtype=np.int64,
+            )
+            matrix = self._vectors[rows] if rows.size else None
+        else:
+            rows = None
+            matrix = self._vectors[:len(self._vector_ids)] if self._vector_ids else None
+        if matrix is None:
+            return []
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm > 0:
+            q = q / norm
+        sims = matrix @ q
+        k = min(len(sims), limit)
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        result = []
+        for i in top:
+            passage_id = self._vector_ids[rows[i] if rows is not None else i]
+            if passage_id is not None:
+                result.append(passage_id)
+        return result
+
+    def _append_log(self, record: dict):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupted record in {self.path}")
+                    continue
+                if record["op"] == "add":
+                    if record["doc_id"] in self._doc_passages:
+                        self._delete(record["doc_id"])
+                    self._add(record["doc_id"], record["passages"], record.get("meta", {}), record.get("vectors"))
+                elif record["op"] == "del" and record["doc_id"] in self._doc_passages:
+                    self._delete(record["doc_id"])
+        logger.info(f"Loaded {len(self._doc_passages)} documents from {self.path}")
+
+
+_indexes: Dict[str, HybridIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(name: str = "documents") -> HybridIndex:
+    """
+    Returns the process-wide index with the given name, loading it on first use.
+
+    Dense retrieval is enabled when INDEX_EMBEDDING_MODEL is set in the environment.
+
+    Args:
+        name (str): Index name; each name is stored in its own log file.
+
+    Returns:
+        HybridIndex: The shared index instance.
+    """
+    with _indexes_lock:
+        if name not in _indexes:
+            model = os.getenv("INDEX_EMBEDDING_MODEL")
+            embedder = OpenAIEmbedder(model) if model else None
+            _indexes[name] = HybridIndex(data_path("index", f"{name}.jsonl"), embedder=embedder)
+        return _indexes[name]
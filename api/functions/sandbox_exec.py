@@ -0,0 +1,180 @@
+import re
+import time
+import shlex
+import codecs
+import logging
+import threading
+from typing import Callable, List, Optional, Union
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Runs the command under an in-container wall-clock limit, then records the exit
+# status and the CPU time of its children (`times`) for the stats probe below. The
+# cgroup's peak memory counter can only be reset where the sandbox may write to it;
+# the marker file records whether it was, so a pooled container's lifetime peak is
+# never reported as this run's.
+EXEC_WRAPPER = (
+    'rm -f /tmp/.pgc_peak_reset; '
+    '{ echo 0 > /sys/fs/cgroup/memory.peak || echo 0 > /sys/fs/cgroup/memory/memory.max_usage_in_bytes; } '
+    '2>/dev/null && touch /tmp/.pgc_peak_reset; '
+    'timeout -s KILL "$1" sh -c "$2"; rc=$?; '
+    'times > /tmp/.pgc_times; exit $rc'
+)
+STATS_PROBE = (
+    'cat /tmp/.pgc_times 2>/dev/null; echo ---; '
+    'if [ -e /tmp/.pgc_peak_reset ]; then '
+    'cat /sys/fs/cgroup/memory.peak /sys/fs/cgroup/memory/memory.max_usage_in_bytes 2>/dev/null; fi; '
+    'rm -f /tmp/.pgc_times /tmp/.pgc_peak_reset'
+)
+KILL_ALL = ["sh", "-c", "kill -9 -1"]
+
+# Command used to run a source file inside the sandbox, per language
+RUN_COMMANDS = {
+    'python': "python {path}",
+    'typescript': "ts-node {path}",
+    'shell': "bash {path}",
+}
+TIMES_RE = re.compile(r"(\d+)m([\d.]+)s")
+
+
+class ExecLimits(BaseModel):
+    timeout: float = 30.0            # wall-clock seconds
+    memory_mb: Optional[int] = 512   # container memory limit while the command runs (the pool restores its own on release)
+    max_output_bytes: int = 256_000  # stdout + stderr; the process is killed beyond this
+
+
+class ExecResult(BaseModel):
+    exit_code: Optional[int] = None
+    stdout: str = ""
+    stderr: str = ""
+    wall_time: float = 0.0
+    cpu_user: Optional[float] = None
+    cpu_system: Optional[float] = None
+    peak_rss_bytes: Optional[int] = None
+    timed_out: bool = False
+    output_truncated: bool = False
+    oom_killed: bool = False
+
+
+def _parse_stats(output: str, result: ExecResult):
+    times_part, _, memory_part = output.partition("---")
+    # The second line of `times` holds the user and system time of child processes
+    lines = [line for line in times_part.strip().splitlines() if line.strip()]
+    if len(lines) >= 2:
+        values = [int(m) * 60 + float(s) for m, s in TIMES_RE.findall(lines[1])]
+        if len(values) == 2:
+            result.cpu_user, result.cpu_system = values
+    for line in memory_part.split():
+        if line.isdigit():
+            result.peak_rss_bytes = int(line)
+            break
+
+
+def stream_exec(
+    container,
+    cmd: Union[str, List[str]],
+    limits: Optional[ExecLimits] = None,
+    on_chunk: Optional[Callable[[str, str], None]] = None,
+    workdir: str = "/sandbox",
+) -> ExecResult:
+    """
+    Runs a command in a container, forwarding output chunks as they arrive and enforcing limits.
+
+    Args:
+        container: A docker-py container object.
+        cmd (str | List[str]): Shell command line, or argv list.
+        limits (ExecLimits): Wall-clock, memory and output limits.
+        on_chunk (Callable): Called with ("stdout" | "stderr", text) for each chunk.
+        workdir (str): Working directory inside the container.
+
+    Returns:
+        ExecResult: Exit status, captured (possibly truncated) output and resource usage.
+        peak_rss_bytes is the container cgroup's peak memory during the run, which is the
+        closest reliable figure available across sandbox images; it is None where the
+        sandbox cannot reset the cgroup's peak counter before the run.
+    """
+    limits = limits or ExecLimits()
+    api = container.client.api
+    command = cmd if isinstance(cmd, str) else " ".join(shlex.quote(part) for part in cmd)
+
+    if limits.memory_mb:
+        try:
+            container.update(mem_limit=f"{limits.memory_mb}m", memswap_limit=f"{limits.memory_mb}m")
+        except Exception as e:
+            logger.warning(f"Could not apply memory limit to {container.id[:12]}: {e}")
+
+    result = ExecResult()
+    kill_lock = threading.Lock()
+    killed = []
+
+    def kill(reason: str):
+        with kill_lock:
+            if killed:
+                return
+            killed.append(reason)
+        try:
+            container.exec_run(cmd=KILL_ALL)
+        except Exception as e:
+            logger.error(f"Could not kill runaway process in {container.id[:12]}: {e}")
+
+    exec_id = api.exec_create(
+        container.id,
+        ["sh", "-c", EXEC_WRAPPER, "pgc", str(max(1, int(limits.timeout))), command],
+        stdout=True, stderr=True, workdir=workdir
+    )["Id"]
+
+    # Backstop in case the in-container timeout itself is stuck or was killed
+    watchdog = threading.Timer(limits.timeout + 2, kill, args=("timeout",))
+    watchdog.daemon = True
+
+    decoders = {"stdout": codecs.getincrementaldecoder("utf-8")("replace"),
+                "stderr": codecs.getincrementaldecoder("utf-8")("replace")}
+    captured = {"stdout": [], "stderr": []}
+    total = 0
+    start = time.monotonic()
+    watchdog.start()
+    try:
+        for stdout_chunk, stderr_chunk in api.exec_start(exec_id, stream=True, demux=True):
+            for name, chunk in (("stdout", stdout_chunk), ("stderr", stderr_chunk)):
+                if not chunk or result.output_truncated:
+                    continue
+                room = limits.max_output_bytes - total
+                if len(chunk) > room:
+                    chunk = chunk[:room]
+                    result.output_truncated = True
+                total += len(chunk)
+                text = decoders[name].decode(chunk)
+                captured[name].append(text)
+                if on_chunk is not None and text:
+                    on_chunk(name, text)
+            if result.output_truncated:
+                kill("output")
+    finally:
+        watchdog.cancel()
+    result.wall_time = round(time.monotonic() - start, 4)
+
+    result.stdout = "".join(captured["stdout"])
+    result.stderr = "".join(captured["stderr"])
+    result.exit_code = api.exec_inspect(exec_id).get("ExitCode")
+    result.timed_out = "timeout" in killed or (result.exit_code == 137 and result.wall_time >= limits.timeout)
+    result.oom_killed = result.exit_code == 137 and not killed and not result.timed_out
+
+    try:
+        stats = container.exec_run(cmd=["sh", "-c", STATS_PROBE])
+        _parse_stats(stats.output.decode("utf-8", "replace"), result)
+    except Exception as e:
+        logger.warning(f"Could not read resource usage from {container.id[:12]}: {e}")
+    return result
+
+
+def run_with_broadcast(container, cmd: Union[str, List[str]], limits: Optional[ExecLimits] = None,
+                       workdir: str = "/sandbox") -> ExecResult:
+    """Runs stream_exec and publishes each output chunk as an "exec_output" event for the WebSocket clients."""
+    from functions.event_bus import publish
+
+    def forward(stream: str, text: str):
+        publish({"type": "exec_output", "container_id": container.id, "stream": stream, "message": text})
+
+    return stream_exec(container, cmd, limits=limits, on_chunk=forward, workdir=workdir)
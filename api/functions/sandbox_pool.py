@@ -0,0 +1,279 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Sandbox images per language
+IMAGE_MAP = {
+    'python': 'python-sandbox',
+    'typescript': 'typescript-sandbox',
+    'shell': 'shell-sandbox'
+}
+DEFAULT_IMAGE = 'python-sandbox'
+
+# Shortest container ID prefix accepted when looking up a lease (Docker's short ID length)
+MIN_ID_PREFIX = 12
+
+# Memory limit pooled containers start with; runs may change it, and release() restores it
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "1024"))
+
+# Removes everything a previous run left behind: stray processes and /sandbox contents.
+# Project mirrors under /tmp/pgc-sync are kept so the next lease only syncs changed files.
+RESET_COMMAND = ["sh", "-c", "kill -9 -1 2>/dev/null; rm -rf /sandbox/* /sandbox/.[!.]* /sandbox/..?*; mkdir -p /sandbox"]
+
+_docker_client = None
+_docker_client_lock = threading.Lock()
+
+
+def get_docker_client():
+    """Returns the process-wide Docker client, creating it on first use."""
+    global _docker_client
+    with _docker_client_lock:
+        if _docker_client is None:
+            import docker
+            _docker_client = docker.from_env()
+        return _docker_client
+
+
+class PooledContainer:
+    def __init__(self, container, image: str):
+        self.container = container
+        self.image = image
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+        self.dirty = False  # set by callers when the container must not be reused
+
+    @property
+    def id(self) -> str:
+        return self.container.id
+
+
+class SandboxPool:
+    """
+    Keeps warm sandbox containers per image and leases them out for code execution.
+
+    Containers are reset after each lease and recycled once they exceed the
+    maximum age, idle time or number of uses. A background thread removes
+    expired containers, reclaims leases left unused for longer than max_lease
+    (e.g. never stopped by the agent), and tops each image back up to its warm size.
+    """
+
+    def __init__(self, client, warm_size: int = 1, max_idle: float = 600, max_age: float = 3600,
+                 max_uses: int = 100, max_lease: float = 1800, reap_interval: float = 30):
+        self.client = client
+        self.warm_size = warm_size
+        self.max_idle = max_idle
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self.max_lease = max_lease
+        self.reap_interval = reap_interval
+
+        self._idle: Dict[str, Deque[PooledContainer]] = {}
+        self._leased: Dict[str, PooledContainer] = {}
+        self._warm_images = set(IMAGE_MAP.values())
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._reaper = None
+
+    def start(self):
+        """Starts the background thread that pre-warms and expires containers."""
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._maintain, name="sandbox-pool", daemon=True)
+            self._reaper.start()
+
+    def acquire(self, language: Optional[str] = None, image: Optional[str] = None) -> PooledContainer:
+        """
+        Leases a ready container, starting a new one only when none is idle.
+
+        Args:
+            language (str): Language used to pick the sandbox image.
+            image (str): Explicit image name; takes precedence over language.
+
+        Returns:
+            PooledContainer: The leased container.
+        """
+        image = image or IMAGE_MAP.get(language, DEFAULT_IMAGE)
+        while True:
+            with self._lock:
+                idle = self._idle.get(image)
+                pooled = idle.pop() if idle else None  # LIFO keeps surplus containers idle so they expire
+            if pooled is None:
+                pooled = self._start(image)
+                break
+            if not self._expired(pooled):
+                break
+            self._discard(pooled)
+        pooled.uses += 1
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            self._leased[pooled.id] = pooled
+        return pooled
+
+    def release(self, pooled: PooledContainer):
+        """
+        Returns a leased container to the pool after resetting it, or recycles it.
+
+        Args:
+            pooled (PooledContainer): The container returned by acquire().
+        """
+        with self._lock:
+            self._leased.pop(pooled.id, None)
+        if pooled.dirty or pooled.uses >= self.max_uses or self._expired(pooled) or self._stopped.is_set():
+            self._discard(pooled)
+            return
+        try:
+            result = pooled.container.exec_run(cmd=RESET_COMMAND)
+            if result.exit_code not in (0, None):
+                raise RuntimeError(result.output.decode('utf-8', 'replace'))
+            if SANDBOX_MEMORY_MB:
+                # The lessee may have run with a different memory limit
+                pooled.container.update(mem_limit=f"{SANDBOX_MEMORY_MB}m", memswap_limit=f"{SANDBOX_MEMORY_MB}m")
+        except Exception as e:
+            logger.warning(f"Recycling sandbox {pooled.id[:12]} after failed reset: {e}")
+            self._discard(pooled)
+            return
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            self._idle.setdefault(pooled.image, deque()).append(pooled)
+
+    def release_by_id(self, container_id: str) -> bool:
+        """Releases a leased container by ID. Returns False if it is not leased from this pool."""
+        pooled = self.get_leased(container_id)
+        if pooled is None:
+            return False
+        self.release(pooled)
+        return True
+
+    def get_leased(self, container_id: str) -> Optional[PooledContainer]:
+        """Finds a lease by its full ID or an unambiguous prefix of at least MIN_ID_PREFIX characters."""
+        if len(container_id) < MIN_ID_PREFIX:
+            return None
+        with self._lock:
+            matches = [p for cid, p in self._leased.items() if cid.startswith(container_id)]
+        return matches[0] if len(matches) == 1 else None
+
+    def touch(self, container_id: str) -> bool:
+        """Marks a lease as in use so it is not reclaimed. Returns False if it is not leased from this pool."""
+        pooled = self.get_leased(container_id)
+        if pooled is None:
+            return False
+        pooled.last_used = time.monotonic()
+        return True
+
+    @contextmanager
+    def lease(self, language: Optional[str] = None, image: Optional[str] = None):
+        pooled = self.acquire(language=language, image=image)
+        try:
+            yield pooled
+        except BaseException:
+            pooled.dirty = True
+            raise
+        finally:
+            self.release(pooled)
+
+    def prewarm(self):
+        """Tops up every warm image to the configured number of idle containers."""
+        for image in list(self._warm_images):
+            with self._lock:
+                missing = self.warm_size - len(self._idle.get(image, ()))
+            for _ in range(max(missing, 0)):
+                try:
+                    pooled = self._start(image)
+                except Exception as e:
+                    logger.error(f"Could not pre-warm sandbox image {image}: {e}")
+                    break
+                with self._lock:
+                    self._idle.setdefault(image, deque()).append(pooled)
+
+    def reap(self):
+        """Removes idle containers past their max idle time or age, and leases unused for max_lease."""
+        expired = []
+        now = time.monotonic()
+        with self._lock:
+            for image, idle in self._idle.items():
+                keep = deque()
+                for pooled in idle:
+                    (expired if self._expired(pooled) else keep).append(pooled)
+                self._idle[image] = keep
+            abandoned = [p for p in self._leased.values() if now - p.last_used > self.max_lease]
+            for pooled in abandoned:
+                del self._leased[pooled.id]
+        for pooled in abandoned:
+            logger.warning(f"Reclaiming sandbox {pooled.id[:12]}: leased but unused for {self.max_lease:.0f}s")
+        for pooled in expired + abandoned:
+            self._discard(pooled)
+
+    def shutdown(self):
+        """Stops the maintenance thread and removes all containers, idle and leased."""
+        self._stopped.set()
+        with self._lock:
+            containers = [p for queue in self._idle.values() for p in queue] + list(self._leased.values())
+            self._idle.clear()
+            self._leased.clear()
+        for pooled in containers:
+            self._discard(pooled)
+
+    def _expired(self, pooled: PooledContainer) -> bool:
+        now = time.monotonic()
+        return now - pooled.created_at > self.max_age or now - pooled.last_used > self.max_idle
+
+    def _start(self, image: str) -> PooledContainer:
+        container = self.client.containers.run(
+            image,
+            stdin_open=True,
+            tty=True,
+            detach=True,
+            remove=True,
+            labels={"pg-copilot.sandbox-pool": "1"},
+            **({"mem_limit": f"{SANDBOX_MEMORY_MB}m", "memswap_limit": f"{SANDBOX_MEMORY_MB}m"}
+               if SANDBOX_MEMORY_MB else {})
+        )
+        container.exec_run(cmd=["mkdir", "-p", "/sandbox"])
+        logger.debug(f"Started sandbox {container.id[:12]} from {image}")
+        return PooledContainer(container, image)
+
+    def _discard(self, pooled: PooledContainer):
+        try:
+            pooled.container.kill()
+        except Exception as e:
+            logger.debug(f"Sandbox {pooled.id[:12]} already gone: {e}")
+
+    def _maintain(self):
+        while not self._stopped.is_set():
+            try:
+                self.reap()
+                self.prewarm()
+            except Exception as e:
+                logger.error(f"Sandbox pool maintenance failed: {e}")
+            self._stopped.wait(self.reap_interval)
+
+
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SandboxPool:
+    """
+    Returns the process-wide sandbox pool.
+
+    Pool sizing is read from SANDBOX_POOL_SIZE, SANDBOX_MAX_IDLE, SANDBOX_MAX_AGE,
+    SANDBOX_MAX_USES and SANDBOX_MAX_LEASE (seconds for the time limits).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool(
+                get_docker_client(),
+                warm_size=int(os.getenv("SANDBOX_POOL_SIZE", "1")),
+                max_idle=float(os.getenv("SANDBOX_MAX_IDLE", "600")),
+                max_age=float(os.getenv("SANDBOX_MAX_AGE", "3600")),
+                max_uses=int(os.getenv("SANDBOX_MAX_USES", "100")),
+                max_lease=float(os.getenv("SANDBOX_MAX_LEASE", "1800")),
+            )
+        return _pool
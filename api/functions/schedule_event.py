@@ -13,36 +13,9 @@ def schedule_event(self, title: str, start: str, end: str, description: str = No
     Returns:
         str: Confirmation message with event link or an error message.
     """
-    from google.auth.transport.requests import Request
-    from google.oauth2.credentials import Credentials
-    from google_auth_oauthlib.flow import InstalledAppFlow
-    from googleapiclient.discovery import build
-    import os
-    def get_calendar_service():
-        TOKEN_PATH = os.path.join('..', 'api', 'gcal_token.json')
-        CREDENTIALS_PATH = os.path.join('..', 'api', 'google_api_credentials.json')
-        SCOPES = ["https://www.googleapis.com/auth/calendar"]
-        
-        creds = None
-        if os.path.exists(TOKEN_PATH):
-            creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
-
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_PATH, SCOPES)
-                creds = flow.run_local_server(port=0)
-            with open(TOKEN_PATH, 'w') as token_file:
-                token_file.write(creds.to_json())
-
-        return build("calendar", "v3", credentials=creds)
+    from functions.calendar_store import get_calendar_sync
 
     try:
-        service = get_calendar_service()
-        if not service:
-            return "Failed to connect to Google Calendar service."
-
         event = {
             'summary': title,
             'description': description,
@@ -56,7 +29,8 @@ def schedule_event(self, title: str, start: str, end: str, description: str = No
             },
         }
 
-        event_result = service.events().insert(calendarId='primary', body=event).execute()
+        # Write through to Google Calendar and the local event store
+        event_result = get_calendar_sync().insert_event(event)
         return f"Event created: {event_result.get('htmlLink')}"
 
     except Exception as e:
@@ -0,0 +1,23 @@
+def search_documents(self, query: str, top_k: int = 5) -> str:
+    """
+    Searches the local document index (uploaded files, translated papers and project analyses)
+    and returns the most relevant passages.
+
+    Args:
+        query (str): The search query.
+        top_k (int): Maximum number of passages to return.
+
+    Returns:
+        str: The matching passages with their source, or a message if nothing matched.
+    """
+    from functions.retrieval_index import get_index
+
+    hits = get_index().search(query, top_k=top_k)
+    if not hits:
+        return "No matching documents found."
+
+    results = []
+    for i, hit in enumerate(hits, start=1):
+        source = hit["meta"].get("source", hit["doc_id"])
+        results.append(f"[{i}] {source}\n{hit['text']}")
+    return "\n\n".join(results)
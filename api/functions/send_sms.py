@@ -4,45 +4,68 @@ def send_text_message(self, message: str, recipient: str) -> str:
 
     Args:
         message (str): The contents of the message to send.
-        recipient (str): The name of the recipient for the message.
+        recipient (str): The name of a saved contact, a phone number in international format,
+            "tag:<group>" for every contact in a group, or several of these separated by commas.
 
     Returns:
         str: The status of the text message.
     """
-    import os
     import traceback
-    from twilio.rest import Client
-    # Import the names and phone numbers from environment variables
-    user1_name = os.getenv("USER1_NAME", "User1")  # Default to "User1" if not provided
-    user2_name = os.getenv("USER2_NAME", "User2")  # Default to "User2" if not provided
-    account_sid = os.environ["TWILIO_ACCOUNT_SID"]
-    auth_token = os.environ["TWILIO_AUTH_TOKEN"]
-    client = Client(account_sid, auth_token)
-
-    from_number = os.getenv("TWILIO_FROM_NUMBER")
-
-    # Define a dictionary mapping recipients to their phone numbers
-    recipients = {
-        user1_name: os.getenv("USER1_PHONE_NUMBER"),
-        user2_name: os.getenv("USER2_PHONE_NUMBER")
-        # Add more recipients as needed
-    }
-
-    # Look up the phone number for the recipient
-    to_number = recipients.get(recipient)
-
-    # Check if recipient exists in the dictionary
-    if not to_number:
-        return f"Recipient '{recipient}' not found."
+    from functions.sms_dispatcher import get_contacts, get_sms_dispatcher
 
     try:
-        message = client.messages.create(
-            body=str(message),
-            from_=from_number,
-            to=to_number,
-        )
-        return "Message was successfully sent."
+        # Look up the phone numbers for the recipients
+        resolved = get_contacts().resolve(recipient)
+        unknown = [name for name, number in resolved.items() if number is None]
+        numbers = [number for number in resolved.values() if number]
+
+        # Check that every recipient exists before sending anything
+        if unknown or not numbers:
+            return f"Recipient '{', '.join(unknown) or recipient}' not found."
+
+        dispatcher = get_sms_dispatcher()
+        if len(numbers) == 1:
+            result = dispatcher.send(numbers[0], str(message))
+            if result["status"] == "sent":
+                return "Message was successfully sent."
+            if result["status"] == "unknown":
+                return (f"The message may or may not have been sent ({result['error']}); "
+                        "it was not retried to avoid a duplicate text.")
+            return f"Message failed to send with error: {result['error']}"
+
+        # Many recipients: queue the batch and report its progress after a short wait
+        status = dispatcher.wait_batch(dispatcher.send_batch(numbers, str(message)), timeout=10)
+        summary = f"Sent {status['sent']} of {status['total']} messages"
+        if status["pending"]:
+            summary += f", {status['pending']} still queued (batch {status['batch']})"
+        if status["failed"]:
+            summary += ". Failed: " + "; ".join(f"{r['to']} ({r['error']})" for r in status["failed"])
+        if status["unknown"]:
+            summary += ". Unknown outcome, not retried: " + "; ".join(
+                f"{r['to']} ({r['error']})" for r in status["unknown"])
+        return summary + "."
 
     except Exception as e:
         traceback.print_exc()
         return f"Message failed to send with error: {str(e)}"
+
+
+def save_contact(self, name: str, phone_number: str, groups: str = "") -> str:
+    """
+    Saves a contact for text messages, or updates the phone number of an existing one.
+
+    Args:
+        name (str): The contact's name.
+        phone_number (str): The phone number in international format, e.g. +447700900123.
+        groups (str): Comma-separated group tags, e.g. "family,team", to message them as "tag:<group>".
+
+    Returns:
+        str: Confirmation, or the reason the contact could not be saved.
+    """
+    from functions.sms_dispatcher import get_contacts
+
+    try:
+        contact = get_contacts().upsert(name, phone_number, groups.split(","))
+    except ValueError as e:
+        return str(e)
+    return f"Saved {contact['name']} ({contact['phone']})."
@@ -0,0 +1,471 @@
+import os
+import re
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+
+from functions.storage import data_path
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "PG-Copilot-Crawler/1.0"
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """Absolute http(s) URL without fragment or default port, or None for other schemes."""
+    if base:
+        url = urljoin(base, url)
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+    netloc = parts.hostname.lower()
+    if parts.port and parts.port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{parts.port}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+class MarkdownExtractor(HTMLParser):
+    """Converts HTML to compact markdown and collects the page's links, skipping scripts and navigation."""
+
+    SKIP = {"script", "style", "noscript", "svg", "template", "iframe", "nav", "footer", "form"}
+    BLOCKS = {"p", "div", "section", "article", "main", "header", "table", "tr", "blockquote", "ul", "ol", "dl"}
+    INLINE = {"strong": "**", "b": "**", "em": "*", "i": "*"}
+
+    def __init__(self, base_url: str):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.title = ""
+        self.links: List[str] = []
+        self._out: List[str] = []
+        self._skip = 0
+        self._pre = 0
+        self._lists = 0
+        self._in_title = False
+        self._anchors: List[Tuple[Optional[str], int]] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip += 1
+        if self._skip:
+            return
+        attrs = dict(attrs)
+        if tag == "title":
+            self._in_title = True
+        elif tag == "base" and attrs.get("href"):
+            self.base_url = urljoin(self.base_url, attrs["href"])
+        elif len(tag) == 2 and tag[0] == "h" and tag[1] in "123456":
+            self._out.append("\n\n" + "#" * int(tag[1]) + " ")
+        elif tag in self.BLOCKS:
+            self._lists += tag in ("ul", "ol")
+            self._out.append("\n\n")
+        elif tag == "li":
+            self._out.append("\n" + "  " * max(0, self._lists - 1) + "- ")
+        elif tag == "br":
+            self._out.append("\n")
+        elif tag == "pre":
+            self._pre += 1
+            self._out.append("\n\n```\n")
+        elif tag == "code" and not self._pre:
+            self._out.append("`")
+        elif tag in self.INLINE:
+            self._out.append(self.INLINE[tag])
+        elif tag == "a":
+            href = normalize_url(attrs["href"], self.base_url) if attrs.get("href") else None
+            if href:
+                self.links.append(href)
+            self._anchors.append((href, len(self._out)))
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skip = max(0, self._skip - 1)
+            return
+        if self._skip:
+            return
+        if tag == "title":
+            self._in_title = False
+        elif len(tag) == 2 and tag[0] == "h" and tag[1] in "123456" or tag in self.BLOCKS:
+            self._lists -= tag in ("ul", "ol") and self._lists > 0
+            self._out.append("\n\n")
+        elif tag == "pre" and self._pre:
+            self._pre -= 1
+            self._out.append("\n```\n\n")
+        elif tag == "code" and not self._pre:
+            self._out.append("`")
+        elif tag in self.INLINE:
+            self._out.append(self.INLINE[tag])
+        elif tag == "a" and self._anchors:
+            href, start = self._anchors.pop()
+            text = "".join(self._out[start:]).strip()
+            if href and text:
+                self._out[start:] = [f"[{text}]({href})"]
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._in_title:
+            self.title += data
+        elif self._pre:
+            self._out.append(data)
+        else:
+            self._out.append(re.sub(r"\s+", " ", data))
+
+    def markdown(self) -> str:
+        text = "".join(self._out)
+        text = re.sub(r"[ \t]+\n", "\n", text)
+        text = re.sub(r"\n[ \t]+(?=[^-\s])", "\n", text)
+        return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def html_to_markdown(html: str, base_url: str) -> Tuple[str, str, List[str]]:
+    """Returns the page's title, its content as markdown and its outgoing links."""
+    extractor = MarkdownExtractor(base_url)
+    extractor.feed(html)
+    extractor.close()
+    return " ".join(extractor.title.split()), extractor.markdown(), extractor.links
+
+
+async def read_body(content: aiohttp.StreamReader, limit: int) -> bytes:
+    """Reads a response body up to limit bytes; StreamReader.read(n) only returns what is buffered."""
+    chunks, size = [], 0
+    async for chunk in content.iter_chunked(64 * 1024):
+        chunks.append(chunk[:limit - size])
+        size += len(chunks[-1])
+        if size >= limit:
+            break
+    return b"".join(chunks)
+
+
+class HostLimiter:
+    """Per-host politeness: at most `concurrency` requests in flight and `delay` seconds between starts."""
+
+    def __init__(self, concurrency: int, delay: float):
+        self.delay = delay
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        if self.delay:
+            async with self._lock:
+                wait = self._next_start - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._next_start = time.monotonic() + self.delay
+
+    async def __aexit__(self, *exc_info):
+        self._semaphore.release()
+
+
+class CrawlState:
+    """
+    Crawl frontiers in SQLite, so an interrupted or budget-limited crawl resumes where it stopped.
+
+    A site whose frontier has no pending URLs left is crawled afresh next time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS frontier (
+                    site TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    depth INTEGER NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (site, url)
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def begin(self, site: str, start_url: str) -> Tuple[Set[str], List[Tuple[str, int]]]:
+        """Returns the URLs already seen and the pending (url, depth) pairs, shallowest first."""
+        with self._connect() as conn:
+            pending = conn.execute("SELECT url, depth FROM frontier WHERE site = ? AND done = 0 ORDER BY depth",
+                                   (site,)).fetchall()
+            if not pending:
+                conn.execute("DELETE FROM frontier WHERE site = ?", (site,))
+                conn.execute("INSERT INTO frontier (site, url, depth) VALUES (?, ?, 0)", (site, start_url))
+                return {start_url}, [(start_url, 0)]
+            seen = {url for (url,) in conn.execute("SELECT url FROM frontier WHERE site = ?", (site,))}
+        logger.info(f"Resuming crawl of {site} with {len(pending)} pending URLs.")
+        return seen, pending
+
+    def add(self, site: str, urls: List[Tuple[str, int]]):
+        with self._connect() as conn:
+            conn.executemany("INSERT OR IGNORE INTO frontier (site, url, depth) VALUES (?, ?, ?)",
+                             [(site, url, depth) for url, depth in urls])
+
+    def done(self, site: str, url: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE frontier SET done = 1 WHERE site = ? AND url = ?", (site, url))
+
+
+class SiteCrawler:
+    """
+    Asynchronous breadth-first crawler for a single site.
+
+    Pages are yielded as soon as they are fetched. The frontier deduplicates normalized
+    URLs, robots.txt is honoured (including Crawl-delay), requests per host are bounded
+    by HostLimiter, and the crawl stops at `max_pages` fetched or `max_depth` links deep.
+    After a crawl, `complete` tells whether it covered the whole reachable site in one run
+    (not resumed, no URL left over for lack of budget or failed with an unexpected error),
+    and `resumed` whether it continued an earlier crawl that stopped at its page budget.
+    """
+
+    def __init__(self, max_pages: int = 50, max_depth: int = 3, concurrency: int = 8, per_host: int = 4,
+                 delay: float = 0.0, timeout: float = 15, user_agent: str = USER_AGENT,
+                 state: Optional[CrawlState] = None):
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.delay = delay
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.state = state
+        self.complete = False
+        self.resumed = False
+        self._robots: Dict[str, RobotFileParser] = {}
+        self._limiters: Dict[str, HostLimiter] = {}
+
+    async def _robots_for(self, session: aiohttp.ClientSession, url: str) -> RobotFileParser:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        if origin not in self._robots:
+            robots = RobotFileParser(f"{origin}/robots.txt")
+            try:
+                async with session.get(robots.url) as response:
+                    if response.status in (401, 403) or response.status >= 500:
+                        robots.disallow_all = True
+                    elif response.status >= 400:
+                        robots.allow_all = True
+                    else:
+                        robots.parse((await response.text(errors="replace")).splitlines())
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                robots.allow_all = True
+            self._robots[origin] = robots
+            crawl_delay = robots.crawl_delay(self.user_agent)
+            self._limiters[parts.netloc] = HostLimiter(self.per_host, max(self.delay, float(crawl_delay or 0)))
+        return self._robots[origin]
+
+    async def _allowed(self, session: aiohttp.ClientSession, url: str) -> bool:
+        if (await self._robots_for(session, url)).can_fetch(self.user_agent, url):
+            return True
+        logger.debug(f"Skipping {url}: disallowed by robots.txt")
+        return False
+
+    async def _fetch(self, session: aiohttp.ClientSession, url: str, depth: int) -> Optional[dict]:
+        try:
+            async with self._limiters[urlsplit(url).netloc]:
+                async with session.get(url) as response:
+                    content_type = response.headers.get("Content-Type", "")
+                    if response.status != 200 or "html" not in content_type:
+                        return None
+                    body = await read_body(response.content, MAX_PAGE_BYTES)
+                    final_url = normalize_url(str(response.url)) or url
+                    html = body.decode(response.get_encoding() if response.charset else "utf-8", errors="replace")
+        except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeError, LookupError) as e:
+            logger.warning(f"Error crawling {url}: {e}")
+            return None
+        title, markdown, links = html_to_markdown(html, final_url)
+        return {"url": final_url, "title": title or final_url, "markdown": markdown, "links": links,
+                "depth": depth, "fetched_ts": time.time()}
+
+    async def crawl(self, start_url: str) -> AsyncIterator[dict]:
+        """
+        Crawls the site of `start_url`, yielding each page as a dict with url, title,
+        markdown, links, depth and fetched_ts.
+        """
+        start = normalize_url(start_url)
+        if start is None:
+            raise ValueError(f"Not an http(s) URL: {start_url}")
+        host = urlsplit(start).netloc
+        if self.state is not None:
+            seen, pending = self.state.begin(start, start)
+        else:
+            seen, pending = {start}, [(start, 0)]
+
+        frontier: "asyncio.Queue[Tuple[str, int]]" = asyncio.Queue()
+        for item in pending:
+            frontier.put_nowait(item)
+        results: "asyncio.Queue[Optional[dict]]" = asyncio.Queue()
+        self.complete = False
+        self.resumed = resumed = len(seen) > 1
+        started, over_budget, failed = 0, 0, 0
+
+        async def worker(session: aiohttp.ClientSession):
+            nonlocal started, over_budget, failed
+            while True:
+                url, depth = await frontier.get()
+                try:
+                    allowed = await self._allowed(session, url)
+                    # Over budget: leave the URL pending for a resumed crawl
+                    if allowed and started >= self.max_pages:
+                        over_budget += 1
+                        continue
+                    started += allowed
+                    page = await self._fetch(session, url, depth) if allowed else None
+                    if self.state is not None:
+                        self.state.done(start, url)
+                    if page is None:
+                        continue
+                    if page["url"] != url:
+                        # Redirected: the target is crawled once, whichever URL led to it
+                        if page["url"] in seen:
+                            continue
+                        seen.add(page["url"])
+                        if self.state is not None:
+                            self.state.add(start, [(page["url"], depth)])
+                            self.state.done(start, page["url"])
+                    found = []
+                    if depth < self.max_depth:
+                        for link in page["links"]:
+                            if link not in seen and urlsplit(link).netloc == host:
+                                seen.add(link)
+                                found.append((link, depth + 1))
+                    if self.state is not None and found:
+                        self.state.add(start, found)
+                    for item in found:
+                        frontier.put_nowait(item)
+                    await results.put(page)
+                except Exception as e:
+                    # One bad page (or a state write failure) must not take the worker down with it
+                    failed += 1
+                    logger.exception(f"Error crawling {url}: {e}")
+                finally:
+                    frontier.task_done()
+
+        async def finish():
+            await frontier.join()
+            await results.put(None)
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host)
+        async with aiohttp.ClientSession(connector=connector, headers={"User-Agent": self.user_agent},
+                                         timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+            tasks = [asyncio.create_task(worker(session)) for _ in range(self.concurrency)]
+            tasks.append(asyncio.create_task(finish()))
+            try:
+                while True:
+                    page = await results.get()
+                    if page is None:
+                        self.complete = not resumed and not over_budget and not failed
+                        break
+                    yield page
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_crawl_state: Optional[CrawlState] = None
+_crawl_state_lock = threading.Lock()
+
+
+def get_crawl_state() -> CrawlState:
+    global _crawl_state
+    with _crawl_state_lock:
+        if _crawl_state is None:
+            _crawl_state = CrawlState(data_path("crawls.sqlite"))
+        return _crawl_state
+
+
+def make_crawler(**kwargs) -> SiteCrawler:
+    """A crawler with the shared crawl state; CRAWL_MAX_PAGES and CRAWL_MAX_DEPTH set the default budget."""
+    kwargs.setdefault("max_pages", int(os.getenv("CRAWL_MAX_PAGES", "50")))
+    kwargs.setdefault("max_depth", int(os.getenv("CRAWL_MAX_DEPTH", "3")))
+    kwargs.setdefault("state", get_crawl_state())
+    return SiteCrawler(**kwargs)
+
+
+def run_sync(coroutine):
+    """Runs a coroutine to completion from synchronous code, even when called inside an event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # Inside a running loop: run on a separate thread with its own loop
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+def crawl_site(url: str, **kwargs) -> List[dict]:
+    """Crawls a site to completion from synchronous code, resuming an unfinished crawl of it."""
+    crawler = make_crawler(**kwargs)
+
+    async def collect() -> List[dict]:
+        return [page async for page in crawler.crawl(url)]
+
+    return run_sync(collect())
+
+
+if __name__ == "__main__":
+    # Crawl a generated local fixture site (robots.txt, nested links, 20 ms per response)
+    import tempfile
+    from functools import partial
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    class SlowHandler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(0.02)
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    root = tempfile.mkdtemp()
+    os.makedirs(os.path.join(root, "private"))
+    with open(os.path.join(root, "robots.txt"), "w") as f:
+        f.write("User-agent: *\nDisallow: /private/\n")
+    for i in range(300):
+        links = "".join(f'<li><a href="/page{j}.html#top">Page {j}</a></li>' for j in (2 * i + 1, 2 * i + 2) if j < 300)
+        html = (f"<html><head><title>Page {i}</title><script>var x = 1;</script></head><body>"
+                f"<nav><a href='/index.html'>Home</a></nav><h1>Page {i}</h1><p>Some <b>bold</b> text "
+                f"and <code>code</code>.</p><ul>{links}</ul><a href='/private/secret.html'>secret</a></body></html>")
+        with open(os.path.join(root, "index.html" if i == 0 else f"page{i}.html"), "w") as f:
+            f.write(html)
+    with open(os.path.join(root, "private", "secret.html"), "w") as f:
+        f.write("<html><body>secret</body></html>")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(SlowHandler, directory=root))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    async def run(crawler: SiteCrawler) -> List[dict]:
+        return [page async for page in crawler.crawl(base)]
+
+    for concurrency in (1, 8):
+        began = time.perf_counter()
+        pages = asyncio.run(run(SiteCrawler(max_pages=100, max_depth=10, concurrency=concurrency, per_host=concurrency)))
+        print(f"concurrency {concurrency}: {len(pages)} pages in {time.perf_counter() - began:.2f}s, "
+              f"private pages: {sum('private' in p['url'] for p in pages)}")
+
+    state = CrawlState(os.path.join(root, "crawls.sqlite"))
+    first = asyncio.run(run(SiteCrawler(max_pages=40, max_depth=10, state=state)))
+    second = asyncio.run(run(SiteCrawler(max_pages=40, max_depth=10, state=state)))
+    print(f"resumed crawl: {len(first)} + {len(second)} pages, "
+          f"{len({p['url'] for p in first} & {p['url'] for p in second})} fetched twice")
+    print()
+    print(pages[0]["markdown"])
+    server.shutdown()
@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Callable, List, Optional
+from urllib.parse import urlsplit
+
+from functions.retrieval_index import HybridIndex, get_index
+from functions.site_crawler import SiteCrawler, make_crawler, normalize_url, run_sync
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "sites"
+
+
+def site_key(site: str) -> str:
+    """The host (with a non-default port) of a URL or bare domain, e.g. "docs.python.org"."""
+    url = normalize_url(site if "://" in site else f"https://{site}")
+    if url is None:
+        raise ValueError(f"Not a website: {site}")
+    return urlsplit(url).netloc
+
+
+def site_prefix(site: str) -> str:
+    """Document ID prefix of a site's pages; each site is its own namespace in the index."""
+    return f"site:{site_key(site)}/"
+
+
+def page_doc_id(url: str) -> str:
+    parts = urlsplit(url)
+    return f"site:{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+
+class SiteIndexer:
+    """
+    Crawls websites into a HybridIndex so their content can be searched instead of re-read.
+
+    Pages are indexed as the crawler streams them, under "site:<host><path>" document IDs.
+    Each page's content hash is kept in its metadata and unchanged pages are skipped on
+    re-crawls, so only new or edited pages are chunked and embedded again. Pages that a
+    complete crawl no longer reaches are removed.
+    """
+
+    def __init__(self, index: HybridIndex, crawler_factory: Callable[..., SiteCrawler] = make_crawler):
+        self.index = index
+        self.crawler_factory = crawler_factory
+
+    async def index_site(self, url: str, **crawler_kwargs) -> dict:
+        """
+        Returns:
+            dict: The site key, counts of pages crawled, added, updated, unchanged and
+            removed, the passages indexed, the (title, url) of each page, the start
+            page's markdown as an overview, and whether an unfinished crawl was resumed.
+        """
+        crawler = self.crawler_factory(**crawler_kwargs)
+        prefix = site_prefix(url)
+        stats = {"site": site_key(url), "pages": 0, "added": 0, "updated": 0, "unchanged": 0, "removed": 0,
+                 "passages": 0, "titles": [], "overview": "", "resumed": False}
+        seen = set()
+        loop = asyncio.get_running_loop()
+        async for page in crawler.crawl(url):
+            doc_id = page_doc_id(page["url"])
+            seen.add(doc_id)
+            stats["pages"] += 1
+            stats["titles"].append((page["title"], page["url"]))
+            # A fresh crawl yields the start page (or its redirect target) first
+            if not crawler.resumed:
+                stats["overview"] = stats["overview"] or page["markdown"]
+            text = page["markdown"].strip()
+            if not text or not doc_id.startswith(prefix):
+                continue
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            meta = self.index.document_meta(doc_id)
+            if meta is not None and meta.get("hash") == digest:
+                stats["unchanged"] += 1
+                continue
+            if not text.startswith("#"):
+                text = f"# {page['title']}\n\n{text}"
+            # Chunking and embedding run off the event loop so the crawl keeps streaming
+            stats["passages"] += await loop.run_in_executor(
+                None, self.index.add_document, doc_id, text,
+                {"source": page["url"], "title": page["title"], "site": stats["site"], "hash": digest,
+                 "crawled_ts": page["fetched_ts"]},
+            )
+            stats["updated" if meta is not None else "added"] += 1
+
+        stats["resumed"] = crawler.resumed
+        if crawler.resumed:
+            # A resumed crawl continues from the old frontier; the start page was indexed by an earlier run
+            stats["overview"] = self.index.document_head(page_doc_id(normalize_url(url))) or ""
+
+        if crawler.complete:
+            for doc_id in self.index.document_ids(prefix):
+                if doc_id not in seen:
+                    self.index.delete_document(doc_id)
+                    stats["removed"] += 1
+        logger.info(f"Indexed {stats['site']}: {stats['pages']} pages, {stats['added']} added, "
+                    f"{stats['updated']} updated, {stats['unchanged']} unchanged, {stats['removed']} removed.")
+        return stats
+
+    def search(self, site: str, query: str, top_k: int = 5) -> List[dict]:
+        return self.index.search(query, top_k=top_k, doc_prefix=site_prefix(site))
+
+    def sites(self) -> List[str]:
+        return sorted({doc_id[len("site:"):].split("/", 1)[0] for doc_id in self.index.document_ids("site:")})
+
+
+_site_indexer: Optional[SiteIndexer] = None
+_site_indexer_lock = threading.Lock()
+
+
+def get_site_indexer() -> SiteIndexer:
+    global _site_indexer
+    with _site_indexer_lock:
+        if _site_indexer is None:
+            _site_indexer = SiteIndexer(get_index(INDEX_NAME))
+        return _site_indexer
+
+
+def index_site(url: str, **crawler_kwargs) -> dict:
+    """Crawls and indexes a site from synchronous code (see SiteIndexer.index_site)."""
+    return run_sync(get_site_indexer().index_site(url, **crawler_kwargs))
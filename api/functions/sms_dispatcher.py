@@ -0,0 +1,421 @@
+import os
+import re
+import json
+import time
+import uuid
+import random
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional
+
+from functions.event_bus import publish
+from functions.storage import data_path
+
+logger = logging.getLogger(__name__)
+
+E164 = re.compile(r'^\+[1-9]\d{6,14}$')
+
+# HTTP statuses worth retrying: the request was turned away before any message was created.
+# Creating a message is not idempotent, so other server errors are not retried.
+TRANSIENT_STATUSES = {429, 503}
+
+
+def normalize_phone(number: str) -> Optional[str]:
+    """Strips formatting from a phone number; returns it in E.164 form or None if it is not one."""
+    number = re.sub(r'[\s\-().]', '', number or "")
+    if number.startswith("00"):
+        number = "+" + number[2:]
+    return number if E164.match(number) else None
+
+
+class ContactStore:
+    """SQLite address book: case-insensitive name lookup, unique phone numbers and tag groups."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS contacts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    name_key TEXT NOT NULL UNIQUE,
+                    phone TEXT NOT NULL UNIQUE
+                );
+                CREATE TABLE IF NOT EXISTS contact_tags (
+                    contact_id INTEGER NOT NULL REFERENCES contacts (id) ON DELETE CASCADE,
+                    tag TEXT NOT NULL,
+                    PRIMARY KEY (tag, contact_id)
+                );
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def upsert(self, name: str, phone: str, tags: Iterable[str] = ()) -> dict:
+        """
+        Adds a contact or updates the one with the same name; raises ValueError for invalid
+        numbers and for numbers already saved under another name.
+        """
+        number = normalize_phone(phone)
+        if number is None:
+            raise ValueError(f"'{phone}' is not a valid international phone number (e.g. +447700900123).")
+        with self._connect() as conn:
+            owner = conn.execute("SELECT name FROM contacts WHERE phone = ? AND name_key != ?",
+                                 (number, name.strip().lower())).fetchone()
+            if owner is not None:
+                raise ValueError(f"{number} is already saved as {owner['name']}.")
+            try:
+                conn.execute(
+                    """INSERT INTO contacts (name, name_key, phone) VALUES (?, ?, ?)
+                       ON CONFLICT(name_key) DO UPDATE SET name = excluded.name, phone = excluded.phone""",
+                    (name.strip(), name.strip().lower(), number),
+                )
+            except sqlite3.IntegrityError:
+                # Another writer saved the number between the check and the insert
+                raise ValueError(f"{number} is already saved under another name.")
+            contact_id = conn.execute("SELECT id FROM contacts WHERE name_key = ?", (name.strip().lower(),)).fetchone()[0]
+            conn.executemany("INSERT OR IGNORE INTO contact_tags (contact_id, tag) VALUES (?, ?)",
+                             [(contact_id, tag.strip().lower()) for tag in tags if tag.strip()])
+        return self.get(name)
+
+    def get(self, name: str) -> Optional[dict]:
+        row = self._connect().execute("SELECT * FROM contacts WHERE name_key = ?", (name.strip().lower(),)).fetchone()
+        return dict(row) if row else None
+
+    def delete(self, name: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM contacts WHERE name_key = ?", (name.strip().lower(),)).rowcount > 0
+
+    def tagged(self, tag: str) -> List[dict]:
+        rows = self._connect().execute(
+            """SELECT c.* FROM contact_tags t JOIN contacts c ON c.id = t.contact_id
+               WHERE t.tag = ? ORDER BY c.name_key""",
+            (tag.strip().lower(),),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def all(self) -> List[dict]:
+        return [dict(row) for row in self._connect().execute("SELECT * FROM contacts ORDER BY name_key")]
+
+    def resolve(self, recipients: str) -> Dict[str, Optional[str]]:
+        """
+        Maps each comma-separated recipient (a contact name, "tag:<group>" or a phone number)
+        to a phone number, or to None if it cannot be resolved.
+        """
+        resolved: Dict[str, Optional[str]] = {}
+        for recipient in (r.strip() for r in recipients.split(",")):
+            if not recipient:
+                continue
+            if recipient.lower().startswith("tag:"):
+                members = self.tagged(recipient[4:])
+                if not members:
+                    resolved[recipient] = None
+                for contact in members:
+                    resolved[contact["name"]] = contact["phone"]
+                continue
+            contact = self.get(recipient)
+            resolved[recipient] = contact["phone"] if contact else normalize_phone(recipient)
+        return resolved
+
+    def import_env(self):
+        """Adds the USER1/USER2 contacts configured in the environment, as the SMS tool used to read them."""
+        for prefix, default in (("USER1", "User1"), ("USER2", "User2")):
+            phone = os.getenv(f"{prefix}_PHONE_NUMBER")
+            if phone and normalize_phone(phone) and self.get(os.getenv(f"{prefix}_NAME", default)) is None:
+                self.upsert(os.getenv(f"{prefix}_NAME", default), phone)
+
+
+class RateLimiter:
+    """Token bucket shared by all sending threads: `rate` messages per second, bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_s = (1 - self._tokens) / self.rate
+            time.sleep(wait_s)
+
+
+class SMSError(Exception):
+    """A failed send; `unknown` means the message may have been sent anyway, so it must not be retried."""
+
+    def __init__(self, message: str, transient: bool, retry_after: Optional[float] = None, unknown: bool = False):
+        super().__init__(message)
+        self.transient = transient
+        self.retry_after = retry_after
+        self.unknown = unknown
+
+
+class TwilioTransport:
+    """
+    Sends messages through the Twilio REST API over one pooled HTTP session.
+
+    The base URL is configurable (TWILIO_API_BASE) so a local fake endpoint can stand in.
+    """
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str,
+                 base_url: str = "https://api.twilio.com", pool_size: int = 8, timeout: float = 15):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.from_number = from_number
+        self.url = f"{base_url.rstrip('/')}/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.auth = (account_sid, auth_token)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def send(self, to: str, body: str) -> str:
+        """
+        Returns the message SID; raises SMSError, marked transient when a retry may succeed and
+        unknown when the request may have reached Twilio (read timeouts, dropped responses, 5xx).
+        """
+        import requests
+        from urllib3.exceptions import ProtocolError
+
+        try:
+            response = self.session.post(self.url, data={"To": to, "From": self.from_number, "Body": body},
+                                         timeout=self.timeout)
+        except requests.ConnectTimeout as e:
+            raise SMSError(f"Connection error: {e}", transient=True)
+        except requests.ConnectionError as e:
+            # A connection dropped after sending ("Connection aborted") may still have created the message
+            if e.args and isinstance(e.args[0], ProtocolError):
+                raise SMSError(f"No response: {e}", transient=False, unknown=True)
+            raise SMSError(f"Connection error: {e}", transient=True)
+        except requests.RequestException as e:
+            raise SMSError(f"No response: {e}", transient=False, unknown=True)
+        if response.status_code in (200, 201):
+            return response.json()["sid"]
+        try:
+            detail = response.json()
+            reason = f"{detail.get('code', response.status_code)}: {detail.get('message', response.text)}"
+        except ValueError:
+            reason = f"{response.status_code}: {response.text[:200]}"
+        retry_after = response.headers.get("Retry-After")
+        transient = response.status_code in TRANSIENT_STATUSES
+        raise SMSError(reason, transient=transient,
+                       retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+                       unknown=response.status_code >= 500 and not transient)
+
+
+class SMSDispatcher:
+    """
+    Queues outgoing SMS and sends them concurrently within the provider's rate limit.
+
+    Sends run on a small thread pool; every attempt first takes a token from the shared
+    RateLimiter, so concurrency hides request latency without exceeding the allowed
+    messages per second. Failures that leave no message behind (429, 503, connection
+    errors before the request was sent) are retried with exponential backoff and jitter,
+    honouring Retry-After. Failures after the request may have been sent are reported
+    with status "unknown" instead of being retried, and batches drop duplicate numbers,
+    so a blast never texts anyone twice.
+    """
+
+    def __init__(self, transport, rate: float = 1.0, burst: int = 1, max_workers: int = 4,
+                 max_retries: int = 4, backoff: float = 1.0, max_batch: int = 500):
+        self.transport = transport
+        self.limiter = RateLimiter(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_batch = max_batch
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sms")
+        self._batches: Dict[str, List[Future]] = {}
+        self._lock = threading.Lock()
+
+    def _deliver(self, to: str, body: str) -> dict:
+        for attempt in range(1, self.max_retries + 2):
+            self.limiter.acquire()
+            try:
+                return {"to": to, "status": "sent", "sid": self.transport.send(to, body), "attempts": attempt}
+            except SMSError as e:
+                if e.unknown:
+                    logger.warning(f"SMS to {to} has an unknown outcome, not retrying: {e}")
+                    return {"to": to, "status": "unknown", "error": str(e), "attempts": attempt}
+                if not e.transient or attempt > self.max_retries:
+                    logger.warning(f"SMS to {to} failed after {attempt} attempts: {e}")
+                    return {"to": to, "status": "failed", "error": str(e), "attempts": attempt}
+                delay = e.retry_after or self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                time.sleep(delay)
+
+    def send(self, to: str, body: str) -> dict:
+        """Sends one message and waits for the outcome."""
+        return self._executor.submit(self._deliver, to, body).result()
+
+    def send_batch(self, numbers: Iterable[str], body: str) -> str:
+        """Queues the message for every distinct number and returns the batch ID."""
+        distinct = list(dict.fromkeys(numbers))
+        if len(distinct) > self.max_batch:
+            raise ValueError(f"Batch of {len(distinct)} recipients exceeds the limit of {self.max_batch}.")
+        batch_id = uuid.uuid4().hex[:12]
+        futures = [self._executor.submit(self._deliver, number, body) for number in distinct]
+        with self._lock:
+            # Keep the outcome of recent batches only
+            for old_id in [b for b, fs in self._batches.items() if all(f.done() for f in fs)][:-50]:
+                del self._batches[old_id]
+            self._batches[batch_id] = futures
+        remaining = [len(futures)]
+
+        def on_done(_):
+            with self._lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                publish({"type": "sms_batch_done", **self.batch_status(batch_id)})
+
+        for future in futures:
+            future.add_done_callback(on_done)
+        return batch_id
+
+    def batch_status(self, batch_id: str) -> dict:
+        with self._lock:
+            futures = list(self._batches.get(batch_id, []))
+        results = [f.result() for f in futures if f.done()]
+        return {
+            "batch": batch_id,
+            "total": len(futures),
+            "sent": sum(1 for r in results if r["status"] == "sent"),
+            "failed": [r for r in results if r["status"] == "failed"],
+            "unknown": [r for r in results if r["status"] == "unknown"],
+            "pending": len(futures) - len(results),
+        }
+
+    def wait_batch(self, batch_id: str, timeout: Optional[float] = None) -> dict:
+        with self._lock:
+            futures = list(self._batches.get(batch_id, []))
+        wait(futures, timeout=timeout)
+        return self.batch_status(batch_id)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_contacts: Optional[ContactStore] = None
+_dispatcher: Optional[SMSDispatcher] = None
+_sms_lock = threading.Lock()
+
+
+def get_contacts() -> ContactStore:
+    global _contacts
+    with _sms_lock:
+        if _contacts is None:
+            _contacts = ContactStore(data_path("contacts.sqlite"))
+            _contacts.import_env()
+        return _contacts
+
+
+def get_sms_dispatcher() -> SMSDispatcher:
+    """Returns the process-wide dispatcher; SMS_RATE_PER_SECOND defaults to Twilio's 1 message/s per number."""
+    global _dispatcher
+    with _sms_lock:
+        if _dispatcher is None:
+            transport = TwilioTransport(os.environ["TWILIO_ACCOUNT_SID"], os.environ["TWILIO_AUTH_TOKEN"],
+                                        os.getenv("TWILIO_FROM_NUMBER", ""),
+                                        base_url=os.getenv("TWILIO_API_BASE", "https://api.twilio.com"))
+            rate = float(os.getenv("SMS_RATE_PER_SECOND", "1"))
+            _dispatcher = SMSDispatcher(transport, rate=rate, burst=max(1, int(rate)),
+                                        max_workers=int(os.getenv("SMS_MAX_WORKERS", "4")))
+        return _dispatcher
+
+
+class FakeTwilioServer:
+    """
+    Local stand-in for the Twilio Messages endpoint, for tests and dry runs.
+
+    Records every accepted message. `transient_every` makes every n-th request fail with
+    503 and numbers in `invalid` are rejected with Twilio's error 21211.
+    """
+
+    def __init__(self, latency: float = 0.0, transient_every: int = 0, invalid: Iterable[str] = ()):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs
+
+        self.messages: List[dict] = []
+        self.requests = 0
+        self.latency = latency
+        self.transient_every = transient_every
+        self.invalid = set(invalid)
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def reply(self, status: int, payload: dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8"))
+                fields = {key: values[0] for key, values in form.items()}
+                with server._lock:
+                    server.requests += 1
+                    count = server.requests
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.transient_every and count % server.transient_every == 0:
+                    return self.reply(503, {"code": 20503, "message": "Service unavailable"})
+                if fields.get("To") in server.invalid:
+                    return self.reply(400, {"code": 21211, "message": f"The 'To' number {fields.get('To')} is not valid."})
+                sid = "SM" + uuid.uuid4().hex
+                with server._lock:
+                    server.messages.append({"sid": sid, **fields})
+                self.reply(201, {"sid": sid, "status": "queued"})
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self) -> "FakeTwilioServer":
+        threading.Thread(target=self._server.serve_forever, name="fake-twilio", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    # Reminder blast to 200 numbers through the fake endpoint (50 ms per request, every
+    # 10th request fails transiently, one invalid number), at 100 messages per second
+    numbers = [f"+4477009{i:05d}" for i in range(200)]
+    with FakeTwilioServer(latency=0.05, transient_every=10, invalid=[numbers[7]]) as fake:
+        transport = TwilioTransport("AC" + "0" * 32, "token", "+15005550006", base_url=fake.base_url)
+        for workers in (1, 8):
+            fake.messages.clear()
+            dispatcher = SMSDispatcher(transport, rate=100, burst=10, max_workers=workers, backoff=0.05)
+            started = time.perf_counter()
+            status = dispatcher.wait_batch(dispatcher.send_batch(numbers + numbers[:20], "Reminder: standup at 10:00"))
+            elapsed = time.perf_counter() - started
+            print(f"{workers} worker(s): {status['sent']} sent, {len(status['failed'])} failed "
+                  f"({status['failed'][0]['error'] if status['failed'] else '-'}), "
+                  f"{len(fake.messages)} delivered in {elapsed:.2f}s")
+            dispatcher.shutdown()
@@ -0,0 +1,344 @@
+import os
+import math
+import time
+import wave
+import array
+import queue
+import logging
+import threading
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+
+try:
+    import audioop
+except ImportError:  # removed in Python 3.13
+    audioop = None
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit mono PCM
+FRAME_MS = 30
+FRAME_BYTES = SAMPLE_RATE * SAMPLE_WIDTH * FRAME_MS // 1000
+
+WAKE_WORD = os.getenv("WAKE_WORD", "jarvis")
+
+
+def frame_rms(frame: bytes) -> float:
+    """Root mean square amplitude of a 16-bit PCM frame."""
+    if audioop is not None:
+        return float(audioop.rms(frame, SAMPLE_WIDTH))
+    samples = array.array("h", frame[:len(frame) - len(frame) % 2])
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+class RingBuffer:
+    """Fixed-size byte buffer that keeps the most recent audio (e.g. the lead-in before speech)."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buffer = bytearray(capacity)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def write(self, data: bytes):
+        if len(data) >= self.capacity:
+            self._buffer[:] = data[-self.capacity:]
+            self._start, self._size = 0, self.capacity
+            return
+        end = (self._start + self._size) % self.capacity
+        first = min(len(data), self.capacity - end)
+        self._buffer[end:end + first] = data[:first]
+        self._buffer[:len(data) - first] = data[first:]
+        overflow = max(0, self._size + len(data) - self.capacity)
+        self._start = (self._start + overflow) % self.capacity
+        self._size = min(self.capacity, self._size + len(data))
+
+    def read(self) -> bytes:
+        """Returns the buffered bytes, oldest first, and empties the buffer."""
+        end = self._start + self._size
+        if end <= self.capacity:
+            data = bytes(self._buffer[self._start:end])
+        else:
+            data = bytes(self._buffer[self._start:]) + bytes(self._buffer[:end - self.capacity])
+        self._start, self._size = 0, 0
+        return data
+
+
+class EnergyVAD:
+    """
+    Energy-based voice activity detection, calibrated once against the ambient noise.
+
+    Speech starts after `start_frames` consecutive loud frames and ends after
+    `hangover_ms` of quiet; the lead-in before the trigger is kept in a ring buffer.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, multiplier: float = 2.5, min_threshold: float = 300,
+                 start_frames: int = 3, hangover_ms: int = 600, preroll_ms: int = 300, max_utterance_s: float = 15):
+        self.threshold = threshold
+        self.multiplier = multiplier
+        self.min_threshold = min_threshold
+        self.start_frames = start_frames
+        self.hangover_frames = hangover_ms // FRAME_MS
+        self.max_frames = int(max_utterance_s * 1000 // FRAME_MS)
+        self._preroll = RingBuffer(preroll_ms // FRAME_MS * FRAME_BYTES)
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._speech_frames = 0
+
+    def calibrate(self, frames: List[bytes]):
+        noise = sum(frame_rms(f) for f in frames) / max(1, len(frames))
+        self.threshold = max(self.min_threshold, noise * self.multiplier)
+        logger.info(f"VAD calibrated: noise {noise:.0f}, threshold {self.threshold:.0f}.")
+
+    def process(self, frame: bytes) -> Tuple[Optional[str], bytes]:
+        """
+        Feeds one frame.
+
+        Returns:
+            Tuple[Optional[str], bytes]: ("start", lead-in audio including this frame),
+            ("speech", frame), ("end", frame) for the last frame of an utterance, or (None, b"")
+            outside speech.
+        """
+        voiced = frame_rms(frame) >= (self.threshold or self.min_threshold)
+        if not self._speech_frames:
+            self._voiced_run = self._voiced_run + 1 if voiced else 0
+            self._preroll.write(frame)
+            if self._voiced_run < self.start_frames:
+                return None, b""
+            self._speech_frames, self._silent_run = 1, 0
+            return "start", self._preroll.read()
+
+        self._speech_frames += 1
+        self._silent_run = 0 if voiced else self._silent_run + 1
+        if self._silent_run >= self.hangover_frames or self._speech_frames >= self.max_frames:
+            self._speech_frames, self._voiced_run = 0, 0
+            return "end", frame
+        return "speech", frame
+
+
+class FakeRecognizer:
+    """Returns scripted transcripts, one per utterance, for tests."""
+
+    def __init__(self, transcripts: List[str]):
+        self.transcripts = list(transcripts)
+        self.received: List[int] = []
+        self._bytes = 0
+
+    def start(self):
+        self._bytes = 0
+
+    def accept(self, chunk: bytes):
+        self._bytes += len(chunk)
+
+    def finish(self) -> str:
+        self.received.append(self._bytes)
+        return self.transcripts.pop(0) if self.transcripts else ""
+
+
+class GoogleRecognizer:
+    """Buffers the utterance's chunks and sends them to the Google Web Speech API once it ends."""
+
+    def __init__(self, language: str = "en-GB"):
+        import speech_recognition as sr
+
+        self.language = language
+        self._recognizer = sr.Recognizer()
+        self._chunks: List[bytes] = []
+
+    def start(self):
+        self._chunks = []
+
+    def accept(self, chunk: bytes):
+        self._chunks.append(chunk)
+
+    def finish(self) -> str:
+        import speech_recognition as sr
+
+        audio = sr.AudioData(b"".join(self._chunks), SAMPLE_RATE, SAMPLE_WIDTH)
+        try:
+            return self._recognizer.recognize_google(audio, language=self.language)
+        except sr.UnknownValueError:
+            return ""
+
+
+class VoskRecognizer:
+    """Fully local streaming recognition with a Vosk model (VOSK_MODEL_PATH)."""
+
+    def __init__(self, model_path: str = os.getenv("VOSK_MODEL_PATH", "")):
+        from vosk import Model, KaldiRecognizer
+
+        self._model = Model(model_path)
+        self._factory = lambda: KaldiRecognizer(self._model, SAMPLE_RATE)
+        self._recognizer = None
+
+    def start(self):
+        self._recognizer = self._factory()
+
+    def accept(self, chunk: bytes):
+        self._recognizer.AcceptWaveform(chunk)
+
+    def finish(self) -> str:
+        import json
+        return json.loads(self._recognizer.FinalResult()).get("text", "")
+
+
+def wav_frames(path: str, realtime: bool = False) -> Iterator[bytes]:
+    """Reads a WAV file as 16 kHz mono 16-bit frames, converting other formats."""
+    with wave.open(path, "rb") as wav:
+        data = wav.readframes(wav.getnframes())
+        width, channels, rate = wav.getsampwidth(), wav.getnchannels(), wav.getframerate()
+    if (width, channels, rate) != (SAMPLE_WIDTH, 1, SAMPLE_RATE) and audioop is None:
+        raise ValueError(f"{path} must be 16 kHz mono 16-bit PCM")
+    if width != SAMPLE_WIDTH:
+        data = audioop.lin2lin(data, width, SAMPLE_WIDTH)
+    if channels == 2:
+        data = audioop.tomono(data, SAMPLE_WIDTH, 0.5, 0.5)
+    if rate != SAMPLE_RATE:
+        data, _ = audioop.ratecv(data, SAMPLE_WIDTH, 1, rate, SAMPLE_RATE, None)
+    for offset in range(0, len(data) - FRAME_BYTES + 1, FRAME_BYTES):
+        if realtime:
+            time.sleep(FRAME_MS / 1000)
+        yield data[offset:offset + FRAME_BYTES]
+
+
+def microphone_frames() -> Iterator[bytes]:
+    """Streams frames from the default microphone until the consumer stops iterating."""
+    import speech_recognition as sr
+
+    with sr.Microphone(sample_rate=SAMPLE_RATE, chunk_size=FRAME_BYTES // SAMPLE_WIDTH) as source:
+        while True:
+            yield source.stream.read(FRAME_BYTES // SAMPLE_WIDTH)
+
+
+class SpeechPipeline:
+    """
+    Continuous listening: frames → VAD → recognizer → wake word → on_command.
+
+    The VAD is calibrated once from the first `calibration_ms` of audio. Each utterance is
+    streamed into the recognizer as its frames arrive, so a streaming recognizer has the
+    transcript ready as soon as speech ends. An utterance that starts with the wake word
+    is a command (the rest of it, or the next utterance if nothing follows).
+    """
+
+    def __init__(self, frames: Iterator[bytes], recognizer, on_command: Callable[[str], None],
+                 wake_word: Optional[str] = WAKE_WORD, vad: Optional[EnergyVAD] = None,
+                 calibration_ms: int = 500, follow_up_s: float = 8.0,
+                 on_error: Optional[Callable[[Exception], None]] = None):
+        self.frames = frames
+        self.recognizer = recognizer
+        self.on_command = on_command
+        self.on_error = on_error
+        self.error: Optional[Exception] = None
+        self.wake_word = wake_word.lower() if wake_word else None
+        self.vad = vad or EnergyVAD()
+        self.calibration_frames = calibration_ms // FRAME_MS
+        self.follow_up_s = follow_up_s
+        self._armed_until = 0.0
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def handle_transcript(self, text: str):
+        text = text.strip()
+        if not text:
+            return
+        if self.wake_word is None:
+            self.on_command(text)
+            return
+        lowered = text.lower()
+        index = lowered.find(self.wake_word)
+        if index >= 0:
+            command = text[index + len(self.wake_word):].strip(" ,.!?")
+            if command:
+                self.on_command(command)
+            else:
+                # Wake word on its own: the next utterance is the command
+                self._armed_until = time.monotonic() + self.follow_up_s
+        elif time.monotonic() < self._armed_until:
+            self._armed_until = 0.0
+            self.on_command(text)
+
+    def run(self):
+        """Processes frames until stopped; a failure of the stream, VAD or recognizer ends the run."""
+        try:
+            self._process()
+        except Exception as e:
+            logger.exception(f"Speech pipeline stopped: {e}")
+            self.error = e
+            if self.on_error is not None:
+                self.on_error(e)
+
+    @property
+    def alive(self) -> bool:
+        return self.error is None and self._thread is not None and self._thread.is_alive()
+
+    def _process(self):
+        calibration: List[bytes] = []
+        for frame in self.frames:
+            if self._stopped.is_set():
+                break
+            if self.vad.threshold is None and len(calibration) < self.calibration_frames:
+                calibration.append(frame)
+                if len(calibration) == self.calibration_frames:
+                    self.vad.calibrate(calibration)
+                continue
+
+            event, chunk = self.vad.process(frame)
+            if event == "start":
+                self.recognizer.start()
+            if event is not None:
+                # Stream audio into the recognizer while the user is still speaking
+                self.recognizer.accept(chunk)
+            if event == "end":
+                try:
+                    self.handle_transcript(self.recognizer.finish())
+                except Exception as e:
+                    logger.error(f"Speech recognition failed: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="speech-pipeline", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+
+def make_recognizer():
+    """Chooses the recognizer from SPEECH_RECOGNIZER ("vosk" or "google", the default)."""
+    if os.getenv("SPEECH_RECOGNIZER") == "vosk":
+        return VoskRecognizer()
+    return GoogleRecognizer()
+
+
+_commands: "queue.Queue[Union[str, Exception]]" = queue.Queue()
+_pipeline: Optional[SpeechPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def listen_for_command(timeout: Optional[float] = None) -> Optional[str]:
+    """
+    Returns the next spoken command, or None on timeout.
+
+    The first call starts one process-wide pipeline on the microphone, so calibration and
+    the microphone stream are set up once and commands queue up between calls. If the
+    pipeline fails (e.g. the microphone disappears) the waiting call raises RuntimeError,
+    and the next call starts a new pipeline.
+    """
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None or not _pipeline.alive:
+            if _pipeline is not None:
+                logger.info("Restarting the speech pipeline.")
+            _pipeline = SpeechPipeline(microphone_frames(), make_recognizer(), _commands.put, on_error=_commands.put)
+            _pipeline.start()
+    try:
+        command = _commands.get(timeout=timeout)
+    except queue.Empty:
+        return None
+    if isinstance(command, Exception):
+        raise RuntimeError(f"Speech pipeline stopped: {command}") from command
+    return command
@@ -0,0 +1,21 @@
+import os
+
+# Local state (indexes, caches, stores) lives next to the project in api/data,
+# unless PG_COPILOT_DATA_DIR points somewhere else.
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("PG_COPILOT_DATA_DIR", os.path.join(API_DIR, "data"))
+
+
+def data_path(*parts: str) -> str:
+    """
+    Returns a path inside the local data directory, creating its parent directory.
+
+    Args:
+        *parts (str): Path components relative to the data directory.
+
+    Returns:
+        str: The absolute path.
+    """
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+from functions.event_bus import publish
+from functions.storage import API_DIR, data_path
+
+logger = logging.getLogger(__name__)
+
+# Legacy task list, imported into the store while the store is still empty
+LEGACY_TASKS_PATH = os.path.join(API_DIR, 'tasks.json')
+
+# The "tasks" core memory block holds at most this many tasks / characters
+PROJECTION_TASKS = 10
+PROJECTION_CHARS = 1500
+
+# Pending tasks are served highest priority first, then earliest due date, then oldest
+NEXT_ORDER = "priority DESC, due_ts IS NULL, due_ts, id"
+
+
+def parse_due(due: Optional[str]) -> Optional[float]:
+    """Converts an ISO 8601 date or datetime (local time if no offset) to a timestamp."""
+    if not due:
+        return None
+    return datetime.fromisoformat(due.replace("Z", "+00:00")).timestamp()
+
+
+class TaskStore:
+    """
+    SQLite task queue with priorities and due dates.
+
+    Push is a single insert and pop reads the head of the (status, priority, due) index,
+    so neither depends on the number of queued tasks. Every change is published on the
+    event bus as a "tasks_changed" event.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    description TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    due_ts REAL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    created_ts REAL NOT NULL,
+                    completed_ts REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_tasks_next ON tasks (status, priority DESC, due_ts IS NULL, due_ts, id);
+                CREATE INDEX IF NOT EXISTS idx_tasks_due ON tasks (status, due_ts);
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        task = dict(row)
+        task["due"] = datetime.fromtimestamp(task["due_ts"]).isoformat(timespec="minutes") if task["due_ts"] else None
+        return task
+
+    def _get(self, conn: sqlite3.Connection, task_id: int) -> Optional[dict]:
+        row = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def _notify(self, action: str, task: Optional[dict]):
+        publish({"type": "tasks_changed", "action": action, "task": task})
+
+    def push(self, description: str, priority: int = 0, due: Optional[str] = None) -> dict:
+        """Adds a pending task and returns it."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO tasks (description, priority, due_ts, created_ts) VALUES (?, ?, ?, ?)",
+                (description, priority, parse_due(due), time.time()),
+            )
+            task = self._get(conn, cursor.lastrowid)
+        self._notify("pushed", task)
+        return task
+
+    def pop(self) -> Optional[dict]:
+        """Marks the next pending task as done and returns it, or None if the queue is empty."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(f"SELECT id FROM tasks WHERE status = 'pending' ORDER BY {NEXT_ORDER} LIMIT 1").fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE tasks SET status = 'done', completed_ts = ? WHERE id = ?", (time.time(), row["id"]))
+            task = self._get(conn, row["id"])
+        self._notify("popped", task)
+        return task
+
+    def get(self, task_id: int) -> Optional[dict]:
+        return self._get(self._connect(), task_id)
+
+    def peek(self) -> Optional[dict]:
+        row = self._connect().execute(
+            f"SELECT * FROM tasks WHERE status = 'pending' ORDER BY {NEXT_ORDER} LIMIT 1"
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def complete(self, task_id: int) -> Optional[dict]:
+        with self._connect() as conn:
+            conn.execute("UPDATE tasks SET status = 'done', completed_ts = ? WHERE id = ? AND status = 'pending'",
+                         (time.time(), task_id))
+            task = self._get(conn, task_id)
+        if task is not None:
+            self._notify("completed", task)
+        return task
+
+    def delete(self, task_id: int) -> bool:
+        with self._connect() as conn:
+            deleted = conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,)).rowcount > 0
+        if deleted:
+            self._notify("deleted", {"id": task_id})
+        return deleted
+
+    def pending(self, limit: Optional[int] = None) -> List[dict]:
+        """Pending tasks in queue order."""
+        rows = self._connect().execute(
+            f"SELECT * FROM tasks WHERE status = 'pending' ORDER BY {NEXT_ORDER} LIMIT ?",
+            (-1 if limit is None else limit,),
+        ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def due_before(self, before: float) -> List[dict]:
+        """Pending tasks due before the given timestamp, earliest first."""
+        rows = self._connect().execute(
+            "SELECT * FROM tasks WHERE status = 'pending' AND due_ts < ? ORDER BY due_ts", (before,)
+        ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM tasks WHERE status = 'pending'").fetchone()[0]
+
+    def projection(self, max_tasks: int = PROJECTION_TASKS, max_chars: int = PROJECTION_CHARS) -> str:
+        """
+        Compact text view of the queue head for the "tasks" core memory block.
+
+        Returns:
+            str: One line per task ("#id [p<priority>, due <date>] description") plus a
+            count of the tasks left out, kept under max_chars.
+        """
+        total = self.count()
+        if total == 0:
+            return "No pending tasks."
+        lines = []
+        used = 0
+        for task in self.pending(limit=max_tasks):
+            tags = [f"p{task['priority']}"] + ([f"due {task['due']}"] if task["due"] else [])
+            line = f"#{task['id']} [{', '.join(tags)}] {task['description']}"
+            if len(line) > 200:
+                line = line[:197] + "..."
+            if used + len(line) + 40 > max_chars:
+                break
+            lines.append(line)
+            used += len(line) + 1
+        if total > len(lines):
+            lines.append(f"(+{total - len(lines)} more pending tasks)")
+        return "\n".join(lines)
+
+    def seed(self, descriptions: List[str]) -> int:
+        """
+        Adds initial tasks to a store that has never held any tasks, so building the agent
+        again does not queue them twice.
+
+        Returns:
+            int: The number of added tasks.
+        """
+        if not descriptions or self._connect().execute("SELECT 1 FROM tasks LIMIT 1").fetchone():
+            return 0
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany("INSERT INTO tasks (description, created_ts) VALUES (?, ?)",
+                             [(description, now) for description in descriptions])
+        return len(descriptions)
+
+    def import_legacy(self, path: str = LEGACY_TASKS_PATH) -> int:
+        """
+        Imports a legacy tasks.json list (strings) into a store that has never held any tasks.
+
+        Returns:
+            int: The number of imported tasks.
+        """
+        if not os.path.exists(path) or self._connect().execute("SELECT 1 FROM tasks LIMIT 1").fetchone():
+            return 0
+        try:
+            with open(path, 'r') as f:
+                tasks = json.load(f)
+        except json.JSONDecodeError:
+            logger.warning(f"{path} is corrupted, skipping task import.")
+            return 0
+        if not isinstance(tasks, list):
+            tasks = [tasks]
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany("INSERT INTO tasks (description, created_ts) VALUES (?, ?)",
+                             [(str(task), now) for task in tasks])
+        logger.info(f"Imported {len(tasks)} tasks from {path}.")
+        return len(tasks)
+
+
+_task_store: Optional[TaskStore] = None
+_task_store_lock = threading.Lock()
+
+
+def get_task_store() -> TaskStore:
+    """Returns the process-wide task store, importing the legacy tasks.json on first use."""
+    global _task_store
+    with _task_store_lock:
+        if _task_store is None:
+            _task_store = TaskStore(data_path("tasks.sqlite"))
+            _task_store.import_legacy()
+        return _task_store
@@ -13,7 +13,8 @@ EMAIL: str = os.getenv("USER_EMAIL", "")
 PASSWORD: str = os.getenv("USER_PASSWORD", "")
 SMTP_SERVER: str = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 PORT: int = int(os.getenv("SMTP_PORT", "587"))
-RECIPIENTS: List[str] = os.getenv("EMAIL_RECIPIENTS", "").split(",")
+RECIPIENTS: List[str] = [r.strip() for r in os.getenv("EMAIL_RECIPIENTS", "").split(",") if r.strip()]
+USE_TLS: bool = os.getenv("SMTP_USE_TLS", "true").lower() != "false"
 
 class FeedEntry(BaseModel):
     title: str
@@ -24,73 +25,51 @@ class FeedEntry(BaseModel):
 
 def fetch_rss_feeds() -> List[FeedEntry]:
     """
-    Fetches and parses RSS feeds from the defined URLs.
+    Refreshes the configured RSS feeds and returns the newest entries from the local feed store.
+
+    Feeds are fetched concurrently with conditional requests, so unchanged feeds are skipped.
 
     Returns:
-        List[FeedEntry]: A list of parsed entries from the RSS feeds.
+        List[FeedEntry]: Up to 10 of the newest entries per feed, newest first.
     """
-    import time
-    import feedparser
+    from functions.feed_store import get_feed_fetcher
     print("Fetching RSS feeds...")
-    all_entries: List[FeedEntry] = []
 
-    # List of RSS Feeds
-    RSS_FEEDS: List[str] = [
-        "https://krebsonsecurity.com/feed/",
-        "https://feeds.feedburner.com/TheHackersNews",
-        "https://feeds.feedburner.com/exploit-db/jAi05Ol6OmB"
-    ]
+    fetcher = get_feed_fetcher()
+    for result in fetcher.fetch_all():
+        if result.get("error"):
+            print(f"Error fetching feed {result['url']}: {result['error']}")
+        else:
+            print(f"Fetched {result['url']}: status {result['status']}, {result['new']} new entries")
 
-    for feed_url in RSS_FEEDS:
-        try:
-            print(f"Parsing feed: {feed_url}")
-            feed = feedparser.parse(feed_url)
-            if 'entries' in feed:
-                # Sort entries by date (if available) and limit to top 10
-                sorted_entries = sorted(
-                    feed.entries,
-                    key=lambda x: x.get('published_parsed', time.gmtime()),
-                    reverse=True
-                )[:10]
-                # Convert entries to FeedEntry models
-                feed_entries = [FeedEntry(**entry) for entry in sorted_entries]
-                all_entries.extend(feed_entries)
-                print(f"Fetched and sorted {len(feed_entries)} entries from {feed_url}")
-            else:
-                print(f"No entries found in feed: {feed_url}")
-        except Exception as e:
-            print(f"Error fetching feed {feed_url}: {str(e)}")
-
-    return all_entries
+    return [
+        FeedEntry(title=row["title"], link=row["link"] or "", published=row["published"], summary=row["summary"])
+        for row in fetcher.store.recent(per_feed=10)
+    ]
 
 def filter_important_entries(entries: List[FeedEntry]) -> List[FeedEntry]:
     """
-    Filters RSS feed entries based on the defined important keywords.
+    Ranks RSS feed entries by importance and keeps the top 10.
+
+    Keywords are matched in titles and summaries in one pass, weighted, decayed by the
+    entry's age, and the same story reported by several feeds is kept only once.
 
     Args:
         entries (List[FeedEntry]): A list of parsed RSS entries.
 
     Returns:
-        List[FeedEntry]: A list of entries that contain important keywords, limited to top 10.
+        List[FeedEntry]: The 10 most important entries, most important first.
     """
-    # Define keywords to rank importance
-    IMPORTANT_KEYWORDS: List[str] = [
-        'exploit', 'ransomware', 'breach', 'zero-day',
-        'vulnerability', 'bug', 'hacker', 'cyber', 'attack'
-    ]
+    from functions.entry_ranking import get_ranker
 
     print("Filtering important entries...")
-    important_entries: List[FeedEntry] = []
-
-    for entry in entries:
-        if any(keyword.lower() in (entry.title.lower() or '') for keyword in IMPORTANT_KEYWORDS):
-            important_entries.append(entry)
+    important_entries: List[FeedEntry] = [entry for _, entry in get_ranker().rank(entries, limit=10)]
 
     if not important_entries:
         print("No entries matched the importance criteria, using default entries")
         return entries[:10]
 
-    return important_entries[:10]
+    return important_entries
 
 def create_newsletter_content(entries: List[FeedEntry]) -> str:
     """
@@ -102,16 +81,9 @@ def create_newsletter_content(entries: List[FeedEntry]) -> str:
     Returns:
         str: The HTML content of the newsletter.
     """
+    from functions.newsletter_delivery import render_html
     print(f"Creating newsletter content from {len(entries)} entries...")
-
-    newsletter_content = "<h1>Daily Security News</h1><ul>"
-    for entry in entries:
-        try:
-            newsletter_content += f'<li><a href="{entry.link}">{entry.title}</a> - {entry.published or "Unknown date"}</li>'
-        except Exception as e:
-            print(f"Error while processing entry: {e}")
-    newsletter_content += "</ul>"
-    return newsletter_content
+    return render_html(entries)
 
 def fetch_security_newsletter(self) -> str:
     """
@@ -125,5 +97,26 @@ def fetch_security_newsletter(self) -> str:
     newsletter_content = create_newsletter_content(filtered_entries)
     return newsletter_content
 
-# Fetch the newsletter content
-# print(fetch_security_newsletter())
+def send_security_newsletter(recipients: Optional[List[str]] = None) -> dict:
+    """
+    Builds today's newsletter and emails it to the recipients over one SMTP connection.
+
+    Args:
+        recipients (List[str]): Addresses to send to; defaults to EMAIL_RECIPIENTS.
+
+    Returns:
+        dict: The delivery result (accepted and refused recipients, transactions sent).
+    """
+    from functions.newsletter_delivery import SMTPMailer, build_message, render_html, render_text
+
+    recipients = RECIPIENTS if recipients is None else recipients
+    if not recipients:
+        print("No newsletter recipients configured, skipping delivery")
+        return {"accepted": 0, "transactions": 0, "refused": {}}
+
+    entries = filter_important_entries(fetch_rss_feeds())
+    subject = f"Daily Security News - {datetime.date.today():%d %b %Y}"
+    message = build_message(subject, EMAIL, render_html(entries), render_text(entries))
+    mailer = SMTPMailer(SMTP_SERVER, PORT, EMAIL, PASSWORD, use_tls=USE_TLS,
+                        batch_size=int(os.getenv("SMTP_BATCH_SIZE", "100")))
+    return mailer.send(message, recipients)
@@ -0,0 +1,227 @@
+import os
+import re
+import uuid
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from functions.event_bus import publish
+from functions.storage import data_path
+from functions.tts_normalizer import sanitize_for_tts
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VOICE = os.getenv("TTS_VOICE_ID", "cmiele1eY3uGFqJdZTKJ")
+DEFAULT_MODEL = os.getenv("TTS_MODEL", "eleven_multilingual_v2")
+
+# Sentences shorter than this are merged into the next one to avoid many tiny requests
+MIN_SENTENCE_CHARS = 20
+MAX_SENTENCE_CHARS = 400
+
+SENTENCE_END = re.compile(r'(?<=[.!?。！？])\s+|(?<=[。！？])|\n{2,}')
+CLIP_ID = re.compile(r'^[0-9a-f]{64}$')
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Splits text into sentence-sized pieces for synthesis.
+
+    Short sentences are merged with the following one and overly long ones are cut
+    at the last space before MAX_SENTENCE_CHARS.
+    """
+    pieces, pending = [], ""
+    for sentence in SENTENCE_END.split(text):
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            continue
+        pending = f"{pending} {sentence}" if pending else sentence
+        while len(pending) > MAX_SENTENCE_CHARS:
+            cut = pending.rfind(" ", 0, MAX_SENTENCE_CHARS)
+            cut = cut if cut > 0 else MAX_SENTENCE_CHARS
+            pieces.append(pending[:cut].strip())
+            pending = pending[cut:].strip()
+        if len(pending) >= MIN_SENTENCE_CHARS:
+            pieces.append(pending)
+            pending = ""
+    if pending:
+        if pieces and len(pieces[-1]) + len(pending) < MAX_SENTENCE_CHARS:
+            pieces[-1] = f"{pieces[-1]} {pending}"
+        else:
+            pieces.append(pending)
+    return pieces
+
+
+class ElevenLabsBackend:
+    """Synthesizes speech with one shared ElevenLabs client."""
+
+    def __init__(self, api_key: Optional[str] = None, model: str = DEFAULT_MODEL):
+        self.api_key = api_key or os.getenv("ELEVENLABS_API_KEY")
+        self.model = model
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        from elevenlabs.client import ElevenLabs
+
+        with self._lock:
+            if self._client is None:
+                if not self.api_key:
+                    raise RuntimeError("ELEVENLABS_API_KEY is missing from the environment variables.")
+                self._client = ElevenLabs(api_key=self.api_key)
+            return self._client
+
+    def synthesize(self, text: str, voice_id: str) -> bytes:
+        from elevenlabs import Voice, VoiceSettings
+
+        voice = Voice(
+            voice_id=voice_id,
+            settings=VoiceSettings(stability=0.66, similarity_boost=1, use_sayer_boost=True),
+        )
+        audio = self._get_client().generate(text=text, voice=voice, model=self.model)
+        return audio if isinstance(audio, bytes) else b"".join(audio)
+
+
+class FakeTTSBackend:
+    """Deterministic stand-in that returns the text as bytes, optionally after a delay."""
+
+    model = "fake"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    def synthesize(self, text: str, voice_id: str) -> bytes:
+        import time
+
+        with self._lock:
+            self.calls.append((text, voice_id))
+        if self.delay:
+            time.sleep(self.delay)
+        return f"FAKE[{voice_id}]:{text}\n".encode("utf-8")
+
+
+class AudioCache:
+    """Synthesized clips on disk, addressed by the hash of model, voice and text."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(text: str, voice_id: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\0{voice_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def path(self, clip_id: str) -> str:
+        return os.path.join(self.directory, clip_id[:2], f"{clip_id}.mp3")
+
+    def get(self, clip_id: str) -> Optional[str]:
+        path = self.path(clip_id)
+        return path if os.path.exists(path) else None
+
+    def put(self, clip_id: str, audio: bytes) -> str:
+        path = self.path(clip_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".clip.", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return path
+
+
+class TTSService:
+    """
+    Sentence-level text-to-speech with a disk cache and concurrent synthesis.
+
+    Each sentence becomes a clip whose ID is its cache key, so repeated phrases are only
+    synthesized once and concurrent requests for the same clip share one backend call.
+    """
+
+    def __init__(self, backend, cache: AudioCache, max_workers: int = 4, voice_id: str = DEFAULT_VOICE):
+        self.backend = backend
+        self.cache = cache
+        self.voice_id = voice_id
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _synthesize(self, clip_id: str, text: str, voice_id: str) -> str:
+        try:
+            return self.cache.put(clip_id, self.backend.synthesize(text, voice_id))
+        finally:
+            with self._lock:
+                self._in_flight.pop(clip_id, None)
+
+    def clip(self, text: str, voice_id: Optional[str] = None) -> Tuple[str, Future]:
+        """Returns the clip ID for one sentence and a future resolving to its file path."""
+        voice_id = voice_id or self.voice_id
+        clip_id = self.cache.key(text, voice_id, getattr(self.backend, "model", ""))
+        path = self.cache.get(clip_id)
+        if path is not None:
+            done: Future = Future()
+            done.set_result(path)
+            return clip_id, done
+        with self._lock:
+            future = self._in_flight.get(clip_id)
+            if future is None:
+                future = self._executor.submit(self._synthesize, clip_id, text, voice_id)
+                self._in_flight[clip_id] = future
+        return clip_id, future
+
+    def stream(self, text: str, voice_id: Optional[str] = None) -> Iterator[Tuple[int, str, str]]:
+        """
+        Synthesizes all sentences concurrently and yields (index, clip_id, path) in order,
+        each as soon as it and every earlier sentence are ready.
+        """
+        clips = [self.clip(sentence, voice_id) for sentence in split_sentences(sanitize_for_tts(text))]
+        for index, (clip_id, future) in enumerate(clips):
+            yield index, clip_id, future.result()
+
+    def speak(self, text: str, voice_id: Optional[str] = None) -> dict:
+        """
+        Synthesizes a reply and announces each clip on the event bus ("tts_chunk") as it is ready.
+
+        Returns:
+            dict: The utterance ID and its clips in playback order.
+        """
+        utterance_id = uuid.uuid4().hex
+        clips = []
+        for index, clip_id, _ in self.stream(text, voice_id):
+            clip = {"index": index, "id": clip_id, "url": f"/api/tts/audio/{clip_id}"}
+            clips.append(clip)
+            publish({"type": "tts_chunk", "utterance": utterance_id, **clip})
+        publish({"type": "tts_done", "utterance": utterance_id, "clips": len(clips)})
+        return {"utterance": utterance_id, "clips": clips}
+
+    def audio_path(self, clip_id: str) -> Optional[str]:
+        if not CLIP_ID.match(clip_id):
+            return None
+        return self.cache.get(clip_id)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_tts_service: Optional[TTSService] = None
+_tts_service_lock = threading.Lock()
+
+
+def get_tts_service() -> TTSService:
+    """Returns the process-wide TTS service; TTS_BACKEND=fake selects the fake backend."""
+    global _tts_service
+    with _tts_service_lock:
+        if _tts_service is None:
+            backend = FakeTTSBackend() if os.getenv("TTS_BACKEND") == "fake" else ElevenLabsBackend()
+            _tts_service = TTSService(backend, AudioCache(data_path("tts")),
+                                      max_workers=int(os.getenv("TTS_MAX_WORKERS", "4")))
+        return _tts_service
@@ -1,45 +1,70 @@
 def analyse_website(self, url: str) -> str:
     """
-    Crawls and analyses a given website address
+    Crawls a website and stores its pages in the local search index. Use search_website
+    afterwards to look up specific information on the site.
 
     Args:
         url (str): The url to analyse
 
     Returns:
-        str: The content of the website.
+        str: A summary of the crawl, the pages found and an overview of the start page.
     """
-    import traceback
     import os
-    from firecrawl import FirecrawlApp
-    from dotenv import load_dotenv
-
-    load_dotenv()
+    import traceback
+    from functions.site_index import index_site
 
-    app = FirecrawlApp(api_key=os.getenv("FIRECRAWL_API_KEY"))
+    # Characters of the start page returned as an overview; the rest stays in the index
+    overview_chars = int(os.getenv("CRAWL_OVERVIEW_CHARS", "1500"))
 
     try:
-        # Use a different variable name to avoid confusion
-        response = app.crawl_url(
-            url,
-            params={
-                'limit': 50,  # Number of pages to crawl
-                'scrapeOptions': {'formats': ['markdown']}  # Format to return
-            },
-            poll_interval=30
+        stats = index_site(url)
+        if not stats["pages"]:
+            return f"No pages could be crawled from {url}."
+
+        pages = "\n".join(f"- {title}: {page_url}" for title, page_url in stats["titles"][:30])
+        if len(stats["titles"]) > 30:
+            pages += f"\n- ... and {len(stats['titles']) - 30} more"
+        resumed = ("This continued an earlier crawl of the site that stopped at its page budget, "
+                   "so the pages below are the ones not crawled before. ") if stats["resumed"] else ""
+        return (
+            f"Crawled {stats['pages']} pages from {stats['site']} ({stats['added']} new, {stats['updated']} updated, "
+            f"{stats['unchanged']} unchanged, {stats['removed']} removed). {resumed}"
+            f"Use search_website with site=\"{stats['site']}\" to search its content.\n\n"
+            f"Pages:\n{pages}\n\nOverview:\n{stats['overview'][:overview_chars]}"
         )
-        
-        # Print the full response for debugging purposes
-        #print(response)
-        
-        # Extract the markdown data
-        website_contents = response['data'][0]['markdown']
-        
-        # Return the extracted markdown content
-        return website_contents
 
     except Exception as e:
         traceback.print_exc()
         return f"Message failed to crawl with error: {str(e)}"
 
+
+def search_website(self, site: str, query: str, top_k: int = 5) -> str:
+    """
+    Searches the pages of a website previously crawled with analyse_website.
+
+    Args:
+        site (str): The website's domain or any URL on it (e.g. "docs.python.org").
+        query (str): What to look for.
+        top_k (int): Maximum number of passages to return.
+
+    Returns:
+        str: The most relevant passages with their page URLs, or a message if nothing matched.
+    """
+    from functions.site_index import get_site_indexer
+
+    indexer = get_site_indexer()
+    try:
+        hits = indexer.search(site, query, top_k=top_k)
+    except ValueError as e:
+        return str(e)
+    if not hits:
+        sites = ", ".join(indexer.sites()) or "none"
+        return f"No matching passages found on {site}. Crawled sites: {sites}."
+
+    results = []
+    for i, hit in enumerate(hits, start=1):
+        results.append(f"[{i}] {hit['meta'].get('title', '')} ({hit['meta'].get('source', hit['doc_id'])})\n{hit['text']}")
+    return "\n\n".join(results)
+
 # Example usage
-# print(analyse_website(url="https://firecrawl.dev"))
\ No newline at end of file
+# print(analyse_website(None, url="https://firecrawl.dev"))
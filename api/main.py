@@ -13,15 +13,13 @@ from fastapi import (
 )
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse, JSONResponse
+from fastapi.responses import FileResponse, RedirectResponse, JSONResponse, StreamingResponse
 from letta import create_client
 # from utils import say
 import uvicorn
 from dotenv import load_dotenv
 import io
 from PyPDF2 import PdfReader
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import os
 import pytz
@@ -30,13 +28,30 @@ from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 from pydantic import BaseModel, HttpUrl
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.jobstores.memory import MemoryJobStore
 import asyncio
+import threading
+import time
 from starlette.websockets import WebSocket
 from starlette.types import Scope
 import ast
 
 from create_agent import TaskMemory
+from functions.storage import data_path
+from functions.retrieval_index import get_index
+from functions.sandbox_pool import get_pool
+from functions.event_bus import subscribe, publish
+from functions.calendar_service import get_calendar
+from functions.calendar_store import get_calendar_sync
+from functions.feed_store import get_feed_fetcher
+from functions.threat_newsletter import send_security_newsletter
+from functions.task_store import get_task_store
+from functions.deadline_scheduler import get_deadline_scheduler
+from functions.tts_service import get_tts_service
+from functions.image_service import get_image_service
+from functions.speech_pipeline import listen_for_command
 
 # Function to extract cookies manually (if needed)
 def get_cookie(scope: Scope, key: str):
@@ -68,8 +83,17 @@ logger = logging.getLogger(__name__)
 # Initialize FastAPI app
 app = FastAPI()
 
-# Initialize the scheduler
-scheduler = BackgroundScheduler(timezone="Asia/Hong_Kong")
+# Initialize the scheduler. Jobs persist in SQLite so restarts (and --reload) keep dynamically
+# added jobs; missed runs are coalesced into one and still run if less than 5 minutes late.
+scheduler = AsyncIOScheduler(
+    jobstores={
+        "default": SQLAlchemyJobStore(url=f"sqlite:///{data_path('jobs.sqlite')}"),
+        "memory": MemoryJobStore(),
+    },
+    job_defaults={"coalesce": True, "misfire_grace_time": int(os.getenv("SCHEDULER_MISFIRE_GRACE", "300")),
+                  "max_instances": 1},
+    timezone="Asia/Hong_Kong",
+)
 
 # Add CORS Middleware
 app.add_middleware(
@@ -201,7 +225,8 @@ async def websocket_endpoint(websocket: WebSocket):
 
                 if command:
 
-                    response = client.user_message(agent_id=agent_state.id, message=command)
+                    # Run the agent step off the event loop so tool output can be streamed meanwhile
+                    response = await asyncio.to_thread(client.user_message, agent_id=agent_state.id, message=command)
                     print(f"Response from agent: {response}")
 
                     # Loop through all the messages in the response
@@ -288,6 +313,27 @@ async def broadcast_message(message: str):
         except Exception as e:
             logger.error(f"Error sending message to WebSocket: {e}")
 
+# Function to broadcast events published by tools and background jobs
+async def broadcast_event(event: dict):
+    for connection in list(active_connections):
+        try:
+            await connection.send_json(event)
+        except Exception as e:
+            logger.error(f"Error broadcasting {event.get('type')} event to WebSocket: {e}")
+
+main_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def forward_event(event: dict):
+    # Called from worker threads; hand the event over to the app's event loop
+    if main_loop is not None and main_loop.is_running():
+        asyncio.run_coroutine_threadsafe(broadcast_event(event), main_loop)
+
+@app.on_event("startup")
+async def subscribe_event_bus():
+    global main_loop
+    main_loop = asyncio.get_running_loop()
+    subscribe(forward_event)
+
 # File Upload Endpoint
 @app.post("/upload")
 async def upload_file(file: UploadFile):
@@ -308,6 +354,7 @@ async def upload_file(file: UploadFile):
             else:
                 logger.info(f"File {filename} is not a code file, handling as text.")
                 client.insert_archival_memory(agent_state.id, content_str)
+            get_index().add_document(f"upload:{filename}", content_str, {"source": filename})
 
         except UnicodeDecodeError:
             logger.warning(f"File {filename} could not be decoded as UTF-8, handling as binary.")
@@ -325,6 +372,7 @@ async def upload_file(file: UploadFile):
 
                     # Insert extracted text into memory
                     client.insert_archival_memory(agent_state.id, extracted_text)
+                    get_index().add_document(f"upload:{filename}", extracted_text, {"source": filename})
                     logger.info(f"Extracted text from {filename} and added to archival memory.")
                 except Exception as e:
                     logger.error(f"Error processing PDF {filename}: {e}")
@@ -339,91 +387,48 @@ async def upload_file(file: UploadFile):
 
     return {"message": f"Successfully processed {filename}"}
 
+# Local Document Search Endpoint
+@app.get("/api/search")
+def search_documents(q: str, k: int = 5):
+    hits = get_index().search(q, top_k=k)
+    logger.info(f"Search for '{q}' returned {len(hits)} hits.")
+    return {"results": hits}
+
 # Function to fetch Google Calendar events
 def fetch_google_calendar_events():
-    TOKEN_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'api', 'gcal_token.json')
-    CREDENTIALS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'api', 'google_api_credentials.json')
-    SCOPES = ["https://www.googleapis.com/auth/calendar"]
-    
-    # Load credentials
-    creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
-    service = build('calendar', 'v3', credentials=creds)
-
-    # Define the Hong Kong time zone
-    hk_tz = pytz.timezone('Asia/Hong_Kong')
-
-    # Get the current time in the Hong Kong time zone
-    now = datetime.now(hk_tz)
-
-    # Format the current time as an RFC3339 string
-    now_rfc3339 = now.isoformat()
-
-    # Call the Calendar API to fetch events in Hong Kong time zone
+    # Served from the local event store; sync_calendar keeps it current
     try:
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=now_rfc3339,  # Ensure this is in RFC3339 format
-            timeZone='Asia/Hong_Kong',  # Specify the time zone for the query
-            maxResults=5,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        events = events_result.get('items', [])
+        events = calendar_sync.store.upcoming(datetime.now(timezone.utc).timestamp(), limit=5)
         logger.info(f"Fetched {len(events)} calendar events.")
         return events
-
-    except HttpError as error:
+    except Exception as error:
         logger.error(f"An error occurred while fetching calendar events: {error}")
         return []
 
+# Background job pulling calendar changes with the Calendar API sync token
+def sync_calendar():
+    try:
+        calendar_sync.sync()
+    except HttpError as error:
+        logger.error(f"An error occurred while syncing calendar events: {error}")
+    except Exception as e:
+        logger.error(f"Calendar sync failed: {e}")
+
+calendar_sync = get_calendar_sync()
+
 # Calendar Events Endpoint
 @app.get("/api/calendar-events")
 def get_calendar_events():
     events = fetch_google_calendar_events()
     return events
 
-# Initialize the tasks.json file
-def initialize_tasks_file():
-    # Check if tasks.json exists and is not empty
-    if not exists('tasks.json'):
-        # If the file doesn't exist, create it with an empty list
-        with open('tasks.json', 'w') as f:
-            json.dump([], f)  # Initialize with an empty list
-            logger.info("Initialized tasks.json with an empty list.")
-
-# Load tasks from tasks.json or initialize an empty list if file doesn't exist
-if os.path.exists('tasks.json'):
-    with open('tasks.json', 'r') as f:
-        try:
-            tasks = json.load(f)
-            logger.info(f"Loaded {len(tasks)} tasks from tasks.json.")
-        except json.JSONDecodeError:
-            tasks = []
-            logger.warning("tasks.json is corrupted. Initialized with an empty list.")
-else:
-    initialize_tasks_file()
-    tasks = []
+task_store = get_task_store()
 
 # Tasks Endpoints
 @app.get("/api/tasks")
 def get_tasks():
-    
-    if not exists('./tasks.json'):
-        logger.info("tasks.json does not exist. Returning empty task list.")
-        return {"tasks": []}  # Return empty list if file doesn't exist
-
-    with open('./tasks.json', 'r') as f:
-        try:
-            tasks = json.load(f)
-            if not isinstance(tasks, list):
-                tasks = [tasks]
-            logger.info(f"Tasks loaded from JSON: {tasks}")
-        except json.JSONDecodeError:
-            tasks = []
-            logger.warning("tasks.json is corrupted. Returning empty task list.")
-    
-    return {"tasks": tasks}
+    items = task_store.pending()
+    return {"tasks": [task["description"] for task in items], "items": items}
 
 @app.post("/api/tasks/add")
 async def add_task(task: dict = Body(...)):
@@ -433,41 +438,99 @@ async def add_task(task: dict = Body(...)):
         logger.warning(f"Empty task received from user: {user.username}")
         raise HTTPException(status_code=400, detail="Task description is required.")
     
-    # Push task to agent memory and save it
-    # ?? the custom memory function is overridden in save_agent(agent, self.ms) in create_agent in sync server
-    '''print("agent_state.memory before")
-    print(agent_state.memory)
-    agent_state.memory.task_queue_push(task_description)   
-    tasks_tmp = json.loads(self.memory.get_block("tasks").value)
-    tasks_tmp.append(task_description)
-    self.memory.update_block_value("tasks", json.dumps(tasks))
-    print("agent_state.memory after")
-    print(agent_state.memory) '''
-    
-    tasks = json.loads(agent_state.memory.get_block("tasks").value)
-    #tasks.append(task_description)
-    agent_state.memory.update_block_value("tasks", json.dumps(tasks))
-    # write to tasks.json
-    '''with open('./tasks.json', 'w') as f:
-        json.dump(tasks, f)'''
+    try:
+        task_store.push(task_description, priority=int(task.get("priority", 0)), due=task.get("due"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid task: {e}")
+    # Keep the agent's core memory view of the queue current
+    agent_state.memory.update_block_value("tasks", task_store.projection())
     logger.info(f"Task added by {user.username}: {task_description}")
-    return {"tasks": tasks}
+    items = task_store.pending()
+    return {"tasks": [item["description"] for item in items], "items": items}
+
+@app.post("/api/tasks/{task_id}/complete")
+def complete_task(task_id: int):
+    task = task_store.complete(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found.")
+    agent_state.memory.update_block_value("tasks", task_store.projection())
+    return task
+
+@app.delete("/api/tasks/{task_id}")
+def delete_task(task_id: int):
+    if not task_store.delete(task_id):
+        raise HTTPException(status_code=404, detail="Task not found.")
+    agent_state.memory.update_block_value("tasks", task_store.projection())
+    return {"deleted": task_id}
 
 # Text-to-Speech Playback Endpoint
 @app.get("/api/play-tts", response_class=FileResponse)
-def play_tts():
+def play_tts(id: Optional[str] = None):
     user = get_current_user()
     
-    # Define the path to the latest generated TTS MP3 file
-    file_path = "output.mp3"  # Replace with your actual path if necessary
+    # Serve a synthesized clip by ID, or the legacy single TTS file
+    file_path = tts_service.audio_path(id) if id else "output.mp3"
 
-    if os.path.exists(file_path):
+    if file_path and os.path.exists(file_path):
         logger.info(f"Playing TTS file: {file_path}")
-        return FileResponse(file_path, media_type="audio/mpeg", filename="output.mp3")
+        return FileResponse(file_path, media_type="audio/mpeg", filename=os.path.basename(file_path))
     else:
         logger.warning(f"TTS file not found: {file_path}")
         raise HTTPException(status_code=404, detail="File not found")
 
+tts_service = get_tts_service()
+
+class TTSRequest(BaseModel):
+    text: str
+    voice_id: Optional[str] = None
+
+# Synthesize a reply; each clip is announced on /ws ("tts_chunk") as soon as it is ready
+@app.post("/api/tts")
+async def synthesize_speech(request: TTSRequest):
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Text is required.")
+    return await asyncio.to_thread(tts_service.speak, request.text, request.voice_id)
+
+# Stream the reply as one MP3 response, sentence by sentence as the clips are synthesized
+@app.get("/api/tts/stream")
+def stream_speech(text: str, voice_id: Optional[str] = None):
+    def chunks():
+        for _, _, path in tts_service.stream(text, voice_id):
+            with open(path, "rb") as f:
+                yield f.read()
+    return StreamingResponse(chunks(), media_type="audio/mpeg")
+
+@app.get("/api/tts/audio/{clip_id}", response_class=FileResponse)
+def get_tts_audio(clip_id: str):
+    file_path = tts_service.audio_path(clip_id)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="Clip not found")
+    return FileResponse(file_path, media_type="audio/mpeg", filename=f"{clip_id}.mp3")
+
+class ImageRequest(BaseModel):
+    prompt: str
+    n: int = 1
+    size: str = "512x512"
+
+# Generate (or fetch from the cache) up to 4 image variants for a prompt
+@app.post("/api/images")
+async def create_images(request: ImageRequest):
+    return {"images": await asyncio.to_thread(get_image_service().generate, request.prompt, request.n, request.size)}
+
+@app.get("/api/images/{image_id}", response_class=FileResponse)
+def get_image(image_id: str):
+    file_path = get_image_service().image_path(image_id)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(file_path, media_type="image/png")
+
+@app.get("/api/images/{image_id}/thumbnail", response_class=FileResponse)
+def get_image_thumbnail(image_id: str, size: int = 256):
+    file_path = get_image_service().thumbnail_path(image_id, size)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(file_path, media_type="image/png")
+
 # Spotify Helper Functions
 def set_spotify_volume(spotify_token: str, device_id: str, volume_percent: int):
     headers = {
@@ -546,13 +609,153 @@ async def send_wakeup_message():
     # say(message)  # Use the TTS function to speak the message
     logger.info("Woke up user with message.")
 
-def send_wakeup_message_wrapper():
-    asyncio.run(send_wakeup_message())  # Run the async function in a synchronous context
+# Schedule the wakeup message at 7:00 AM; the fixed id keeps restarts from adding duplicates
+scheduler.add_job(send_wakeup_message, 'cron', hour=7, minute=0, id="wakeup_message", replace_existing=True)
+logger.info("Wakeup message scheduled at 7:00 AM daily.")
+
+# Keep the local calendar store in sync, starting right away
+scheduler.add_job(sync_calendar, 'interval', seconds=int(os.getenv("CALENDAR_SYNC_INTERVAL", "60")),
+                  next_run_time=datetime.now(pytz.timezone("Asia/Hong_Kong")),
+                  id="calendar_sync", jobstore="memory", replace_existing=True)
+
+# Refresh the threat intelligence feeds in the background so the newsletter reads a warm store
+def refresh_feeds():
+    try:
+        get_feed_fetcher().fetch_all()
+    except Exception as e:
+        logger.error(f"Feed refresh failed: {e}")
+
+scheduler.add_job(refresh_feeds, 'interval', seconds=int(os.getenv("RSS_REFRESH_INTERVAL", "1800")),
+                  id="feed_refresh", jobstore="memory", replace_existing=True)
+
+# Email the security newsletter daily (NEWSLETTER_HOUR, default 8:00) when recipients are configured
+if os.getenv("EMAIL_RECIPIENTS"):
+    scheduler.add_job(send_security_newsletter, 'cron', hour=int(os.getenv("NEWSLETTER_HOUR", "8")), minute=0,
+                      id="security_newsletter", replace_existing=True)
+    logger.info("Security newsletter scheduled daily.")
+
+# Send a message to the agent and relay its replies to the /ws clients
+def prompt_agent(message: str):
+    response = client.user_message(agent_id=agent_state.id, message=message)
+    for r in response.messages:
+        if getattr(r, 'message_type', '') == "function_call" and r.function_call.name == "send_message":
+            publish({"type": "message", "message": json.loads(r.function_call.arguments)['message']})
+
+# Wake the agent when a task deadline arrives
+def wake_agent_for_deadline(task: dict):
+    prompt_agent(f"[Deadline] Task #{task['id']} \"{task['description']}\" is due now ({task['due']}). "
+                 "Check on it and let the user know what to do next.")
+    logger.info(f"Woke agent for the deadline of task {task['id']}.")
+
+# Reminders and deadline wakeups for tasks with due dates, armed on the shared scheduler.
+# Its job is rebuilt from the task store on startup, so it lives in the memory job store.
+deadline_scheduler = get_deadline_scheduler(scheduler, on_deadline=wake_agent_for_deadline, jobstore="memory")
+deadline_scheduler.start()
+
+# Spoken commands (after the wake word) go straight to the agent, one at a time
+def process_voice_commands():
+    while True:
+        try:
+            command = listen_for_command()
+        except RuntimeError as e:
+            # The pipeline is restarted on the next call; wait so a missing microphone is not retried in a loop
+            logger.error(f"Voice input failed: {e}")
+            time.sleep(5)
+            continue
+        if not command:
+            continue
+        publish({"type": "voice_command", "message": command})
+        try:
+            prompt_agent(command)
+        except Exception as e:
+            logger.error(f"Error handling voice command: {e}")
+
+if os.getenv("VOICE_INPUT") == "1":
+    threading.Thread(target=process_voice_commands, name="voice-commands", daemon=True).start()
+    logger.info("Voice input started.")
+
+# Targets for jobs created through /api/jobs (module-level so the job store can reference them)
+async def send_scheduled_message(message: str):
+    await broadcast_message(message=message)
+    logger.info(f"Sent scheduled message: {message}")
+
+def send_scheduled_prompt(message: str):
+    prompt_agent(message)
+    logger.info(f"Sent scheduled prompt to the agent: {message}")
+
+JOB_ACTIONS = {"message": send_scheduled_message, "agent": send_scheduled_prompt}
+
+class JobRequest(BaseModel):
+    action: str = "message"  # "message" broadcasts to /ws, "agent" prompts the agent
+    message: str
+    trigger: str = "date"  # "date", "cron" or "interval"
+    trigger_args: dict = {}  # e.g. {"run_date": "2024-11-28T03:00:00"} or {"hour": 9, "minute": 30}
+    id: Optional[str] = None
+
+def describe_job(job) -> dict:
+    return {
+        "id": job.id,
+        "name": job.name,
+        "trigger": str(job.trigger),
+        "next_run_time": job.next_run_time.isoformat() if job.next_run_time else None,
+        "kwargs": job.kwargs,
+    }
+
+# Scheduled Jobs Endpoints
+@app.get("/api/jobs")
+def list_jobs():
+    return {"jobs": [describe_job(job) for job in scheduler.get_jobs()]}
+
+@app.post("/api/jobs")
+def add_scheduled_job(request: JobRequest):
+    if request.action not in JOB_ACTIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown action: {request.action}")
+    if request.trigger not in ("date", "cron", "interval"):
+        raise HTTPException(status_code=400, detail=f"Unknown trigger: {request.trigger}")
+    try:
+        job = scheduler.add_job(JOB_ACTIONS[request.action], request.trigger, kwargs={"message": request.message},
+                                id=request.id, replace_existing=request.id is not None, **request.trigger_args)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid trigger arguments: {e}")
+    logger.info(f"Scheduled job {job.id}: {describe_job(job)}")
+    return describe_job(job)
+
+@app.delete("/api/jobs/{job_id}")
+def delete_scheduled_job(job_id: str):
+    if scheduler.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    scheduler.remove_job(job_id)
+    return {"deleted": job_id}
+
+@app.on_event("startup")
+async def start_scheduler():
+    # AsyncIOScheduler runs coroutine jobs on the app's loop and blocking jobs in its thread pool
+    scheduler.start()
+    logger.info("Scheduler started.")
+
+# Pre-warm the code execution sandboxes in the background
+def start_sandbox_pool():
+    try:
+        get_pool().start()
+        logger.info("Sandbox pool started.")
+    except Exception as e:
+        logger.warning(f"Sandbox pool not started, Docker is unavailable: {e}")
+
+start_sandbox_pool()
+
+# Keep the Google Calendar token fresh so requests never wait on a refresh
+get_calendar().start_background_refresh()
 
-# Schedule the wakeup message at 7:00 AM
-scheduler.start()
-scheduler.add_job(send_wakeup_message_wrapper, 'cron', hour=7, minute=0)
-logger.info("Scheduler started and wakeup message scheduled at 7:00 AM daily.")
+@app.on_event("shutdown")
+def stop_sandbox_pool():
+    deadline_scheduler.stop()
+    scheduler.shutdown(wait=False)
+    tts_service.shutdown()
+    get_image_service().shutdown()
+    try:
+        get_pool().shutdown()
+    except Exception as e:
+        logger.error(f"Error shutting down sandbox pool: {e}")
 
 # WebSocket Broadcast Function
 async def broadcast_message(message: str):
@@ -20,6 +20,7 @@ import MessageInput from "./MessageInput";
 import LiveTranscription from "./LiveTranscription";
 import CalendarSection from "./CalendarSection";
 import TaskManager from "./TaskManager";
+import TerminalOutput from "./TerminalOutput";
 import { Message } from "../types";
 import sanitizeHtml from "sanitize-html";
 import axios from "axios";
@@ -37,6 +38,16 @@ declare global {
     }
 }
 
+// WebSocket events shown as PG Copilot chat messages (broadcasts carry no type)
+const CHAT_EVENT_TYPES: (string | undefined)[] = [
+    undefined,
+    "message",
+    "function_return",
+];
+
+// Sandbox output lines kept in the terminal panel
+const MAX_TERMINAL_LINES = 500;
+
 // Reducer function for managing messages and saving to localStorage
 function messagesReducer(
     state: Message[],
@@ -86,6 +97,8 @@ function Main() {
     const [transcription, setTranscription] = useState("");
     const [isSpotifyVisible, setIsSpotifyVisible] = useState<boolean>(true);
     const [ws, setWs] = useState<WebSocket | null>(null);
+    const [terminalLogs, setTerminalLogs] = useState<string[]>([]);
+    const [tasksVersion, setTasksVersion] = useState(0);
     const toast = useToast();
     const bgColor = useColorModeValue("gray.100", "gray.800");
     const textColor = useColorModeValue("gray.800", "white");
@@ -189,15 +202,49 @@ function Main() {
         };
     }, [toast]);
 
-    // Function to fetch and play the TTS MP3
-    const playTTSResponse = useCallback(async () => {
+    // Synthesized clips waiting to be played, in the order the server announced them
+    const ttsEnabledRef = useRef(isTtsEnabled);
+    const audioQueueRef = useRef<string[]>([]);
+    const currentAudioRef = useRef<HTMLAudioElement | null>(null);
+
+    const playNextClip = useCallback(() => {
+        const url = audioQueueRef.current.shift();
+        if (!url) {
+            currentAudioRef.current = null;
+            return;
+        }
+        const audio = new Audio(url);
+        currentAudioRef.current = audio;
+        audio.onended = playNextClip;
+        audio.onerror = playNextClip;
+        audio.play().catch((error) => {
+            console.error("Error playing TTS audio:", error);
+            playNextClip();
+        });
+    }, []);
+
+    // The WebSocket handler outlives renders, so it reads the TTS setting through a ref
+    useEffect(() => {
+        ttsEnabledRef.current = isTtsEnabled;
         if (!isTtsEnabled) {
+            audioQueueRef.current = [];
+            currentAudioRef.current?.pause();
+            currentAudioRef.current = null;
+        }
+    }, [isTtsEnabled]);
+
+    // Ask the server to speak a reply; its clips come back as "tts_chunk" events
+    const playTTSResponse = useCallback(async (text: string) => {
+        if (!ttsEnabledRef.current) {
             console.log("TTS is disabled, skipping playback.");
             return;
         }
 
         try {
-            const response = await fetch("/api/play-tts", {
+            const response = await fetch("/api/tts", {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ text }),
                 credentials: "include",
             });
 
@@ -205,17 +252,11 @@ function Main() {
                 console.error(
                     `Error: ${response.status} - ${response.statusText}`
                 );
-                return;
             }
-
-            const audioBlob = await response.blob();
-            const audioUrl = URL.createObjectURL(audioBlob);
-            const audio = new Audio(audioUrl);
-            audio.play(); // Automatically play the audio
         } catch (error) {
-            console.error("Error playing TTS audio:", error);
+            console.error("Error requesting TTS audio:", error);
         }
-    }, [isTtsEnabled]);
+    }, []);
 
     // Function to handle incoming messages including thought, AI messages, and function calls
     const handleIncomingMessage = useCallback(
@@ -246,7 +287,69 @@ function Main() {
                 };
                 dispatchMessages({ type: "add", message: functionCallMessage });
                 scrollToBottom();
-            } else {
+            } else if (data.type === "exec_output") {
+                // Sandbox output arrives chunk by chunk; it goes to the terminal panel, not the chat
+                const source =
+                    data.target ?? data.container_id?.slice(0, 12) ?? "sandbox";
+                const prefix =
+                    data.stream === "stderr" ? `[${source} stderr]` : `[${source}]`;
+                setTerminalLogs((logs) =>
+                    [...logs, `${prefix} ${data.message}`].slice(
+                        -MAX_TERMINAL_LINES
+                    )
+                );
+            } else if (data.type === "tts_chunk") {
+                // A synthesized clip is ready; play it after the ones before it
+                if (!ttsEnabledRef.current) {
+                    return;
+                }
+                audioQueueRef.current.push(data.url);
+                if (!currentAudioRef.current) {
+                    playNextClip();
+                }
+            } else if (data.type === "tts_done") {
+                // Every clip of the utterance has been announced; nothing left to queue
+            } else if (data.type === "task_reminder") {
+                const reminderMessage: Message = {
+                    role: "ai",
+                    content: data.message,
+                    timestamp: new Date().toLocaleTimeString(),
+                    name: "Reminder",
+                };
+                dispatchMessages({ type: "add", message: reminderMessage });
+                scrollToBottom();
+                playTTSResponse(data.message);
+            } else if (data.type === "sms_batch_done") {
+                // A text message blast finished; report it without adding to the chat
+                const failed = data.failed?.length ?? 0;
+                const unknown = data.unknown?.length ?? 0;
+                toast({
+                    title: "Text messages sent",
+                    description:
+                        `${data.sent} of ${data.total} sent` +
+                        (failed ? `, ${failed} failed` : "") +
+                        (unknown ? `, ${unknown} with unknown outcome` : "") +
+                        ".",
+                    status: failed || unknown ? "warning" : "success",
+                    duration: 5000,
+                    isClosable: true,
+                });
+            } else if (data.type === "tasks_changed") {
+                // The task list refetches the queue; nothing is added to the chat
+                setTasksVersion((version) => version + 1);
+            } else if (data.type === "voice_command") {
+                const voiceMessage: Message = {
+                    role: "user",
+                    content: data.message,
+                    timestamp: new Date().toLocaleTimeString(),
+                    name: username ?? "User",
+                };
+                dispatchMessages({ type: "add", message: voiceMessage });
+                scrollToBottom();
+            } else if (
+                CHAT_EVENT_TYPES.includes(data.type) &&
+                typeof data.message === "string"
+            ) {
                 const aiMessage: Message = {
                     role: "ai",
                     content: data.message,
@@ -257,12 +360,15 @@ function Main() {
                 scrollToBottom();
 
                 if (isTtsEnabled && data.message !== lastPlayedMessage) {
-                    playTTSResponse();
+                    playTTSResponse(data.message);
                     setLastPlayedMessage(data.message);
                 }
+            } else {
+                // Events without a chat rendering (e.g. logs) stay out of the chat
+                console.debug("Ignoring WebSocket event:", data);
             }
         },
-        [isTtsEnabled, lastPlayedMessage, playTTSResponse]
+        [isTtsEnabled, lastPlayedMessage, playTTSResponse, playNextClip, username, toast]
     );
 
     const handleSendMessage = useCallback(
@@ -494,7 +600,10 @@ function Main() {
                         overflowY="auto"
                     >
                         <CalendarSection />
-                        <TaskManager />
+                        <TaskManager refreshKey={tasksVersion} />
+                        {terminalLogs.length > 0 && (
+                            <TerminalOutput terminalLogs={terminalLogs} />
+                        )}
                     </Box>
                 )}
             </Flex>
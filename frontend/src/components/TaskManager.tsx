@@ -2,7 +2,11 @@ import React, { useState, useEffect } from "react";
 import { Box, Spinner, Text, Input, Button, VStack } from "@chakra-ui/react";
 import { useNavigate } from "react-router-dom";
 
-const TaskManager: React.FC = () => {
+interface TaskManagerProps {
+    refreshKey?: number; // Changes whenever the task store reports a change
+}
+
+const TaskManager: React.FC<TaskManagerProps> = ({ refreshKey }) => {
     const [tasks, setTasks] = useState<string[]>([]);
     const [newTask, setNewTask] = useState<string>("");
     const [error, setError] = useState<string | null>(null); // Allow both null and string
@@ -23,13 +27,8 @@ const TaskManager: React.FC = () => {
                 if (response.ok) {
                     const data = await response.json();
                     console.log("data", data);
-                    if (
-                        data.tasks &&
-                        Array.isArray(data.tasks) &&
-                        data.tasks.length > 0
-                    ) {
-                        setTasks([...data.tasks]); // Ensure tasks is an array
-                    }
+                    // Ensure tasks is an array; an emptied queue clears the list
+                    setTasks(Array.isArray(data.tasks) ? [...data.tasks] : []);
                     setError(null); // Clear any previous errors
                 } else if (response.status === 401 || response.status === 403) {
                     setError(
@@ -51,7 +50,7 @@ const TaskManager: React.FC = () => {
         };
 
         fetchTasks();
-    }, [navigate]);
+    }, [navigate, refreshKey]);
 
     // Function to handle adding a task
     const addTask = async () => {
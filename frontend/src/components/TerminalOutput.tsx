@@ -8,7 +8,7 @@ interface TerminalOutputProps {
 
 const TerminalOutput: React.FC<TerminalOutputProps> = ({ terminalLogs }) => {
   return (
-    <Box bg="black" color="green.400" p={3} fontFamily="monospace" overflowY="auto" maxHeight="300px">
+    <Box bg="black" color="green.400" p={3} fontFamily="monospace" overflowY="auto" maxHeight="300px" whiteSpace="pre-wrap">
       {terminalLogs.map((log, index) => (
         <Text key={index}>{log}</Text>
       ))}